@@ -0,0 +1,203 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+torch Dataset of the aligned actions of several dishes for mini-batched training.
+
+Every item is one classification problem (action of Recipe1, actions of Recipe2).
+The collate function groups the items of a batch by recipe pair and collects their
+node embeddings (see model.collect_recipe_nodes()), s.t. the DataLoader workers
+prepare the next batches while the model trains on the current one.
+"""
+
+# importing libraries
+import random
+import torch
+import numpy as np
+
+from itertools import groupby
+from model import collect_recipe_nodes
+from torch.utils.data import Dataset, DataLoader, RandomSampler, SequentialSampler, get_worker_info
+
+
+class AlignmentPairDataset(Dataset):
+    def __init__(self, dishes):
+        """
+        Aligned actions of several dishes
+
+        Parameters
+        ----------
+        dishes : List of tuple
+            (dish_dict, alignment_labels) for every dish; dish_dict as returned by utils.fetch_dish_train(),
+            alignment_labels the AlignmentLabels object of its alignments.
+
+        Attributes
+        ----------
+        items : Array num_items X 4 (int64)
+            (dish index, pair id, index of the action of Recipe1, target class) of every aligned action.
+        """
+
+        self.dishes = dishes
+
+        self.items = np.concatenate(
+            [np.zeros((0, 4), dtype=np.int64)]
+            + [
+                np.stack(
+                    [
+                        np.full(len(alignment_labels.pair_ids), dish_index),
+                        alignment_labels.pair_ids,
+                        alignment_labels.source_indices,
+                        alignment_labels.target_indices,
+                    ],
+                    axis=1,
+                ).astype(np.int64)
+                for dish_index, (_, alignment_labels) in enumerate(dishes)
+            ]
+        )
+
+        self.target_nodes = dict()  # (dish index, recipe name) -> nodes of all actions; filled per process
+
+    def __len__(self):
+
+        return len(self.items)
+
+    def __getitem__(self, index):
+
+        return tuple(self.items[index].tolist())
+
+    def recipe_nodes(self, recipe, recipe_actions):
+        """
+        Node embeddings of actions of a recipe (see model.collect_recipe_nodes());
+        in a worker process the embeddings are copied s.t. only the used rows are sent to the main process.
+        """
+
+        recipe_nodes = collect_recipe_nodes(
+            recipe_actions, recipe["Embedding_Vectors"], recipe["Vector_Lookup_Lists"]
+        )
+
+        if get_worker_info() is not None:
+            recipe_nodes["Node_Sequences"] = [sequence.clone() for sequence in recipe_nodes["Node_Sequences"]]
+
+        return recipe_nodes
+
+    def collate(self, items):
+        """
+        Collate function for the DataLoader
+
+        Parameters
+        ----------
+        items : List of tuple
+            Items of the batch.
+
+        Returns
+        -------
+        batch : Dict
+            "Recipe_Nodes" : List of tuple (nodes of the Recipe1 actions, nodes of all Recipe2 actions) per recipe pair;
+            "Labels" : Tensor batch_size, target class of every action, in the order of "Recipe_Nodes".
+
+        """
+
+        items = sorted(items, key=lambda item: item[:2])  # group by recipe pair
+
+        recipe_nodes = []
+        labels = []
+
+        for (dish_index, pair_id), pair_items in groupby(items, key=lambda item: item[:2]):
+
+            pair_items = list(pair_items)
+
+            dish_dict, alignment_labels = self.dishes[dish_index]
+            recipe1_name, recipe2_name = alignment_labels.pairs[pair_id]
+
+            recipe1 = dish_dict[recipe1_name]
+            recipe2 = dish_dict[recipe2_name]
+
+            if (dish_index, recipe2_name) not in self.target_nodes:
+                self.target_nodes[dish_index, recipe2_name] = self.recipe_nodes(recipe2, recipe2["Action_Dicts_List"])
+
+            recipe_nodes.append(
+                (
+                    self.recipe_nodes(recipe1, [recipe1["Action_Dicts_List"][item[2] + 1] for item in pair_items]),
+                    self.target_nodes[dish_index, recipe2_name],
+                )
+            )
+
+            labels.extend(item[3] for item in pair_items)
+
+        return {"Recipe_Nodes": recipe_nodes, "Labels": torch.tensor(labels, dtype=torch.long)}
+
+
+#####################################
+
+
+def seed_worker(worker_id):
+    """
+    Seed numpy and random in a DataLoader worker from its torch seed
+    """
+
+    worker_seed = torch.initial_seed() % 2 ** 32
+
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+
+#####################################
+
+
+def alignment_data_loader(dishes, batch_size, shuffle=False, num_workers=0, seed=0):
+    """
+    DataLoader over the aligned actions of several dishes
+
+    Parameters
+    ----------
+    dishes : List of tuple
+        (dish_dict, alignment_labels) for every dish (see AlignmentPairDataset).
+    batch_size : Int
+        Number of actions per batch.
+    shuffle : boolean, optional
+        Shuffle the actions of all dishes in every epoch. The default is False (order of the dishes and pairs).
+    num_workers : Int, optional
+        Number of worker processes preparing batches; the embeddings have to be on the CPU. The default is 0.
+    seed : Int, optional
+        Seed of the shuffling and the workers; iterating a loader gives the same sequence of epochs for the same seed. The default is 0.
+
+    Returns
+    -------
+    loader : DataLoader object
+        Batches as returned by AlignmentPairDataset.collate().
+
+    """
+
+    dataset = AlignmentPairDataset(dishes)
+
+    # separate generators s.t. the order of the actions does not depend on the number of workers
+    sampler_generator = torch.Generator()
+    sampler_generator.manual_seed(seed)
+
+    worker_generator = torch.Generator()
+    worker_generator.manual_seed(seed)
+
+    if shuffle:
+        sampler = RandomSampler(dataset, generator=sampler_generator)
+    else:
+        sampler = SequentialSampler(dataset)
+
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        sampler=sampler,
+        num_workers=num_workers,
+        collate_fn=dataset.collate,
+        worker_init_fn=seed_worker,
+        generator=worker_generator,
+        persistent_workers=num_workers > 0,
+    )
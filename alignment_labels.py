@@ -0,0 +1,129 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Label index of the alignments of a dish.
+
+The alignments (token ID's, grouped by pairs of recipe names) are joined once with the
+action dictionaries of the recipes, s.t. the training and testing loops read the gold
+label of every action without searching the alignment table.
+"""
+
+# importing libraries
+import numpy as np
+
+
+class AlignmentLabels:
+    def __init__(self, dish_dict, dish_group_alignments):
+        """
+        Label index of the alignments of a dish
+
+        Parameters
+        ----------
+        dish_dict : dict
+            Contains all information for one dish. Keys: recipe names. Values: dictionaries with key "Action_Dicts_List" (see utils.fetch_dish_train()).
+        dish_group_alignments : pd.DataFrame
+            All alignments (token ID's) for one dish, grouped by pairs of recipe names (columns "token1" and,
+            for gold alignments, "token2").
+
+        Attributes
+        ----------
+        pairs : List of Tuple
+            Pairs of recipe names (recipe1, recipe2), in the order of dish_group_alignments.
+        offsets : Array num_pairs + 1 (int64)
+            The actions of recipe1 of pair p (Action_Dicts_List[1:]) are entries offsets[p]:offsets[p + 1] of the arrays below.
+        aligned : Array (bool)
+            Whether the action is in the alignment table.
+        true_labels : Array (int64)
+            Aligned action id of recipe2 ('token2'); -1 if the action is not aligned or the table has no 'token2' column.
+        target_classes : Array (int64)
+            Index of the aligned action in Action_Dicts_List of recipe2 (the class label of the model); -1 if there is none.
+        pair_ids, source_indices, target_indices : Array (int64)
+            (pair, index of the action of recipe1, target class) of every aligned action.
+        """
+
+        self.pairs = list(dish_group_alignments.groups.keys())
+
+        aligned_list, true_labels_list, target_classes_list = [], [], []
+
+        for key in self.pairs:
+
+            recipe_pair_alignment = dish_group_alignments.get_group(key)
+
+            source_ids = np.array([node["Action_id"] for node in dish_dict[key[0]]["Action_Dicts_List"][1:]], dtype=np.int64)
+            target_ids = np.array([node["Action_id"] for node in dish_dict[key[1]]["Action_Dicts_List"]], dtype=np.int64)
+
+            token1 = recipe_pair_alignment["token1"].to_numpy(dtype=np.int64)
+
+            unique_tokens, counts = np.unique(token1, return_counts=True)
+
+            if np.isin(source_ids, unique_tokens[counts > 1]).any():
+                raise ValueError("Several alignments for one action of {} in pair {}".format(key[0], key))
+
+            # row of every action in the alignment table
+            aligned = np.zeros(len(source_ids), dtype=bool)
+            rows = np.zeros(len(source_ids), dtype=np.int64)
+
+            if len(token1):
+                order = np.argsort(token1, kind="stable")
+                rows = order[np.minimum(np.searchsorted(token1, source_ids, sorter=order), len(token1) - 1)]
+                aligned = token1[rows] == source_ids
+
+            true_labels = np.full(len(source_ids), -1, dtype=np.int64)
+            target_classes = np.full(len(source_ids), -1, dtype=np.int64)
+
+            if "token2" in recipe_pair_alignment.columns:
+
+                true_labels[aligned] = recipe_pair_alignment["token2"].to_numpy(dtype=np.int64)[rows[aligned]]
+
+                # first position of every action id in Action_Dicts_List of recipe2
+                unique_ids, first_positions = np.unique(target_ids, return_index=True)
+                positions = np.clip(np.searchsorted(unique_ids, true_labels), 0, len(unique_ids) - 1)
+                found = aligned & (unique_ids[positions] == true_labels)
+
+                target_classes[found] = first_positions[positions[found]]
+
+            aligned_list.append(aligned)
+            true_labels_list.append(true_labels)
+            target_classes_list.append(target_classes)
+
+        self.offsets = np.zeros(len(self.pairs) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(aligned) for aligned in aligned_list])
+
+        self.aligned = np.concatenate(aligned_list) if aligned_list else np.zeros(0, dtype=bool)
+        self.true_labels = np.concatenate(true_labels_list) if true_labels_list else np.zeros(0, dtype=np.int64)
+        self.target_classes = np.concatenate(target_classes_list) if target_classes_list else np.zeros(0, dtype=np.int64)
+
+        entries = np.flatnonzero(self.aligned)
+
+        self.pair_ids = np.searchsorted(self.offsets, entries, side="right") - 1
+        self.source_indices = entries - self.offsets[self.pair_ids]
+        self.target_indices = self.target_classes[entries]
+
+    def __len__(self):
+
+        return len(self.pairs)
+
+    def pair(self, pair_id):
+        """
+        Labels of the actions of recipe1 of a pair
+
+        Returns
+        -------
+        aligned, true_labels, target_classes : Array len(Action_Dicts_List of recipe1) - 1
+            Entries of the pair (see class attributes).
+
+        """
+
+        start, end = self.offsets[pair_id], self.offsets[pair_id + 1]
+
+        return self.aligned[start:end], self.true_labels[start:end], self.target_classes[start:end]
@@ -0,0 +1,606 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Regression checks and microbenchmarks on synthetic data.
+
+Every benchmark first checks that the optimised code path gives the same results
+as the reference implementation and then reports the timings of both.
+
+Usage: python benchmark.py encoder [--degree 64] [--dim 768] [--repeats 10]
+       python benchmark.py conllu [--data_folder ./data] [--repeats 5]
+       python benchmark.py results [--rows 100000] [--reference_rows 5000]
+       python benchmark.py predictions [--rows 20000] [--candidates 100]
+       python benchmark.py scores [--pairs 200] [--actions 60] [--repeats 3]
+       python benchmark.py ged [--pairs 50] [--exact_actions 6] [--actions 40]
+"""
+
+# importing libraries
+import os
+import time
+import torch
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from ast import literal_eval
+from glob import glob
+from itertools import product
+from conllu import parse
+from model import Encoder
+from conllu_reader import read_recipe_file, column_tokens
+from results_collector import ResultsCollector
+from prediction_writer import PredictionWriter
+from score_matrices import ScoreMatrixWriter, load_score_matrices, export_tsv
+from graph_edit_distance import EditProblem
+
+
+def timed(function, repeats):
+    """
+    Mean wall-clock time of function() in seconds
+    """
+
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        function()
+
+    return (time.perf_counter() - start) / repeats
+
+
+#####################################
+
+
+def legacy_encoder_forward(encoder, action, parent_list, child_list, embedding_vectors, vector_lookup_list, aliased=True):
+    """
+    Reference implementation of Encoder.forward() with the neighbourhood LSTMs inside the node loops
+    (the LSTM runs on every prefix of the list, only the last result is kept).
+
+    Parameters
+    ----------
+    encoder : Encoder object
+        Encoder (with_feature=True).
+    action : Tensor action_sequence_length
+        Action Node.
+    parent_list : List of Tensors
+        List of Parent Nodes for Action node.
+    child_list : List of Tensors
+        List of Child Nodes for Action node.
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix.
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors.
+    aliased : boolean, optional
+        Share one list for the parent and child embeddings (separate_neighbourhoods=False). The default is True.
+
+    Returns
+    -------
+    encoding : Tensor 1 X 3 * embedding_dim
+        Encoding vector for input.
+
+    """
+
+    action_context = encoder.sequence_embedding(action, embedding_vectors, vector_lookup_list)
+
+    if aliased:
+        parent_emb_list = child_emb_list = []
+    else:
+        parent_emb_list, child_emb_list = [], []
+
+    parent_list_context = child_list_context = torch.zeros(1, encoder.embedding_dim)
+
+    for parent in parent_list:
+
+        parent_emb_list.append(encoder.sequence_embedding(parent, embedding_vectors, vector_lookup_list))
+
+        parent_list_context = torch.squeeze(
+            encoder.parentlstm(torch.cat(parent_emb_list).view(len(parent_emb_list), 1, -1))[1][1], dim=0
+        )
+
+    for child in child_list:
+
+        child_emb_list.append(encoder.sequence_embedding(child, embedding_vectors, vector_lookup_list))
+
+        child_list_context = torch.squeeze(
+            encoder.childlstm(torch.cat(child_emb_list).view(len(child_emb_list), 1, -1))[1][1], dim=0
+        )
+
+    context = torch.cat([action_context, parent_list_context, child_list_context], dim=0)
+
+    return torch.unsqueeze(torch.flatten(context), dim=0)
+
+
+#####################################
+
+
+def synthetic_recipe(degree, dim, node_length=3):
+    """
+    One action node with degree parents and degree children of node_length tokens each
+
+    Returns
+    -------
+    action_dict : Dict
+        Action dictionary (Action, Parent_List, Child_List).
+    embedding_vectors : Tensor num_tokens X dim
+        Random embedding matrix (one subword per token).
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors.
+
+    """
+
+    num_tokens = (2 * degree + 1) * node_length
+
+    nodes = [
+        torch.arange(1 + i * node_length, 1 + (i + 1) * node_length) for i in range(2 * degree + 1)
+    ]
+
+    action_dict = {
+        "Action": nodes[0],
+        "Parent_List": nodes[1 : degree + 1],
+        "Child_List": nodes[degree + 1 :],
+    }
+
+    embedding_vectors = torch.randn(num_tokens, dim)
+    vector_lookup_list = np.arange(num_tokens + 1, dtype=np.int64)
+
+    return action_dict, embedding_vectors, vector_lookup_list
+
+
+#####################################
+
+
+def benchmark_encoder(degree, dim, repeats):
+    """
+    Check Encoder.forward() and Encoder.encode_recipe() against legacy_encoder_forward()
+    and time them for an action with degree parents and degree children.
+    """
+
+    torch.manual_seed(0)
+
+    action_dict, embedding_vectors, vector_lookup_list = synthetic_recipe(degree, dim)
+    inputs = (action_dict["Action"], action_dict["Parent_List"], action_dict["Child_List"], embedding_vectors, vector_lookup_list)
+
+    for separate_neighbourhoods in (False, True):
+
+        encoder = Encoder(dim, "cpu", 3, True, separate_neighbourhoods).eval()
+
+        with torch.no_grad():
+
+            reference = legacy_encoder_forward(encoder, *inputs, aliased=not separate_neighbourhoods)
+            encoding = encoder(*inputs)
+            packed_encoding = encoder.encode_recipe([action_dict], embedding_vectors, vector_lookup_list)
+
+            if not (torch.allclose(reference, encoding, atol=1e-5) and torch.allclose(reference, packed_encoding, atol=1e-5)):
+                raise RuntimeError(
+                    "Encoder (separate_neighbourhoods={}) differs from the reference implementation".format(separate_neighbourhoods)
+                )
+
+            legacy_time = timed(lambda: legacy_encoder_forward(encoder, *inputs, aliased=not separate_neighbourhoods), repeats)
+            forward_time = timed(lambda: encoder(*inputs), repeats)
+            packed_time = timed(lambda: encoder.encode_recipe([action_dict], embedding_vectors, vector_lookup_list), repeats)
+
+        print(
+            "separate_neighbourhoods={}: results match; degree {}: legacy {:.2f} ms, forward {:.2f} ms, encode_recipe {:.2f} ms".format(
+                separate_neighbourhoods, degree, legacy_time * 1000, forward_time * 1000, packed_time * 1000
+            )
+        )
+
+
+#####################################
+
+
+def benchmark_conllu(data_folder, repeats):
+    """
+    Check conllu_reader.read_recipe_file() against conllu.parse() on every recipe file
+    of a data folder and time the loading of the corpus with both.
+    """
+
+    filenames = sorted(glob(os.path.join(data_folder, "*", "*", "*.conllu")))
+
+    if not filenames:
+        raise ValueError("No recipe files found in {}".format(data_folder))
+
+    def load_conllu():
+        parsed_recipes = []
+        for filename in filenames:
+            with open(filename, "r", encoding="utf-8") as file:
+                parsed_recipes.append(parse(file.read()))
+        return parsed_recipes
+
+    def load_columns():
+        return [read_recipe_file(filename) for filename in filenames]
+
+    num_fallbacks = 0
+
+    for filename, parsed_recipe, (sentences, fallback) in zip(filenames, load_conllu(), load_columns()):
+
+        num_fallbacks += fallback is not None
+
+        reference = [[dict(token) for token in sentence] for sentence in parsed_recipe]
+
+        if column_tokens(sentences) != reference:
+            raise RuntimeError("Columnar reader differs from conllu for {}".format(filename))
+
+    conllu_time = timed(load_conllu, repeats)
+    columns_time = timed(load_columns, repeats)
+    tokens_time = timed(lambda: [column_tokens(sentences) for sentences, _ in load_columns()], repeats)
+
+    print(
+        "{} recipe files ({} read with conllu): results match; conllu {:.1f} ms, columns {:.1f} ms, columns + token dicts {:.1f} ms".format(
+            len(filenames), num_fallbacks, conllu_time * 1000, columns_time * 1000, tokens_time * 1000
+        )
+    )
+
+
+#####################################
+
+
+def synthetic_predictions(num_rows, seed=0):
+    """
+    Prediction rows of a synthetic dish with num_rows action pairs, as stored by the testing scripts
+    """
+
+    rng = np.random.default_rng(seed)
+
+    recipes = ["recipe_{}".format(i) for i in range(20)]
+    recipe_ids = rng.integers(0, len(recipes), size=(num_rows, 2))
+    labels = rng.integers(0, 50, size=(num_rows, 2))
+
+    return [
+        {
+            "Recipe1": recipes[recipe1],
+            "Action1_id": i % 50,
+            "Recipe2": recipes[recipe2],
+            "True_Label": true_label,
+            "Predicted_Label": predicted_label,
+        }
+        for i, ((recipe1, recipe2), (true_label, predicted_label)) in enumerate(zip(recipe_ids.tolist(), labels.tolist()))
+    ]
+
+
+def benchmark_results(num_rows, reference_rows):
+    """
+    Check ResultsCollector against row-wise appending to a DataFrame (DataFrame.append,
+    i.e. a concatenation per row) and time both; the reference, which is quadratic in the
+    number of rows, is timed on the first reference_rows rows only.
+    """
+
+    columns = ["Recipe1", "Action1_id", "Recipe2", "True_Label", "Predicted_Label"]
+    rows = synthetic_predictions(num_rows)
+
+    def append_rows(rows):
+        results_df = pd.DataFrame(columns=columns)
+        for row in rows:
+            results_df = pd.concat([results_df, pd.DataFrame([row])], ignore_index=True)
+        return results_df
+
+    def collect_rows(rows):
+        results = ResultsCollector(columns)
+        for row in rows:
+            results.add(row)
+        return results.to_frame()
+
+    reference_rows = min(reference_rows, num_rows)
+
+    pd.testing.assert_frame_equal(
+        collect_rows(rows[:reference_rows]), append_rows(rows[:reference_rows]), check_dtype=False
+    )
+
+    start = time.perf_counter()
+    append_rows(rows[:reference_rows])
+    append_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    collect_rows(rows)
+    collect_time = time.perf_counter() - start
+
+    print(
+        "Results match; DataFrame append {:.2f} s for {} rows, ResultsCollector {:.3f} s for {} rows".format(
+            append_time, reference_rows, collect_time, num_rows
+        )
+    )
+
+
+#####################################
+
+
+def synthetic_ged_predictions(num_rows, num_candidates, seed=0):
+    """
+    GED prediction rows (ranking and scores of all candidate actions) of a synthetic dish, generated one by one
+    """
+
+    rng = np.random.default_rng(seed)
+
+    for i in range(num_rows):
+        yield {
+            "Recipe1": "recipe_{}".format(i // 1000),
+            "Action1_id": i % 1000,
+            "Recipe2": "recipe_{}".format(i // 1000 + 1),
+            "Predicted_Label": rng.permutation(num_candidates).tolist(),
+            "Probabilities": np.sort(rng.random(num_candidates))[::-1].tolist(),
+        }
+
+
+def benchmark_predictions(num_rows, num_candidates):
+    """
+    Check the file of PredictionWriter against DataFrame.to_csv (utils.save_predictions()),
+    also after resuming a file cut off within a row, and report the time and peak memory of both.
+    """
+
+    columns = ["Recipe1", "Action1_id", "Recipe2", "Predicted_Label", "Probabilities"]
+
+    def collect_and_save(path):
+        results = ResultsCollector(columns)
+        for row in synthetic_ged_predictions(num_rows, num_candidates):
+            results.add(row)
+        results.to_frame().to_csv(path, sep="\t", index=False, encoding="utf-8")
+
+    def stream(path, resume=False):
+        with PredictionWriter(path, columns, resume=resume) as predictions:
+            for row in synthetic_ged_predictions(num_rows, num_candidates):
+                if (row["Recipe1"], row["Action1_id"], row["Recipe2"]) not in predictions:
+                    predictions.add(row)
+
+    def measured(function, path):
+        tracemalloc.start()
+        start = time.perf_counter()
+        function(path)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return duration, peak
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        reference_path = os.path.join(folder, "reference.tsv")
+        stream_path = os.path.join(folder, "stream.tsv")
+
+        reference_time, reference_peak = measured(collect_and_save, reference_path)
+        stream_time, stream_peak = measured(stream, stream_path)
+
+        with open(reference_path, "rb") as file:
+            reference = file.read()
+
+        with open(stream_path, "rb") as file:
+            if file.read() != reference:
+                raise RuntimeError("Streamed prediction file differs from DataFrame.to_csv")
+
+        # interrupted run: the file ends within a row
+        with open(stream_path, "rb+") as file:
+            file.truncate(len(reference) // 2 + 7)
+
+        stream(stream_path, resume=True)
+
+        with open(stream_path, "rb") as file:
+            if file.read() != reference:
+                raise RuntimeError("Resumed prediction file differs from DataFrame.to_csv")
+
+    print(
+        "{} rows X {} candidates: files match (also resumed); DataFrame.to_csv {:.2f} s, peak {:.1f} MB, PredictionWriter {:.2f} s, peak {:.1f} MB".format(
+            num_rows, num_candidates, reference_time, reference_peak / 2 ** 20, stream_time, stream_peak / 2 ** 20
+        )
+    )
+
+
+#####################################
+
+
+def benchmark_scores(num_pairs, num_actions, repeats):
+    """
+    Check the score matrices read from a .npz archive (score_matrices.py) against the ones
+    parsed from its TSV export with literal_eval and time the loading of both.
+    """
+
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        npz_path = os.path.join(folder, "prediction.npz")
+        tsv_path = os.path.join(folder, "prediction.tsv")
+
+        with ScoreMatrixWriter(npz_path) as score_matrices:
+            for pair_id in range(num_pairs):
+                score_matrices.add_pair(
+                    "recipe_{}".format(pair_id),
+                    "recipe_{}".format(pair_id + 1),
+                    list(range(1, num_actions + 1)),
+                    list(range(num_actions + 1)),
+                    rng.random((num_actions, num_actions + 1)),
+                )
+
+        export_tsv(npz_path, tsv_path)
+
+        def load_tsv():
+            score_matrices = dict()
+            predictions = pd.read_csv(tsv_path, sep="\t")
+            for (recipe1, recipe2), pair_predictions in predictions.groupby(["Recipe1", "Recipe2"], sort=False):
+                labels = np.array([literal_eval(label) for label in pair_predictions["Predicted_Label"]])
+                scores = np.array([literal_eval(score) for score in pair_predictions["Probabilities"]], dtype=np.float32)
+                target_ids = np.sort(labels[0])
+                matrix = np.zeros_like(scores)
+                np.put_along_axis(matrix, np.searchsorted(target_ids, labels), scores, axis=1)
+                score_matrices[recipe1, recipe2] = (pair_predictions["Action1_id"].to_numpy(), target_ids, matrix)
+            return score_matrices
+
+        npz_matrices = load_score_matrices(npz_path)
+        tsv_matrices = load_tsv()
+
+        if list(npz_matrices) != list(tsv_matrices):
+            raise RuntimeError("Recipe pairs of the .npz archive and the TSV export differ")
+
+        for key, arrays in npz_matrices.items():
+            for npz_array, tsv_array in zip(arrays, tsv_matrices[key]):
+                if not np.array_equal(npz_array, tsv_array):
+                    raise RuntimeError("Score matrices of {} differ".format(key))
+
+        tsv_time = timed(load_tsv, repeats)
+        npz_time = timed(lambda: load_score_matrices(npz_path), repeats)
+
+        print(
+            "{} pairs X {} actions: score matrices match; TSV + literal_eval {:.2f} s ({:.1f} MB), npz {:.3f} s ({:.1f} MB)".format(
+                num_pairs,
+                num_actions,
+                tsv_time,
+                os.path.getsize(tsv_path) / 2 ** 20,
+                npz_time,
+                os.path.getsize(npz_path) / 2 ** 20,
+            )
+        )
+
+
+#####################################
+
+
+def synthetic_edit_problem(num_actions1, num_actions2, rng):
+    """
+    Graph edit distance problem between two random trees of actions with random edit costs in [0, 1]
+    """
+
+    edges1 = {(int(rng.integers(j)), j) for j in range(1, num_actions1)}
+    edges2 = {(int(rng.integers(j)), j) for j in range(1, num_actions2)}
+
+    costs = (rng.random((num_actions1, num_actions2)), rng.random(num_actions1), rng.random(num_actions2))
+
+    return EditProblem(edges1, edges2, costs)
+
+
+def brute_force_distance(problem):
+    """
+    Graph edit distance as the minimal cost of all node mappings
+    """
+
+    return min(
+        problem.path_cost(list(mapping))
+        for mapping in product(range(-1, problem.num_nodes2), repeat=problem.num_nodes1)
+        if len({j for j in mapping if j >= 0}) == sum(1 for j in mapping if j >= 0)
+    )
+
+
+def benchmark_ged(num_pairs, exact_actions, num_actions):
+    """
+    Check the A* graph edit distance (graph_edit_distance.py) against all node mappings of small
+    random graphs and the bipartite approximation against it, and time both on larger graphs.
+    """
+
+    rng = np.random.default_rng(0)
+
+    for _ in range(num_pairs):
+
+        problem = synthetic_edit_problem(
+            int(rng.integers(1, exact_actions + 1)), int(rng.integers(1, exact_actions + 1)), rng
+        )
+
+        mapping, exact = problem.astar_mapping(problem.bipartite_mapping())
+        distance = brute_force_distance(problem)
+
+        if not exact or not np.isclose(problem.path_cost(mapping), distance):
+            raise RuntimeError("A* distance {} differs from {}".format(problem.path_cost(mapping), distance))
+
+        if problem.path_cost(problem.bipartite_mapping()) < distance - 1e-9:
+            raise RuntimeError("Bipartite distance is below the graph edit distance")
+
+    problems = [synthetic_edit_problem(num_actions, num_actions, rng) for _ in range(num_pairs)]
+
+    start = time.perf_counter()
+    bipartite_distances = [problem.path_cost(problem.bipartite_mapping()) for problem in problems]
+    bipartite_time = (time.perf_counter() - start) / num_pairs
+
+    medium_actions = exact_actions + 2
+    medium_problems = [synthetic_edit_problem(medium_actions, medium_actions, rng) for _ in range(num_pairs)]
+
+    start = time.perf_counter()
+    medium_mappings = [problem.astar_mapping(problem.bipartite_mapping()) for problem in medium_problems]
+    astar_time = (time.perf_counter() - start) / num_pairs
+
+    # mean relative excess of the bipartite approximation over the graph edit distance
+    excess = np.mean(
+        [
+            problem.path_cost(problem.bipartite_mapping()) / problem.path_cost(mapping) - 1
+            for problem, (mapping, _) in zip(medium_problems, medium_mappings)
+        ]
+    )
+
+    print(
+        "{} pairs of <= {} actions: A* matches all mappings; A* {:.3f} s per pair of {} actions (bipartite +{:.1%}), bipartite {:.4f} s per pair of {} actions (mean distance {:.1f})".format(
+            num_pairs,
+            exact_actions,
+            astar_time,
+            medium_actions,
+            excess,
+            bipartite_time,
+            num_actions,
+            np.mean(bipartite_distances),
+        )
+    )
+
+
+#####################################
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="""Regression checks and microbenchmarks""")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    encoder_parser = subparsers.add_parser("encoder", help="""Neighbourhood LSTMs of the Encoder for a high-degree node""")
+    encoder_parser.add_argument('--degree', type=int, default=64, help="""Number of parents and of children (Default: 64)""")
+    encoder_parser.add_argument('--dim', type=int, default=768, help="""Embedding dimension (Default: 768)""")
+    encoder_parser.add_argument('--repeats', type=int, default=10, help="""Timing repetitions (Default: 10)""")
+
+    conllu_parser = subparsers.add_parser("conllu", help="""Loading of the recipe corpus with the columnar reader and with conllu""")
+    conllu_parser.add_argument('--data_folder', type=str, default="./data", help="""Data folder with one subfolder per dish (Default: ./data)""")
+    conllu_parser.add_argument('--repeats', type=int, default=5, help="""Timing repetitions (Default: 5)""")
+
+    results_parser = subparsers.add_parser("results", help="""Accumulation of prediction rows with ResultsCollector and with DataFrame append""")
+    results_parser.add_argument('--rows', type=int, default=100000, help="""Number of action pairs of the synthetic dish (Default: 100000)""")
+    results_parser.add_argument('--reference_rows', type=int, default=5000, help="""Number of rows appended to a DataFrame for the reference (Default: 5000)""")
+
+    predictions_parser = subparsers.add_parser("predictions", help="""Prediction files of GED testing streamed with PredictionWriter and saved with DataFrame.to_csv""")
+    predictions_parser.add_argument('--rows', type=int, default=20000, help="""Number of source actions of the synthetic dish (Default: 20000)""")
+    predictions_parser.add_argument('--candidates', type=int, default=100, help="""Number of candidate actions per source action (Default: 100)""")
+
+    scores_parser = subparsers.add_parser("scores", help="""Loading of GED score matrices from .npz and from TSV prediction files""")
+    scores_parser.add_argument('--pairs', type=int, default=200, help="""Number of recipe pairs (Default: 200)""")
+    scores_parser.add_argument('--actions', type=int, default=60, help="""Number of actions per recipe (Default: 60)""")
+    scores_parser.add_argument('--repeats', type=int, default=3, help="""Timing repetitions (Default: 3)""")
+
+    ged_parser = subparsers.add_parser("ged", help="""Graph edit distance with A* search and with the bipartite approximation""")
+    ged_parser.add_argument('--pairs', type=int, default=50, help="""Number of random graph pairs (Default: 50)""")
+    ged_parser.add_argument('--exact_actions', type=int, default=6, help="""Largest number of actions per graph checked against all node mappings (Default: 6)""")
+    ged_parser.add_argument('--actions', type=int, default=40, help="""Number of actions per graph for the bipartite timing (Default: 40)""")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "encoder":
+        benchmark_encoder(args.degree, args.dim, args.repeats)
+
+    elif args.benchmark == "conllu":
+        benchmark_conllu(args.data_folder, args.repeats)
+
+    elif args.benchmark == "results":
+        benchmark_results(args.rows, args.reference_rows)
+
+    elif args.benchmark == "predictions":
+        benchmark_predictions(args.rows, args.candidates)
+
+    elif args.benchmark == "scores":
+        benchmark_scores(args.pairs, args.actions, args.repeats)
+
+    elif args.benchmark == "ged":
+        benchmark_ged(args.pairs, args.exact_actions, args.actions)
+
+
+if __name__ == "__main__":
+
+    main()
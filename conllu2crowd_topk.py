@@ -46,6 +46,8 @@ import argparse
 import ast
 import csv
 
+from recipe_registry import fetch_recipe
+
 # Colour definitions
 target_colours = [
     "green",
@@ -552,57 +554,24 @@ def readfile(filename):
     Read in recipe file in CoNLL-U format.
     Relevant columns: TOKEN-ID, FORM, _, _, TAG, _, _, _, _, _
     Action tags should start with B-A or I-A
+    The file is parsed once per process (see recipe_registry.py).
 
     Returns:
         - filename : str Path to file.
         - tokens : list(str)
         - events : list(list(int)) List of lists of token indices for all actions in the recipe.
     """
-    with open(filename, "r", encoding="utf-8") as f:
-        # result variables
-        tokens = []
-        events = []
-        # buffer variable
-        event_acc = []
-
-        # Check if the file is empty (there are broken files in the corpus).
-        if os.stat(filename).st_size == 0:
-            # discard the slide by raising an Error
-            raise IOError(f"Empty file {filename}.")
+    # Check if the file is empty (there are broken files in the corpus).
+    if os.stat(filename).st_size == 0:
+        # discard the slide by raising an Error
+        raise IOError(f"Empty file {filename}.")
 
-        for line in f:
-            # sometimes, there are two empty lines at the end of a file
-            if line == "\n":
-                break
-            line = line.split("\t")
-            tokens.append(line[1])
-
-            # determine action sequences and store as lists of indexes in the variable events
-            if line[4].startswith("B-A"):
-                if event_acc != []:
-                    events.append(event_acc)
-                event_acc = [int(line[0])]
-            elif line[4].startswith("I-A"):
-                event_acc.append(int(line[0]))
-            elif line[4] == "O":
-                if event_acc != []:
-                    events.append(event_acc)
-                    event_acc = []
-            else:
-                # sanity check
-                #raise RuntimeError(
-                 #   f"Unexpected tag {line[4]} in for token {line[0]} in {filename}."
-                #)
-                # TODO: think about which version was better: only allowing tags B-A and I-A (previous) or allowing all labels starting with 'A' (current)
-                if event_acc != []:
-                    events.append(event_acc)
-                    event_acc = []
-
-        # if the last token was an action token , it's still in the buffer
-        if event_acc != []:
-            events.append(event_acc)
-
-        return filename, tokens, events
+    recipe = fetch_recipe(filename)
+
+    tokens = list(recipe.tokens)
+    events = [list(event) for event in recipe.events]
+
+    return filename, tokens, events
 
 
 class Question:
@@ -0,0 +1,156 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Fast reader for the 10-column CoNLL-U recipe format (data/<dish>/recipes).
+
+Recipe lines are plain tab-separated token lines (integer id and head, tag in the
+'xpos' column, no FEATS/MISC/DEPS values). Such files are read column by column
+without building a conllu TokenList per token; files with any other line (comments,
+multiword or empty nodes, feature values, ...) are parsed with conllu.
+"""
+
+# importing libraries
+from conllu import parse
+
+
+FIELDS = ("id", "form", "lemma", "upos", "xpos", "feats", "head", "deprel", "deps", "misc")
+
+
+def read_columns(lines):
+    """
+    Columns of the sentences of a recipe file in the plain recipe format
+
+    Parameters
+    ----------
+    lines : Iterable of String
+        Lines of the file.
+
+    Returns
+    -------
+    sentences : List of Dict or None
+        Per sentence, a dictionary from every field in FIELDS to the list of its values
+        (as conllu.parse() would give them); None if a line is not in the plain recipe format.
+
+    """
+
+    sentences = []
+    rows = []
+
+    for line in lines:
+        line = line.strip()
+
+        if not line:
+            if rows:
+                sentences.append(rows)
+                rows = []
+            continue
+
+        # conllu also splits columns on two or more spaces
+        if "  " in line:
+            return None
+
+        row = line.split("\t")
+
+        if (
+            len(row) != 10
+            or not row[0].isdecimal()
+            or not row[6].isdecimal()
+            or row[4] == "_"
+            or row[5] != "_"
+            or row[8] != "_"
+            or row[9] != "_"
+        ):
+            return None
+
+        rows.append(row)
+
+    if rows:
+        sentences.append(rows)
+
+    columns_list = []
+
+    for rows in sentences:
+
+        columns = dict(zip(FIELDS, map(list, zip(*rows))))
+
+        columns["id"] = list(map(int, columns["id"]))
+        columns["head"] = list(map(int, columns["head"]))
+        columns["feats"] = columns["deps"] = columns["misc"] = [None] * len(rows)
+
+        columns_list.append(columns)
+
+    return columns_list
+
+
+#####################################
+
+
+def token_columns(parsed_recipe):
+    """
+    Columns of the sentences of a conllu parsed file (same layout as read_columns())
+    """
+
+    return [{field: [token[field] for token in sentence] for field in FIELDS} for sentence in parsed_recipe]
+
+
+#####################################
+
+
+def column_tokens(sentences):
+    """
+    Token dictionaries (as in a conllu TokenList) of the sentences returned by read_columns()
+
+    Returns
+    -------
+    parsed_recipe : List of List of Dict
+        Per sentence, the list of token dictionaries.
+
+    """
+
+    return [
+        [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+        for columns in sentences
+    ]
+
+
+#####################################
+
+
+def read_recipe_file(filename):
+    """
+    Read a recipe file, with conllu as fallback for lines that are not in the plain recipe format
+
+    Parameters
+    ----------
+    filename : String
+        Recipe filename.
+
+    Returns
+    -------
+    sentences : List of Dict
+        Columns of every sentence (see read_columns()).
+    parsed_recipe : List or None
+        Conllu parsed file if conllu was used, otherwise None (see column_tokens()).
+
+    """
+
+    with open(filename, "r", encoding="utf-8") as file:
+        sentences = read_columns(file)
+
+        if sentences is not None:
+            return sentences, None
+
+        file.seek(0)
+        parsed_recipe = parse(file.read())
+
+    return token_columns(parsed_recipe), parsed_recipe
@@ -30,8 +30,19 @@ DROPOUT2 = 0.5 # Dropout-rate after hidden layer 2
 LR = 0.00001  # Learning rate for Adam optimizer
 MAX_EPOCHS = 1  # Training Epochs
 CUDA_DEVICE = "cuda:2"  # GPU 
+SEPARATE_NEIGHBOURHOODS = False  # Encode the child nodes on their own instead of after the parent nodes (see model.Encoder); test with the setting used in training
+ENCODING_CACHE_SIZE = 64  # Number of recipe encodings memoized by the Alignment model in eval mode (see model.AlignmentModel.encode_recipe())
 PATIENCE = 250
 OPTIMIZER = "Adam" # one of the following: "Adam" (used in the original model; uses LR), "DefaultAdam" (uses default lr), "SGD" (uses default lr and exponential lr scheduler), "RMSprop" (uses default lr), "Adagrad" (uses default lr)
+TRAIN_BATCH_SIZE = 1  # Number of source actions per optimizer step for the Alignment Model; 1 is the original training with one step per action
+UPDATE_ON_ERROR = True  # Update the model only with the actions whose alignment is predicted wrongly (the original training)
+TRAIN_SHUFFLE = True  # Shuffle the actions of all training dishes in every epoch of mini-batched training (TRAIN_BATCH_SIZE > 1)
+DATA_LOADER_WORKERS = 0  # Number of worker processes preparing the batches of mini-batched training (CPU only)
+TRAIN_SEED = 0  # Seed for shuffling the training data
+BERT_BATCH_SIZE = 8  # Number of recipes per BERT forward pass when computing embeddings (recipes are bucketed by length)
+BERT_WINDOW_SIZE = 512  # Maximum number of subwords per BERT forward pass; longer recipes are encoded in overlapping windows
+BERT_WINDOW_STRIDE = 256  # Distance (in subwords) between consecutive windows, i.e. windows overlap by BERT_WINDOW_SIZE - 2 - BERT_WINDOW_STRIDE subwords
+BERT_VERIFY_LOOKUP = False  # Check the subword offsets from the fast tokenizer against tokenizing every recipe token on its own
 #####################################
 
 
@@ -42,6 +53,11 @@ destination_folder2 = "./results2"  # Destination folder for the trained model a
 destination_folder3 = "./results3"  # Destination folder for the trained model and metrics for cosine similarity baseline model
 destination_folder4 = "./results4"  # Destination folder for the heuristics for naive baseline model
 prediction_file = "prediction.tsv"  # Testing results
+PREDICTION_FLUSH_ROWS = 1000  # Number of prediction rows written between flushes of a streamed prediction file (see prediction_writer.py)
+TOP_K = 7  # Number of alignments per action in the top k predictions (see inference.py)
+GED_EDGE_COST = 1.0  # Cost of deleting or inserting an edge of a recipe graph (see graph_edit_distance.py)
+GED_EXACT_MAX_NODES = 16  # Largest number of actions of both recipes for the exact (A*) graph edit distance
+GED_TIME_BUDGET = 10.0  # Maximal A* search time in seconds per recipe pair (None for no limit)
 
 
 #####################################
@@ -53,3 +69,6 @@ folder = "../fine-tuning/data"  # Dataset folder
 test_folder = "../fine-tuning/data" # Folder with the gold data for evaluation
 recipe_folder_name = "recipes"  # Folder containing recipes
 alignment_file = "alignments.tsv"  # Alignment file
+pair_plan_file = "pair_plan.json"  # Recipe pairs of a dish for testing, cached in the dish folder (see pair_plan.py; set to None to disable caching)
+embedding_cache_folder = "./embedding_cache"  # Folder for the cached recipe embeddings (set to None to disable caching)
+RECIPE_REGISTRY_SIZE = 4096  # Number of parsed recipe files kept in memory per process (see recipe_registry.py)
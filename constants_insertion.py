@@ -26,6 +26,7 @@ OUTPUT_DIM = 1  # Classifier output_dim
 LR = 0.0001  # Learning rate for optimizer
 MAX_EPOCHS = 70  # Training Epochs
 CUDA_DEVICE = "cuda:0"  # GPU 
+SEPARATE_NEIGHBOURHOODS = False  # Encode the child nodes on their own instead of after the parent nodes (see model.Encoder); test with the setting used in training
 
 #####################################
 
@@ -48,3 +49,5 @@ folder = "./data"  # Dataset folder
 test_folder = "./test" # Folder with test data
 recipe_folder_name = "recipes"  # Folder containing recipes
 alignment_file = "alignments.tsv"  # Alignment file
+pair_plan_file = "pair_plan.json"  # Recipe pairs of a dish for testing, cached in the dish folder (see pair_plan.py; set to None to disable caching)
+embedding_cache_folder = "./embedding_cache"  # Folder for the cached recipe embeddings (set to None to disable caching)
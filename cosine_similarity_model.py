@@ -19,6 +19,8 @@ Simple Baseline Model: Cosine Similarity
 import torch
 import torch.nn as nn
 
+from model import node_embeddings
+
 
 class SimpleModel(nn.Module):
     
@@ -42,12 +44,10 @@ class SimpleModel(nn.Module):
          ----------
          node : Tensor node_sequence_length
              Node.
-         embedding_vectors : Dict
-             Embedding dictionary for a particular Recipe;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list : Dict
-             Look up dictionary for a particular Recipe embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+         embedding_vectors : Tensor num_subwords X embedding_dim
+             Embedding matrix for a particular Recipe (BERT/ELMO).
+        vector_lookup_list : Array num_tokens + 1
+             Offsets into embedding_vectors for the Conllu file token ids.
 
          Returns
          -------
@@ -62,21 +62,9 @@ class SimpleModel(nn.Module):
 
         if len(node):
 
-            emb_id_list = []
-
-            for token_id in node:
-
-                emb_id_list.extend(vector_lookup_list[token_id.item()])
-
-            for emb_id in emb_id_list:
-
-                emb = torch.unsqueeze(
-                    embedding_vectors[emb_id], dim=0
-                )  # 1 X embedding_dim
-
-                token_list = token_list.add(emb)  # 1 X embedding_dim
+            emb = node_embeddings(node, embedding_vectors, vector_lookup_list).to(self.device)
 
-            embedding = token_list / len(emb_id_list)  # 1 X embedding_dim
+            embedding = token_list.add(torch.sum(emb, dim=0, keepdim=True)) / len(emb)  # 1 X embedding_dim
 
         else:
 
@@ -100,21 +88,17 @@ class SimpleModel(nn.Module):
         ----------
         action1 : Tensor  action_sequence_length
             Action Node from Recipe1.
-        embedding_vectors1 : Dict
-             Embedding dictionary for Recipe 1;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list1 : Dict
-             Look up dictionary for Recipe 1 embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+        embedding_vectors1 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 1 (BERT/ELMO).
+        vector_lookup_list1 : Array num_tokens + 1
+             Offsets into embedding_vectors1 for the Conllu file token ids of Recipe 1.
         recipe2_actions : List of dict
             List of all action dictionaries from Recipe2
                 (action dictionaries contain action node and their corresponding lists of parent nodes and child nodes).
-        embedding_vectors2 : Dict
-             Embedding dictionary for Recipe 2;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list2 : Dict
-             Look up dictionary for Recipe 2 embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+        embedding_vectors2 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 2 (BERT/ELMO).
+        vector_lookup_list2 : Array num_tokens + 1
+             Offsets into embedding_vectors2 for the Conllu file token ids of Recipe 2.
 
 
         Returns
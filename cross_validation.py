@@ -0,0 +1,248 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cross validation of the Alignment models in one process.
+
+The embedding model is loaded and the recipes of all dishes are read and embedded
+once; every fold then trains a freshly initialized model (see train.py) and tests
+its best checkpoint (see test_best_alignment.py). The fold results are appended to
+fold_results_train.tsv and fold_results_test.tsv in the destination folder, as by
+train.py and test_best_alignment.py.
+
+Usage: python cross_validation.py model_name --embedding_name [embedding_name] --folds [folds] --processes [processes]
+
+(model_name: ['Alignment-no-feature' : Base Alignment model,
+              'Alignment-with-feature' : Extended Alignment model])
+"""
+
+# importing libraries
+import os
+import torch
+import argparse
+import torch.nn as nn
+
+from datetime import datetime
+from train import Folds_Train, create_fold_model, add_training_arguments
+from test_best_alignment import Folds_Test
+from embedding_cache import EmbeddingCache, MemoryEmbeddingCache, load_embedding_model
+from utils import parse_folds, save_fold_results, fold_workers, run_fold_pool
+from constants import (
+    folder,
+    embedding_cache_folder,
+    destination_folder1,
+    destination_folder2,
+    MAX_EPOCHS,
+    PATIENCE,
+    CUDA_DEVICE,
+)
+
+
+class CrossValidation:
+    def __init__(self, embedding_name, emb_model, tokenizer, embedding_dim, device, trainer, tester, with_feature=True):
+        """
+        Training and testing of the folds on the data loaded once
+
+        Parameters
+        ----------
+        embedding_name : String
+            Either 'elmo' or 'bert'.
+        emb_model : Embedding Model object
+            Model.
+        tokenizer : Tokenizer object
+            Tokenizer.
+        embedding_dim : Int
+            Embedding dimension.
+        device : object
+            torch device where model tensors are saved.
+        trainer : Folds_Train object
+            Training process with the training data of all dishes (see Folds_Train.load_dishes()).
+        tester : Folds_Test object
+            Testing process with the test data of all dishes (see Folds_Test.load_dishes()).
+        with_feature : boolean, optional
+            Extended ('Alignment-with-feature') or Base ('Alignment-no-feature') Alignment model. The default is True.
+        """
+
+        self.embedding_name = embedding_name
+        self.emb_model = emb_model
+        self.tokenizer = tokenizer
+        self.embedding_dim = embedding_dim
+        self.device = device
+        self.trainer = trainer
+        self.tester = tester
+        self.with_feature = with_feature
+
+    def run_fold(self, fold, save_results=True):
+        """
+        Train a freshly initialized model on a fold and test its best checkpoint
+
+        Parameters
+        ----------
+        fold : Int
+            Fold number.
+        save_results : boolean, optional
+            Append the fold results to the fold results files. The default is True.
+
+        Returns
+        -------
+        train_result_df, test_result_df : pd.DataFrame
+            Training and testing results of the fold.
+
+        """
+
+        model, optimizer, scheduler = create_fold_model(
+            fold, self.trainer.seed, self.embedding_dim, self.device, self.with_feature
+        )
+
+        criterion = nn.CrossEntropyLoss()  # Loss function
+
+        train_result_df = self.trainer.run_folds_train(
+            self.embedding_name,
+            self.emb_model,
+            self.tokenizer,
+            model,
+            optimizer,
+            criterion,
+            MAX_EPOCHS,
+            self.device,
+            PATIENCE,
+            self.with_feature,
+            scheduler=scheduler,
+            fold=fold,
+            save_results=save_results,
+        )
+
+        test_result_df = self.tester.run_folds_test(
+            self.embedding_name,
+            self.emb_model,
+            self.tokenizer,
+            model,
+            optimizer,
+            criterion,
+            MAX_EPOCHS,
+            self.device,
+            self.with_feature,
+            fold=fold,
+            save_results=save_results,
+        )
+
+        return train_result_df, test_result_df
+
+
+#####################################
+
+
+cross_validation = None  # CrossValidation object of the process; inherited by the pool workers
+
+
+def run_fold(fold):
+    """
+    Run a fold in a pool worker; the results are saved by the main process
+    """
+
+    return cross_validation.run_fold(fold, save_results=False)
+
+
+#####################################
+
+
+def main():
+
+    global cross_validation
+
+    parser = argparse.ArgumentParser(description="""Cross validation of the Alignment models in one process""")
+    parser.add_argument('model_name', type=str, help="""Model Name; one of {'Alignment-no-feature', 'Alignment-with-feature'}""")
+    parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
+    parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
+    parser.add_argument('--folds', type=str, help="""Folds to run, e.g. 1-10 or 1,3,5 (Default: one fold per dish)""")
+    parser.add_argument('--processes', type=int, default=1, help="""Number of folds run in parallel processes; CPU only (Default: 1)""")
+    add_training_arguments(parser)  # same training options as train.py
+    args = parser.parse_args()
+
+    if args.model_name == "Alignment-with-feature":
+        with_feature = True
+        destination_folder = destination_folder1
+
+    elif args.model_name == "Alignment-no-feature":
+        with_feature = False
+        destination_folder = destination_folder2
+
+    else:
+        raise ValueError("Model name should be one of ['Alignment-no-feature', 'Alignment-with-feature']")
+
+    device = torch.device(CUDA_DEVICE if torch.cuda.is_available() else "cpu")
+
+    if args.cuda_device:
+        device = torch.device("cuda:" + args.cuda_device if torch.cuda.is_available() else "cpu")
+
+    if args.embedding_name == "elmo":
+        import flair
+        flair.device = device
+
+    dish_list = sorted(dish for dish in os.listdir(folder) if not dish.startswith("."))
+
+    fold_list = parse_folds(args.folds) if args.folds else list(range(1, len(dish_list) + 1))
+
+    # folds in parallel processes: forked from this process s.t. they share the loaded data
+    workers = fold_workers(args.processes, len(fold_list), device)
+
+    print("-------Loading Model-------")
+
+    emb_model, tokenizer, embedding_dim = load_embedding_model(args.embedding_name, device)
+
+    # recipes are embedded once for training and testing (and stored on disk if embedding_cache_folder is set)
+    if embedding_cache_folder:
+        embedding_cache = MemoryEmbeddingCache(EmbeddingCache(embedding_cache_folder, args.embedding_name, emb_model))
+    else:
+        embedding_cache = MemoryEmbeddingCache()
+
+    trainer = Folds_Train(
+        batch_size=args.batch_size,
+        update_on_error=args.update_on_error,
+        shuffle=args.shuffle,
+        loader_workers=0 if workers > 1 else args.loader_workers,  # pool workers cannot start processes
+        seed=args.seed,
+        embedding_cache=embedding_cache,
+    )
+    tester = Folds_Test(embedding_cache=embedding_cache)
+
+    print("-------Loading Data-------")
+
+    trainer.load_dishes(dish_list, args.embedding_name, emb_model, tokenizer, device)
+    tester.load_dishes(dish_list, args.embedding_name, emb_model, tokenizer, device)
+
+    cross_validation = CrossValidation(
+        args.embedding_name, emb_model, tokenizer, embedding_dim, device, trainer, tester, with_feature
+    )
+
+    start = datetime.now()
+
+    # results are saved in fold order as the folds finish
+    for fold, (train_result_df, test_result_df) in zip(fold_list, run_fold_pool(run_fold, fold_list, workers)):
+
+        save_fold_results(train_result_df, os.path.join(destination_folder, "fold_results_train.tsv"))
+        save_fold_results(test_result_df, os.path.join(destination_folder, "fold_results_test.tsv"))
+
+        print("Fold {} Results saved in ==> {}".format(fold, destination_folder))
+
+    elapsed_duration = divmod((datetime.now() - start).total_seconds(), 60)
+
+    print(
+        "Cross validation of folds {} finished in {} mins and {:.2f} secs".format(
+            fold_list, elapsed_duration[0], elapsed_duration[1]
+        )
+    )
+
+
+if __name__ == "__main__":
+
+    main()
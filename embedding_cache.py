@@ -0,0 +1,433 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent on-disk store for the contextual embeddings (BERT/ELMO) of recipes.
+
+Recipes are addressed by a hash of their token forms, the embedding name, the
+embedding model id, the layer combination and (for BERT) the window size and stride
+of long recipes, so that the embeddings of a recipe
+are computed once and reused by all training and testing runs (and all folds).
+Each entry is a contiguous num_subwords X embedding_dim matrix (.npy, opened
+memory-mapped) plus the array of token offsets into that matrix.
+
+Usage: python embedding_cache.py [data_folder] --embedding_name [embedding_name]
+"""
+
+# importing libraries
+import os
+import json
+import torch
+import hashlib
+import numpy as np
+import argparse
+
+from constants import BERT_WINDOW_SIZE, BERT_WINDOW_STRIDE
+
+
+# Layer combination used to compute the token vectors (see utils.generate_bert_embeddings / generate_elmo_embeddings)
+layer_combinations = {
+    "bert": "sum_last_2_hidden_layers",
+    "elmo": "flair_elmo_default",
+}
+
+
+def embedding_model_id(emb_model, embedding_name):
+    """
+    Identifier of the pretrained embedding model
+
+    Parameters
+    ----------
+    emb_model : Embedding Model object
+        BertModel (HuggingFace) or ELMoEmbeddings (Flair).
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+
+    Returns
+    -------
+    model_id : String
+        Name (or path) of the pretrained model, e.g. 'bert-base-uncased'.
+
+    """
+
+    if embedding_name == "bert":
+        return getattr(emb_model.config, "_name_or_path", "") or "bert"
+
+    return getattr(emb_model, "name", "") or embedding_name
+
+
+#####################################
+
+
+class EmbeddingCache:
+    def __init__(self, cache_folder, embedding_name, emb_model=None, model_id=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        cache_folder : String
+            Folder where the embeddings are stored.
+        embedding_name : String
+            Either 'elmo' or 'bert'.
+        emb_model : Embedding Model object, optional
+            Model; used to determine the model id if model_id is not given.
+        model_id : String, optional
+            Name of the pretrained embedding model.
+        """
+
+        self.cache_folder = cache_folder
+        self.embedding_name = embedding_name
+        self.model_id = model_id or embedding_model_id(emb_model, embedding_name)
+        self.layer_combination = layer_combinations[embedding_name]
+
+        # BERT vectors of recipes longer than one window depend on the windowing (see utils.bert_window_starts())
+        self.windowing = [BERT_WINDOW_SIZE, BERT_WINDOW_STRIDE] if embedding_name == "bert" else []
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    def key(self, token_forms):
+        """
+        Content hash of a recipe
+
+        Parameters
+        ----------
+        token_forms : List of String
+            Token forms of the recipe (Conllu 'form' column).
+
+        Returns
+        -------
+        key : String
+            Hex digest identifying the embeddings of the recipe.
+
+        """
+
+        content = json.dumps(
+            [self.embedding_name, self.model_id, self.layer_combination] + self.windowing + [list(token_forms)],
+            ensure_ascii=False,
+        )
+
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        """
+        File paths of a cache entry (embedding matrix, offsets)
+        """
+
+        return (
+            os.path.join(self.cache_folder, key + ".vectors.npy"),
+            os.path.join(self.cache_folder, key + ".offsets.npy"),
+        )
+
+    def contains(self, token_forms):
+        """
+        Check whether the embeddings of a recipe are cached
+        """
+
+        vectors_path, offsets_path = self.path(self.key(token_forms))
+
+        return os.path.exists(vectors_path) and os.path.exists(offsets_path)
+
+    def load(self, token_forms, device):
+        """
+        Fetch the cached embeddings of a recipe.
+        The embedding matrix is memory-mapped, i.e. only the rows that are used are read from disk.
+
+        Parameters
+        ----------
+        token_forms : List of String
+            Token forms of the recipe.
+        device : object
+            torch device where model tensors are saved.
+
+        Returns
+        -------
+        (embedding_vectors, vector_lookup_list) or None
+            Embedding matrix and offsets as returned by utils.generate_bert_embeddings; None on a cache miss.
+
+        """
+
+        if not self.contains(token_forms):
+            return None
+
+        vectors_path, offsets_path = self.path(self.key(token_forms))
+
+        # copy-on-write mapping: read lazily from disk, writable for torch
+        embedding_vectors = torch.from_numpy(np.load(vectors_path, mmap_mode="c"))
+
+        if torch.device(device).type != "cpu":
+            embedding_vectors = embedding_vectors.to(device)
+
+        vector_lookup_list = np.load(offsets_path)
+
+        return embedding_vectors, vector_lookup_list
+
+    def save(self, token_forms, embedding_vectors, vector_lookup_list):
+        """
+        Store the embeddings of a recipe
+
+        Parameters
+        ----------
+        token_forms : List of String
+            Token forms of the recipe.
+        embedding_vectors : Tensor num_subwords X embedding_dim
+            Embedding matrix for the recipe.
+        vector_lookup_list : Array num_tokens + 1
+            Offsets into the embedding matrix for the recipe tokens.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        vectors_path, offsets_path = self.path(self.key(token_forms))
+
+        # vectors are written last s.t. concurrent readers never see partial entries (see contains())
+        self._write(offsets_path, np.asarray(vector_lookup_list, dtype=np.int64))
+        self._write(vectors_path, embedding_vectors.detach().cpu().numpy().astype(np.float32))
+
+    @staticmethod
+    def _write(path, array):
+        """
+        Atomically write a numpy array to path
+        """
+
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+
+        os.replace(tmp_path, path)
+
+
+#####################################
+
+
+class MemoryEmbeddingCache:
+    def __init__(self, embedding_cache=None):
+        """
+        In-process store for the embeddings of recipes with the interface of EmbeddingCache,
+        s.t. a recipe read several times in one process (e.g. for training and testing) is embedded once
+
+        Parameters
+        ----------
+        embedding_cache : EmbeddingCache object, optional
+            On-disk store consulted on a miss and populated with new embeddings. The default is None.
+        """
+
+        self.embedding_cache = embedding_cache
+        self.embeddings = dict()  # token forms -> (embedding_vectors, vector_lookup_list)
+
+    def contains(self, token_forms):
+        """
+        Check whether the embeddings of a recipe are stored
+        """
+
+        return tuple(token_forms) in self.embeddings or (
+            self.embedding_cache is not None and self.embedding_cache.contains(token_forms)
+        )
+
+    def load(self, token_forms, device):
+        """
+        Fetch the stored embeddings of a recipe (see EmbeddingCache.load())
+        """
+
+        key = tuple(token_forms)
+
+        if key not in self.embeddings:
+
+            if self.embedding_cache is None:
+                return None
+
+            cached = self.embedding_cache.load(token_forms, device)
+
+            if cached is None:
+                return None
+
+            self.embeddings[key] = cached
+
+        return self.embeddings[key]
+
+    def save(self, token_forms, embedding_vectors, vector_lookup_list):
+        """
+        Store the embeddings of a recipe (see EmbeddingCache.save())
+        """
+
+        self.embeddings[tuple(token_forms)] = (embedding_vectors, vector_lookup_list)
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.save(token_forms, embedding_vectors, vector_lookup_list)
+
+
+#####################################
+
+
+def load_embedding_model(embedding_name, device):
+    """
+    Load the pretrained embedding model and its tokenizer
+
+    Parameters
+    ----------
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    device : object
+        torch device where model tensors are saved.
+
+    Returns
+    -------
+    emb_model : Embedding Model object
+        Model.
+    tokenizer : Tokenizer object
+        Tokenizer.
+    embedding_dim : Int
+        Embedding dimension.
+
+    """
+
+    if embedding_name == "bert":
+
+        from transformers import BertTokenizerFast, BertModel
+
+        tokenizer = BertTokenizerFast.from_pretrained("bert-base-uncased")  # Bert Tokenizer
+
+        emb_model = BertModel.from_pretrained(
+            "bert-base-uncased", output_hidden_states=True
+        ).to(device)  # Bert Model for Embeddings
+
+        embedding_dim = emb_model.config.to_dict()["hidden_size"]  # BERT embedding dimension
+
+    elif embedding_name == "elmo":
+
+        from flair.data import Sentence
+        from flair.embeddings import ELMoEmbeddings
+
+        tokenizer = Sentence  # Flair sentence for ELMo embeddings
+
+        emb_model = ELMoEmbeddings("small")
+
+        embedding_dim = emb_model.embedding_length
+
+    else:
+        raise ValueError("Embedding name should be one of ['bert', 'elmo']")
+
+    return emb_model, tokenizer, embedding_dim
+
+
+#####################################
+
+
+def build_cache(data_folder, recipe_folder_name, embedding_cache, emb_model, tokenizer, device, embedding_name):
+    """
+    Compute the embeddings of all recipes in a data folder and store them in the cache
+
+    Parameters
+    ----------
+    data_folder : String
+        Path to data folder (one subfolder per dish).
+    recipe_folder_name : String
+        What the subfolder with the recipes is called in the dish folder.
+    embedding_cache : EmbeddingCache object
+        Embedding store.
+    emb_model : Embedding Model object
+        Model.
+    tokenizer : Tokenizer object
+        Tokenizer.
+    device : object
+        torch device where model tensors are saved.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+
+    Returns
+    -------
+    num_recipes : Int
+        Number of recipes in the data folder.
+    num_computed : Int
+        Number of recipes whose embeddings were not cached yet.
+
+    """
+
+    from utils import fetch_parsed_recipe, fetch_recipe_embeddings_batch
+
+    num_recipes = num_computed = 0
+
+    dish_list = [dish for dish in os.listdir(data_folder) if not dish.startswith(".")]
+    dish_list.sort()
+
+    for dish in dish_list:
+
+        recipe_folder = os.path.join(data_folder, dish, recipe_folder_name)
+
+        if not os.path.isdir(recipe_folder):
+            continue
+
+        recipe_list = [recipe for recipe in os.listdir(recipe_folder) if not recipe.startswith(".")]
+
+        parsed_recipes = [fetch_parsed_recipe(os.path.join(recipe_folder, recipe)) for recipe in recipe_list]
+
+        missing_recipes = [
+            parsed_recipe
+            for parsed_recipe in parsed_recipes
+            if not embedding_cache.contains([line["form"] for line in parsed_recipe[0]])
+        ]
+
+        # the recipes of a dish missing from the cache are embedded together (batched Bert forward passes)
+        fetch_recipe_embeddings_batch(
+            missing_recipes, emb_model, tokenizer, device, embedding_name, embedding_cache
+        )
+
+        num_recipes += len(parsed_recipes)
+        num_computed += len(missing_recipes)
+
+        print("Embeddings cached for dish", dish)
+
+    return num_recipes, num_computed
+
+
+#####################################
+
+
+def main():
+
+    from constants import folder, recipe_folder_name, embedding_cache_folder, CUDA_DEVICE
+
+    parser = argparse.ArgumentParser(description="""Prebuild the embedding cache for a data folder""")
+    parser.add_argument('data_folder', type=str, nargs='?', default=folder, help="""Data folder with one subfolder per dish (Default: folder from constants.py)""")
+    parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
+    parser.add_argument('--cache_folder', type=str, default=embedding_cache_folder, help="""Cache folder (Default: embedding_cache_folder from constants.py)""")
+    parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
+    args = parser.parse_args()
+
+    device = torch.device(CUDA_DEVICE if torch.cuda.is_available() else "cpu")
+
+    if args.cuda_device:
+        device = torch.device("cuda:" + args.cuda_device if torch.cuda.is_available() else "cpu")
+
+    if args.embedding_name == "elmo":
+        import flair
+        flair.device = device
+
+    emb_model, tokenizer, _ = load_embedding_model(args.embedding_name, device)
+
+    embedding_cache = EmbeddingCache(args.cache_folder, args.embedding_name, emb_model)
+
+    num_recipes, num_computed = build_cache(
+        args.data_folder, recipe_folder_name, embedding_cache, emb_model, tokenizer, device, args.embedding_name
+    )
+
+    print("Embeddings of {} recipes cached in ==> {} ({} newly computed)".format(
+        num_recipes, args.cache_folder, num_computed))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,459 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Graph edit distance between the action graphs of two recipes.
+
+The node edit costs are taken from the alignment scores of both directions of a recipe
+pair (see model.AlignmentModel.score_pair_bidirectional()), as 1 - score: deleting an
+action of Recipe1 costs its null alignment score, inserting an action of Recipe2 the null
+alignment score of the reversed direction, and substituting two actions the average of
+both directions. Edges (dependencies between actions) are deleted or inserted at a
+constant cost. The distance is computed exactly with A* search for small graphs and
+approximated with a bipartite assignment of the nodes (Hungarian method) for large ones.
+"""
+
+# importing libraries
+import time
+import heapq
+import numpy as np
+
+from itertools import count
+from scipy.optimize import linear_sum_assignment
+from constants import GED_EDGE_COST, GED_EXACT_MAX_NODES, GED_TIME_BUDGET
+
+
+def action_graph(recipe_actions):
+    """
+    Action graph of a recipe
+
+    Parameters
+    ----------
+    recipe_actions : List of dict
+        Action dictionaries of a recipe (Action_Dicts_List, with the null alignment first).
+
+    Returns
+    -------
+    action_ids : List of Int
+        Action ids of the graph nodes (without the null alignment).
+    edges : Set of tuple
+        Dependencies (i, j) between the actions at positions i and j of action_ids (i is a head of j).
+
+    """
+
+    action_ids = [node["Action_id"] for node in recipe_actions[1:]]
+    positions = {action_id: i for i, action_id in enumerate(action_ids)}
+
+    edges = set()
+
+    for j, node in enumerate(recipe_actions[1:]):
+
+        for parent in node["Parent_List"]:
+            if len(parent) and int(parent[0]) in positions:
+                edges.add((positions[int(parent[0])], j))
+
+        for child in node["Child_List"]:
+            if len(child) and int(child[0]) in positions:
+                edges.add((j, positions[int(child[0])]))
+
+    return action_ids, edges
+
+
+#####################################
+
+
+def edit_costs(prediction_matrix, inverse_prediction_matrix):
+    """
+    Node edit costs of a recipe pair from the alignment scores of both directions
+
+    Parameters
+    ----------
+    prediction_matrix : Tensor n X m + 1
+        Scores of the actions of Recipe1 against all actions of Recipe2 (null alignment first).
+    inverse_prediction_matrix : Tensor m X n + 1
+        Scores of the actions of Recipe2 against all actions of Recipe1 (null alignment first).
+
+    Returns
+    -------
+    substitution_costs : Array n X m
+        1 - average score of both directions for every pair of actions.
+    deletion_costs : Array n
+        1 - null alignment score of every action of Recipe1.
+    insertion_costs : Array m
+        1 - null alignment score of every action of Recipe2 (reversed direction).
+
+    """
+
+    scores = prediction_matrix.detach().cpu().double().numpy()
+    inverse_scores = inverse_prediction_matrix.detach().cpu().double().numpy()
+
+    substitution_costs = 1 - (scores[:, 1:] + inverse_scores[:, 1:].T) / 2
+
+    return substitution_costs, 1 - scores[:, 0], 1 - inverse_scores[:, 0]
+
+
+#####################################
+
+
+class EditProblem:
+    def __init__(self, edges1, edges2, costs, edge_cost=GED_EDGE_COST):
+        """
+        Graph edit distance problem between two action graphs
+
+        Parameters
+        ----------
+        edges1, edges2 : Set of tuple
+            Edges of both graphs (see action_graph()).
+        costs : Tuple of Array
+            (substitution_costs n X m, deletion_costs n, insertion_costs m), see edit_costs().
+        edge_cost : Float, optional
+            Cost of deleting or inserting an edge. The default is GED_EDGE_COST from constants.py.
+        """
+
+        self.substitution_costs, self.deletion_costs, self.insertion_costs = costs
+        self.num_nodes1, self.num_nodes2 = self.substitution_costs.shape
+
+        self.edges1 = set(edges1)
+        self.edges2 = set(edges2)
+        self.edge_cost = edge_cost
+
+        # numbers of incoming and outgoing edges of every node
+        self.degrees1 = np.zeros((self.num_nodes1, 2))
+        self.degrees2 = np.zeros((self.num_nodes2, 2))
+
+        for i, j in self.edges1:
+            self.degrees1[j, 0] += 1
+            self.degrees1[i, 1] += 1
+
+        for i, j in self.edges2:
+            self.degrees2[j, 0] += 1
+            self.degrees2[i, 1] += 1
+
+    def path_cost(self, mapping):
+        """
+        Cost of the edit path of a node mapping
+
+        Parameters
+        ----------
+        mapping : List of Int
+            Node of graph 2 substituted for every node of graph 1 (-1: deleted); unmapped nodes of graph 2 are inserted.
+
+        Returns
+        -------
+        cost : Float
+            Node and edge edit costs.
+
+        """
+
+        mapped = [(i, j) for i, j in enumerate(mapping) if j >= 0]
+        inserted = set(range(self.num_nodes2)) - {j for _, j in mapped}
+
+        cost = sum(self.substitution_costs[i, j] for i, j in mapped)
+        cost += sum(self.deletion_costs[i] for i, j in enumerate(mapping) if j < 0)
+        cost += sum(self.insertion_costs[j] for j in inserted)
+
+        # edges of graph 1 kept in graph 2 are substituted (free); all others are deleted or inserted
+        kept = sum(
+            1 for i, j in self.edges1 if mapping[i] >= 0 and mapping[j] >= 0 and (mapping[i], mapping[j]) in self.edges2
+        )
+
+        return cost + self.edge_cost * (len(self.edges1) + len(self.edges2) - 2 * kept)
+
+    def assignment_costs(self, nodes1, nodes2, with_edges=True):
+        """
+        Cost matrix of the bipartite assignment of nodes1 (rows) to nodes2 (columns), deletions and insertions
+        (square matrix len(nodes1) + len(nodes2)); with_edges adds half of the edge edit costs implied by the numbers
+        of incoming and outgoing edges of the nodes.
+        """
+
+        nodes1, nodes2 = np.asarray(nodes1, dtype=np.int64), np.asarray(nodes2, dtype=np.int64)
+        size1, size2 = len(nodes1), len(nodes2)
+
+        substitution = self.substitution_costs[np.ix_(nodes1, nodes2)]
+        deletion = self.deletion_costs[nodes1]
+        insertion = self.insertion_costs[nodes2]
+
+        if with_edges:
+            degrees1, degrees2 = self.degrees1[nodes1], self.degrees2[nodes2]
+            substitution = substitution + self.edge_cost * np.abs(degrees1[:, None] - degrees2[None, :]).sum(axis=2) / 2
+            deletion = deletion + self.edge_cost * degrees1.sum(axis=1) / 2
+            insertion = insertion + self.edge_cost * degrees2.sum(axis=1) / 2
+
+        cost_matrix = np.zeros((size1 + size2, size1 + size2))
+
+        cost_matrix[:size1, :size2] = substitution
+        cost_matrix[:size1, size2:] = np.inf
+        cost_matrix[size1:, :size2] = np.inf
+        cost_matrix[np.arange(size1), size2 + np.arange(size1)] = deletion
+        cost_matrix[size1 + np.arange(size2), np.arange(size2)] = insertion
+
+        return cost_matrix
+
+    def bipartite_mapping(self):
+        """
+        Node mapping of the optimal bipartite assignment (Hungarian method) of the nodes, with the edge costs
+        estimated from the node degrees; its edit path is an upper bound of the graph edit distance.
+        """
+
+        if self.num_nodes1 + self.num_nodes2 == 0:
+            return []
+
+        rows, columns = linear_sum_assignment(
+            self.assignment_costs(range(self.num_nodes1), range(self.num_nodes2))
+        )
+
+        mapping = [-1] * self.num_nodes1
+
+        for i, j in zip(rows, columns):
+            if i < self.num_nodes1 and j < self.num_nodes2:
+                mapping[i] = int(j)
+
+        return mapping
+
+    def lower_bound(self, nodes1, nodes2, num_edges1, num_edges2):
+        """
+        Lower bound of the cost of editing nodes1 into nodes2 with num_edges1 edges of graph 1 and num_edges2 edges
+        of graph 2 left to edit: optimal assignment of the node costs and the difference of the numbers of edges
+        """
+
+        edge_bound = self.edge_cost * abs(num_edges1 - num_edges2)
+
+        if len(nodes1) + len(nodes2) == 0:
+            return edge_bound
+
+        cost_matrix = self.assignment_costs(nodes1, nodes2, with_edges=False)
+
+        rows, columns = linear_sum_assignment(cost_matrix)
+
+        return cost_matrix[rows, columns].sum() + edge_bound
+
+    def search_order(self):
+        """
+        Nodes of graph 1 in breadth-first order from the nodes of highest degree, s.t. the edges of a node
+        are edited as soon as possible
+        """
+
+        neighbours = [set() for _ in range(self.num_nodes1)]
+
+        for i, j in self.edges1:
+            neighbours[i].add(j)
+            neighbours[j].add(i)
+
+        order = []
+        visited = set()
+
+        for root in sorted(range(self.num_nodes1), key=lambda i: -self.degrees1[i].sum()):
+
+            if root in visited:
+                continue
+
+            visited.add(root)
+            frontier = [root]
+
+            while frontier:
+
+                order.extend(frontier)
+                next_frontier = []
+
+                for node in frontier:
+                    for neighbour in sorted(neighbours[node] - visited, key=lambda i: -self.degrees1[i].sum()):
+                        visited.add(neighbour)
+                        next_frontier.append(neighbour)
+
+                frontier = next_frontier
+
+        return order
+
+    def astar_mapping(self, upper_bound_mapping=None, time_budget=None):
+        """
+        Node mapping of minimal edit cost (A* search over the nodes of graph 1, see search_order())
+
+        Parameters
+        ----------
+        upper_bound_mapping : List of Int, optional
+            Known mapping (e.g. bipartite_mapping()); search states that cannot improve on it are pruned,
+            and it is returned if the time budget runs out before a better mapping is found. The default is None.
+        time_budget : Float, optional
+            Maximal search time in seconds. The default is None (no limit).
+
+        Returns
+        -------
+        mapping : List of Int
+            Best mapping found.
+        exact : boolean
+            Whether the mapping is optimal (the search was not stopped by the time budget).
+
+        """
+
+        start = time.perf_counter()
+
+        if self.num_nodes1 == 0:
+            return [], True  # all nodes of graph 2 are inserted
+
+        order = self.search_order()
+
+        best_mapping = upper_bound_mapping
+        best_cost = self.path_cost(upper_bound_mapping) if upper_bound_mapping is not None else np.inf
+
+        tie_breaker = count()
+
+        # (estimated total cost, cost so far, tie breaker, images of order[:depth],
+        #  numbers of edited edges of graph 1 and of graph 2)
+        queue = [
+            (
+                self.lower_bound(order, range(self.num_nodes2), len(self.edges1), len(self.edges2)),
+                0.0,
+                next(tie_breaker),
+                (),
+                0,
+                0,
+            )
+        ]
+
+        while queue:
+
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                return best_mapping, False
+
+            estimate, cost, _, images, edited1, edited2 = heapq.heappop(queue)
+
+            if estimate >= best_cost:
+                break  # no state can improve on the best mapping
+
+            depth = len(images)
+            node = order[depth]
+            used = {j for j in images if j >= 0}
+
+            for image in [j for j in range(self.num_nodes2) if j not in used] + [-1]:
+
+                if image >= 0:
+                    step_cost = self.substitution_costs[node, image]
+                else:
+                    step_cost = self.deletion_costs[node]
+
+                child_edited1, child_edited2 = edited1, edited2
+
+                # edges between the node and the nodes mapped before
+                for previous, previous_image in zip(order[:depth], images):
+
+                    mapped = image >= 0 and previous_image >= 0
+
+                    for edge1, edge2 in (
+                        ((node, previous), (image, previous_image)),
+                        ((previous, node), (previous_image, image)),
+                    ):
+                        in_graph1 = edge1 in self.edges1
+                        in_graph2 = mapped and edge2 in self.edges2
+
+                        child_edited1 += in_graph1
+                        child_edited2 += in_graph2
+
+                        if in_graph1 != in_graph2:
+                            step_cost += self.edge_cost
+
+                child_images = images + (image,)
+                child_cost = cost + step_cost
+                child_used = used | {image} if image >= 0 else used
+
+                remaining1 = order[depth + 1 :]
+                remaining2 = [j for j in range(self.num_nodes2) if j not in child_used]
+
+                if not remaining1:
+                    # complete mapping: the remaining nodes of graph 2 and their edges are inserted
+                    child_cost += sum(self.insertion_costs[j] for j in remaining2)
+                    child_cost += self.edge_cost * (len(self.edges2) - child_edited2)
+
+                    if child_cost < best_cost:
+                        best_mapping = [-1] * self.num_nodes1
+                        for i, j in zip(order, child_images):
+                            best_mapping[i] = j
+                        best_cost = child_cost
+
+                    continue
+
+                child_estimate = child_cost + self.lower_bound(
+                    remaining1, remaining2, len(self.edges1) - child_edited1, len(self.edges2) - child_edited2
+                )
+
+                if child_estimate < best_cost:
+                    heapq.heappush(
+                        queue, (child_estimate, child_cost, next(tie_breaker), child_images, child_edited1, child_edited2)
+                    )
+
+        return best_mapping, True
+
+
+#####################################
+
+
+def graph_edit_distance(
+    recipe1_actions,
+    recipe2_actions,
+    prediction_matrix,
+    inverse_prediction_matrix,
+    method="auto",
+    edge_cost=GED_EDGE_COST,
+    time_budget=GED_TIME_BUDGET,
+    max_exact_nodes=GED_EXACT_MAX_NODES,
+):
+    """
+    Graph edit distance between the action graphs of two recipes
+
+    Parameters
+    ----------
+    recipe1_actions, recipe2_actions : List of dict
+        Action dictionaries (Action_Dicts_List) of Recipe1 and Recipe2.
+    prediction_matrix, inverse_prediction_matrix : Tensor
+        Alignment scores of both directions (see model.AlignmentModel.score_pair_bidirectional()).
+    method : String, optional
+        "astar" (exact, within the time budget), "bipartite" (Hungarian approximation) or "auto"
+        ("astar" if the graphs have at most max_exact_nodes nodes together). The default is "auto".
+    edge_cost : Float, optional
+        Cost of deleting or inserting an edge. The default is GED_EDGE_COST from constants.py.
+    time_budget : Float, optional
+        Maximal A* search time in seconds per recipe pair; the best edit path found (at least the bipartite one)
+        is returned when it runs out. None for no limit. The default is GED_TIME_BUDGET from constants.py.
+    max_exact_nodes : Int, optional
+        Largest number of nodes of both graphs for the exact search with method "auto". The default is GED_EXACT_MAX_NODES from constants.py.
+
+    Returns
+    -------
+    distance : Float
+        Cost of the edit path.
+    edit_path : List of tuple
+        (action id of Recipe1, action id of Recipe2) of every node edit; 0 for a deleted or inserted action.
+    exact : boolean
+        Whether distance is the graph edit distance (and not an upper bound).
+
+    """
+
+    action_ids1, edges1 = action_graph(recipe1_actions)
+    action_ids2, edges2 = action_graph(recipe2_actions)
+
+    problem = EditProblem(edges1, edges2, edit_costs(prediction_matrix, inverse_prediction_matrix), edge_cost)
+
+    if method == "auto":
+        method = "astar" if len(action_ids1) + len(action_ids2) <= max_exact_nodes else "bipartite"
+
+    mapping = problem.bipartite_mapping()
+    exact = False
+
+    if method == "astar":
+        mapping, exact = problem.astar_mapping(mapping, time_budget)
+
+    elif method != "bipartite":
+        raise ValueError("GED method should be one of ['auto', 'astar', 'bipartite']")
+
+    edit_path = [(action_ids1[i], action_ids2[j] if j >= 0 else 0) for i, j in enumerate(mapping)]
+    edit_path += [(0, action_ids2[j]) for j in sorted(set(range(len(action_ids2))) - set(mapping))]
+
+    return float(problem.path_cost(mapping)), edit_path, exact
@@ -0,0 +1,676 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Inference engine for the Alignment models.
+
+The score matrix of every recipe pair (actions of Recipe1 X actions of Recipe2) is computed
+once and passed to all requested outputs: the best alignment (as test_best_alignment.py), the
+k best alignments (as test_topk.py) and all alignments with their scores (as test_ged.py), in
+one prediction file per output or in a single file. The embedding model is loaded once, and
+the recipes of every test dish are read and embedded once for all outputs.
+
+With --bidirectional, the GED scores of both alignment directions (as test_ged.py and
+test_ged_insertion.py) and the averaged substitution scores are written from one encoding
+of every recipe; --graph_edit_distance adds the graph edit distance of every recipe pair
+computed from these scores (see graph_edit_distance.py).
+
+Usage: python inference.py model_name --embedding_name [embedding_name] --folds [folds] --outputs best topk ged
+
+(model_name: ['Alignment-no-feature' : Base Alignment model,
+              'Alignment-with-feature' : Extended Alignment model])
+"""
+
+# importing libraries
+import os
+import torch
+import argparse
+
+from functools import partial
+from train import create_alignment_model
+from alignment_labels import AlignmentLabels
+from prediction_writer import PredictionWriter
+from score_matrices import ScoreMatrixWriter
+from graph_edit_distance import graph_edit_distance
+from embedding_cache import EmbeddingCache, MemoryEmbeddingCache, load_embedding_model
+from utils import (
+    fetch_dish_test,
+    fetch_dish_test_insertion,
+    fetch_dish_pair_alignments,
+    load_checkpoint,
+    parse_folds,
+    prediction_path,
+)
+from constants import (
+    folder,
+    recipe_folder_name,
+    embedding_cache_folder,
+    destination_folder1,
+    destination_folder2,
+    CUDA_DEVICE,
+    TOP_K,
+    GED_TIME_BUDGET,
+)
+
+
+def best_alignments(scores, target_ids):
+    """
+    Action id of the best alignment of every action (torch.argmax, as test_best_alignment.py)
+    """
+
+    return {"Predicted_Label": target_ids[torch.argmax(scores, dim=1)].tolist()}
+
+
+def top_k_alignments(scores, target_ids, k=TOP_K):
+    """
+    Action ids of the k best alignments of every action, ranked from the best to the worst (as test_topk.py)
+    """
+
+    _, rankings = torch.topk(scores, min(k, scores.shape[1]), dim=1)
+
+    return {"Predicted_Label": target_ids[rankings].tolist()}
+
+
+def ranked_alignments(scores, target_ids):
+    """
+    Action ids and scores of all alignments of every action, ranked from the best to the worst (as test_ged.py)
+    """
+
+    ranked_scores, rankings = torch.topk(scores, scores.shape[1], dim=1)
+
+    return {"Predicted_Label": target_ids[rankings].tolist(), "Probabilities": ranked_scores.tolist()}
+
+
+# Prediction outputs: columns of the prediction file, columns in a single file with all outputs, function of the score matrix
+PREDICTION_OUTPUTS = {
+    "best": (["Predicted_Label"], {"Predicted_Label": "Best_Label"}, best_alignments),
+    "topk": (["Predicted_Label"], {"Predicted_Label": "Top_K_Labels"}, top_k_alignments),
+    "ged": (["Predicted_Label", "Probabilities"], {"Predicted_Label": "Ranked_Labels", "Probabilities": "Probabilities"}, ranked_alignments),
+}
+
+KEY_COLUMNS = ["Recipe1", "Action1_id", "Recipe2"]
+
+
+#####################################
+
+
+class PredictionOutput:
+    def __init__(self, path, output_names, k=TOP_K, resume=False):
+        """
+        Prediction file of one or several outputs
+
+        Parameters
+        ----------
+        path : String
+            Path of the prediction file.
+        output_names : List of String
+            Outputs written to the file (keys of PREDICTION_OUTPUTS); the columns of several outputs are renamed
+            s.t. they do not collide (e.g. "Best_Label", "Top_K_Labels", "Ranked_Labels", "Probabilities").
+        k : Int, optional
+            Number of alignments of the "topk" output. The default is TOP_K from constants.py.
+        resume : boolean, optional
+            Continue the prediction file of an interrupted run (see PredictionWriter). The default is False.
+        """
+
+        self.outputs = []
+        columns = list(KEY_COLUMNS)
+
+        for output_name in output_names:
+
+            output_columns, renamed_columns, function = PREDICTION_OUTPUTS[output_name]
+
+            if len(output_names) == 1:
+                renamed_columns = {column: column for column in output_columns}
+
+            if output_name == "topk":
+                function = partial(function, k=k)
+
+            self.outputs.append((renamed_columns, function))
+            columns.extend(renamed_columns[column] for column in output_columns)
+
+        self.writer = PredictionWriter(path, columns, resume=resume)
+        self.path = path
+
+    def __contains__(self, key):
+
+        return key in self.writer
+
+    def add_pair(self, recipe1, recipe2, source_ids, target_ids, scores):
+        """
+        Write the predictions of the actions of Recipe1 of a pair
+
+        Parameters
+        ----------
+        recipe1, recipe2 : String
+            Recipe names.
+        source_ids : List of Int
+            Action ids of the scored actions of Recipe1.
+        target_ids : List of Int
+            Action ids of all actions of Recipe2.
+        scores : Tensor len(source_ids) X len(target_ids)
+            Alignment scores.
+
+        """
+
+        target_ids = torch.tensor(target_ids)
+
+        columns = dict()
+
+        for renamed_columns, function in self.outputs:
+            for column, values in function(scores, target_ids).items():
+                columns[renamed_columns[column]] = values
+
+        for i, source_id in enumerate(source_ids):
+
+            # rows kept from a resumed file are not written again
+            if (recipe1, source_id, recipe2) in self.writer:
+                continue
+
+            row = {"Recipe1": recipe1, "Action1_id": source_id, "Recipe2": recipe2}
+            row.update((column, values[i]) for column, values in columns.items())
+
+            self.writer.add(row)
+
+    def close(self):
+
+        self.writer.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+#####################################
+
+
+class DistanceOutput:
+    def __init__(self, path, method="auto", time_budget=GED_TIME_BUDGET, resume=False):
+        """
+        File with the graph edit distance of every recipe pair
+
+        Parameters
+        ----------
+        path : String
+            Path of the distance file.
+        method : String, optional
+            "auto", "astar" or "bipartite" (see graph_edit_distance.graph_edit_distance()). The default is "auto".
+        time_budget : Float, optional
+            Maximal A* search time in seconds per recipe pair. The default is GED_TIME_BUDGET from constants.py.
+        resume : boolean, optional
+            Continue the distance file of an interrupted run (see PredictionWriter); the distances of the recipe pairs
+            in the file are not computed again. The default is False.
+        """
+
+        self.method = method
+        self.time_budget = time_budget
+
+        self.writer = PredictionWriter(
+            path,
+            ["Recipe1", "Recipe2", "Distance", "Exact", "Edit_Path"],
+            key_columns=("Recipe1", "Recipe2"),
+            resume=resume,
+        )
+        self.path = path
+
+    def __contains__(self, key):
+
+        return key in self.writer
+
+    def add_pair_scores(self, recipe1, recipe2, recipe1_actions, recipe2_actions, prediction_matrix, inverse_prediction_matrix):
+        """
+        Write the graph edit distance of a recipe pair
+
+        Parameters
+        ----------
+        recipe1, recipe2 : String
+            Recipe names.
+        recipe1_actions, recipe2_actions : List of dict
+            Action dictionaries (Action_Dicts_List) of both recipes.
+        prediction_matrix, inverse_prediction_matrix : Tensor
+            Alignment scores of all actions in both directions (see model.AlignmentModel.score_pair_bidirectional()).
+
+        """
+
+        # pairs kept from a resumed file are not computed again
+        if (recipe1, recipe2) in self.writer:
+            return
+
+        distance, edit_path, exact = graph_edit_distance(
+            recipe1_actions,
+            recipe2_actions,
+            prediction_matrix,
+            inverse_prediction_matrix,
+            method=self.method,
+            time_budget=self.time_budget,
+        )
+
+        self.writer.add(
+            {"Recipe1": recipe1, "Recipe2": recipe2, "Distance": distance, "Exact": exact, "Edit_Path": edit_path}
+        )
+
+    def close(self):
+
+        self.writer.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+#####################################
+
+
+def predict_dish(
+    model,
+    dish_dict,
+    alignment_labels,
+    outputs,
+    resume=False,
+    inverse_labels=None,
+    inverse_outputs=(),
+    substitution_outputs=(),
+    distance_outputs=(),
+):
+    """
+    Score every recipe pair of a dish once and write the predictions to all outputs
+
+    Parameters
+    ----------
+    model : AlignmentModel object
+        Alignment model (in eval mode).
+    dish_dict : dict
+        Contains all information for one dish (see utils.fetch_dish_test()).
+    alignment_labels : AlignmentLabels object
+        Actions to predict of every recipe pair (see alignment_labels.py).
+    outputs : List of PredictionOutput or ScoreMatrixWriter objects
+        Outputs of the predictions.
+    resume : boolean, optional
+        Recipe pairs whose actions (and distances) are in all outputs are not scored again. The default is False.
+    inverse_labels : AlignmentLabels object, optional
+        Actions to predict of every reversed recipe pair (recipe2, recipe1), see utils.fetch_dish_pair_alignments();
+        the pairs are scored in both directions. The default is None (only recipe1 -> recipe2).
+    inverse_outputs : List of PredictionOutput or ScoreMatrixWriter objects, optional
+        Outputs of the predictions recipe2 -> recipe1. The default is ().
+    substitution_outputs : List of PredictionOutput or ScoreMatrixWriter objects, optional
+        Outputs of the substitution scores: the average of both directions for every pair of actions
+        (without the null alignment). The default is ().
+    distance_outputs : List of DistanceOutput objects, optional
+        Outputs of the graph edit distance of every recipe pair, from the scores of both directions. The default is ().
+
+    Returns
+    -------
+    num_actions : Int
+        Number of predicted actions.
+    num_scored_pairs : Int
+        Number of recipe pairs scored by the model.
+
+    """
+
+    num_actions = 0
+    num_scored_pairs = 0
+
+    if inverse_labels is not None:
+        inverse_pair_ids = {key: pair_id for pair_id, key in enumerate(inverse_labels.pairs)}
+
+    with torch.no_grad():
+
+        for pair_id, key in enumerate(alignment_labels.pairs):
+
+            recipe1 = dish_dict[key[0]]
+            recipe2 = dish_dict[key[1]]
+
+            aligned, _, _ = alignment_labels.pair(pair_id)
+
+            rows = [i for i, is_aligned in enumerate(aligned) if is_aligned]  # actions in the alignment table
+            source_ids = [recipe1["Action_Dicts_List"][i + 1]["Action_id"] for i in rows]
+
+            num_actions += len(rows)
+
+            if inverse_labels is not None and (key[1], key[0]) in inverse_pair_ids:
+
+                inverse_aligned, _, _ = inverse_labels.pair(inverse_pair_ids[key[1], key[0]])
+
+                inverse_rows = [i for i, is_aligned in enumerate(inverse_aligned) if is_aligned]
+                inverse_source_ids = [recipe2["Action_Dicts_List"][i + 1]["Action_id"] for i in inverse_rows]
+
+            else:
+                inverse_rows = None
+
+            if resume:
+
+                # rows (and distances) of the pair every output should have
+                written = [(output, (key[0], source_id, key[1])) for output in outputs for source_id in source_ids]
+                written += [(output, (key[0], key[1])) for output in distance_outputs]
+
+                if inverse_rows is not None:
+                    written += [
+                        (output, (key[1], source_id, key[0]))
+                        for output in inverse_outputs
+                        for source_id in inverse_source_ids
+                    ]
+                    written += [
+                        (output, (key[0], source_id, key[1]))
+                        for output in substitution_outputs
+                        for source_id in source_ids
+                    ]
+
+                if all(row_key in output for output, row_key in written):
+                    continue
+
+            target_ids = [node["Action_id"] for node in recipe2["Action_Dicts_List"]]
+
+            num_scored_pairs += 1
+
+            if inverse_labels is None:
+
+                # Predictions for all actions of Recipe1 at once (every action is encoded only once)
+                prediction_matrix = model.score_pair(
+                    recipe1["Action_Dicts_List"][1:],
+                    recipe1["Embedding_Vectors"],
+                    recipe1["Vector_Lookup_Lists"],
+                    recipe2["Action_Dicts_List"],
+                    recipe2["Embedding_Vectors"],
+                    recipe2["Vector_Lookup_Lists"],
+                )
+
+            else:
+
+                # Predictions of both directions from one encoding of each recipe
+                prediction_matrix, inverse_prediction_matrix = model.score_pair_bidirectional(
+                    recipe1["Action_Dicts_List"],
+                    recipe1["Embedding_Vectors"],
+                    recipe1["Vector_Lookup_Lists"],
+                    recipe2["Action_Dicts_List"],
+                    recipe2["Embedding_Vectors"],
+                    recipe2["Vector_Lookup_Lists"],
+                )
+
+            scores = prediction_matrix[rows].cpu()
+
+            for output in outputs:
+                output.add_pair(key[0], key[1], source_ids, target_ids, scores)
+
+            for output in distance_outputs:
+                output.add_pair_scores(
+                    key[0],
+                    key[1],
+                    recipe1["Action_Dicts_List"],
+                    recipe2["Action_Dicts_List"],
+                    prediction_matrix.cpu(),
+                    inverse_prediction_matrix.cpu(),
+                )
+
+            if inverse_rows is None:
+                continue
+
+            inverse_target_ids = [node["Action_id"] for node in recipe1["Action_Dicts_List"]]
+
+            inverse_scores = inverse_prediction_matrix[inverse_rows].cpu()
+
+            for output in inverse_outputs:
+                output.add_pair(key[1], key[0], inverse_source_ids, inverse_target_ids, inverse_scores)
+
+            # Substitution scores: actions of Recipe1 X actions of Recipe2 scored in both directions
+            # (column i + 1 of a score matrix is action i of the other recipe without the null alignment)
+            substitution_scores = (
+                scores[:, [i + 1 for i in inverse_rows]] + inverse_scores[:, [i + 1 for i in rows]].T
+            ) / 2
+
+            for output in substitution_outputs:
+                output.add_pair(key[0], key[1], source_ids, inverse_source_ids, substitution_scores)
+
+    return num_actions, num_scored_pairs
+
+
+#####################################
+
+
+def open_outputs(destination_folder, dish, output_names, single_file=False, output_format="tsv", k=TOP_K, resume=False):
+    """
+    Prediction files of a dish
+
+    Parameters
+    ----------
+    destination_folder : String
+        Destination folder.
+    dish : String
+        Dish name.
+    output_names : List of String
+        Requested outputs (keys of PREDICTION_OUTPUTS).
+    single_file : boolean, optional
+        All outputs in one prediction file ([dish]_prediction.tsv). The default is False:
+        one file per output ([dish]_[output]_prediction.tsv), or [dish]_prediction.tsv for a single output.
+    output_format : String, optional
+        "npz" writes the "ged" output as score matrices ([dish]_prediction.npz, see score_matrices.py). The default is "tsv".
+    k : Int, optional
+        Number of alignments of the "topk" output. The default is TOP_K from constants.py.
+    resume : boolean, optional
+        Continue the TSV prediction files of an interrupted run. The default is False.
+
+    Returns
+    -------
+    outputs : List of PredictionOutput or ScoreMatrixWriter objects
+        Open outputs.
+
+    """
+
+    path = prediction_path(destination_folder, dish)
+
+    outputs = []
+
+    if output_format == "npz" and "ged" in output_names:
+        outputs.append(ScoreMatrixWriter(os.path.splitext(path)[0] + ".npz"))
+        output_names = [output_name for output_name in output_names if output_name != "ged"]
+
+    if single_file or len(output_names) == 1:
+        output_groups = [output_names] if output_names else []
+    else:
+        output_groups = [[output_name] for output_name in output_names]
+
+    for output_group in output_groups:
+
+        if len(output_groups) > 1:
+            output_path = prediction_path(destination_folder, dish + "_" + output_group[0])
+        else:
+            output_path = path
+
+        outputs.append(PredictionOutput(output_path, output_group, k=k, resume=resume))
+
+    return outputs
+
+
+#####################################
+
+
+def open_ged_output(destination_folder, dish, output_format="tsv", resume=False):
+    """
+    Prediction file with the ranked alignments and scores of a dish ([dish]_prediction.tsv, format of test_ged.py)
+    or its score matrices ([dish]_prediction.npz, see score_matrices.py); dish may carry a suffix, e.g. "_insertion".
+    A tsv file of an interrupted run is continued with resume.
+    """
+
+    path = prediction_path(destination_folder, dish)
+
+    if output_format == "npz":
+        return ScoreMatrixWriter(os.path.splitext(path)[0] + ".npz")
+
+    return PredictionOutput(path, ["ged"], resume=resume)
+
+
+#####################################
+
+
+def fold_test_dish(dish_list, fold):
+    """
+    Test dish of a fold (as in the testing scripts)
+    """
+
+    if fold in range(len(dish_list)):
+        test_dish_id = fold
+    else:
+        test_dish_id = 0
+
+    return dish_list[test_dish_id]
+
+
+#####################################
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="""Best, top k and GED predictions of the Alignment models from one scoring pass""")
+    parser.add_argument('model_name', type=str, help="""Model Name; one of {'Alignment-no-feature', 'Alignment-with-feature'}""")
+    parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
+    parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
+    parser.add_argument('--folds', type=str, required=True, help="""Folds to test, e.g. 1 or 1-10; fold k tests model[k].pt on its test dish""")
+    parser.add_argument('--outputs', type=str, nargs='+', default=['best'], choices=list(PREDICTION_OUTPUTS), help="""Predictions to write: best (best alignment), topk (k best alignments), ged (all alignments and scores). Default: best""")
+    parser.add_argument('--k', type=int, default=TOP_K, help="""Number of alignments of the topk output (Default: TOP_K from constants.py)""")
+    parser.add_argument('--single_file', action='store_true', help="""Write all outputs to one prediction file per dish""")
+    parser.add_argument('--output_format', type=str, default='tsv', choices=['tsv', 'npz'], help="""Format of the ged output (see score_matrices.py). Default: tsv""")
+    parser.add_argument('--insertion', action='store_true', help="""Read the test data as test_ged_insertion.py""")
+    parser.add_argument('--resume', action='store_true', help="""Continue the prediction files (and the graph edit distance file) of an interrupted run instead of overwriting them""")
+    parser.add_argument('--bidirectional', action='store_true', help="""Also write the ged output of the reversed recipe pairs ([dish]_insertion_prediction) and the averaged substitution scores ([dish]_substitution_prediction)""")
+    parser.add_argument('--graph_edit_distance', action='store_true', help="""With --bidirectional, also write the graph edit distance of every recipe pair ([dish]_graph_edit_distance)""")
+    parser.add_argument('--ged_method', type=str, default='auto', choices=['auto', 'astar', 'bipartite'], help="""Graph edit distance: astar (exact), bipartite (Hungarian approximation) or auto (astar for small recipe pairs). Default: auto""")
+    parser.add_argument('--ged_time_budget', type=float, default=GED_TIME_BUDGET, help="""Maximal A* search time in seconds per recipe pair (Default: GED_TIME_BUDGET from constants.py)""")
+    args = parser.parse_args()
+
+    if args.model_name == "Alignment-with-feature":
+        with_feature = True
+        destination_folder = destination_folder1
+
+    elif args.model_name == "Alignment-no-feature":
+        with_feature = False
+        destination_folder = destination_folder2
+
+    else:
+        raise ValueError("Model name should be one of ['Alignment-no-feature', 'Alignment-with-feature']")
+
+    if args.resume and args.output_format != "tsv" and "ged" in args.outputs:
+        parser.error("--resume is only available for the tsv output format")
+
+    if args.bidirectional and ("ged" not in args.outputs or args.insertion):
+        parser.error("--bidirectional needs the ged output and is not available with --insertion")
+
+    if args.graph_edit_distance and not args.bidirectional:
+        parser.error("--graph_edit_distance needs --bidirectional")
+
+    output_names = list(dict.fromkeys(args.outputs))  # in the given order, without repetitions
+
+    device = torch.device(CUDA_DEVICE if torch.cuda.is_available() else "cpu")
+
+    if args.cuda_device:
+        device = torch.device("cuda:" + args.cuda_device if torch.cuda.is_available() else "cpu")
+
+    if args.embedding_name == "elmo":
+        import flair
+        flair.device = device
+
+    print("-------Loading Model-------")
+
+    emb_model, tokenizer, embedding_dim = load_embedding_model(args.embedding_name, device)
+
+    if embedding_cache_folder:
+        embedding_cache = MemoryEmbeddingCache(EmbeddingCache(embedding_cache_folder, args.embedding_name, emb_model))
+    else:
+        embedding_cache = MemoryEmbeddingCache()
+
+    fetch_dish = fetch_dish_test_insertion if args.insertion else fetch_dish_test
+
+    dish_list = sorted(dish for dish in os.listdir(folder) if not dish.startswith("."))
+
+    for fold in parse_folds(args.folds):
+
+        dish = fold_test_dish(dish_list, fold)
+
+        print("-------Fold {}: Testing on dish {}-------".format(fold, dish))
+
+        dish_dict, dish_group_alignments = fetch_dish(
+            dish, folder, recipe_folder_name, emb_model, tokenizer, device, args.embedding_name, embedding_cache
+        )
+        alignment_labels = AlignmentLabels(dish_dict, dish_group_alignments)
+
+        if args.bidirectional:
+            inverse_labels = AlignmentLabels(
+                dish_dict, fetch_dish_pair_alignments(dish, folder, recipe_folder_name, insertion=True)
+            )
+
+        model, optimizer, _ = create_alignment_model(embedding_dim, device, with_feature)
+
+        saved_file_path = os.path.join(destination_folder, "model" + str(fold) + ".pt")  # Model saved path
+
+        model, optimizer, _ = load_checkpoint(saved_file_path, model, optimizer, device)
+
+        model.eval()  # no dropout; recipe encodings are memoized in eval mode
+
+        outputs = open_outputs(
+            destination_folder, dish, output_names, args.single_file, args.output_format, args.k, args.resume
+        )
+
+        if args.bidirectional:
+            inverse_outputs = [
+                open_ged_output(destination_folder, dish + "_insertion", args.output_format, args.resume)
+            ]
+            substitution_outputs = [
+                open_ged_output(destination_folder, dish + "_substitution", args.output_format, args.resume)
+            ]
+        else:
+            inverse_labels, inverse_outputs, substitution_outputs = None, [], []
+
+        if args.graph_edit_distance:
+            distance_outputs = [
+                DistanceOutput(
+                    os.path.join(destination_folder, dish + "_graph_edit_distance.tsv"),
+                    args.ged_method,
+                    args.ged_time_budget,
+                    args.resume,
+                )
+            ]
+        else:
+            distance_outputs = []
+
+        try:
+            num_actions, num_scored_pairs = predict_dish(
+                model,
+                dish_dict,
+                alignment_labels,
+                outputs,
+                args.resume,
+                inverse_labels,
+                inverse_outputs,
+                substitution_outputs,
+                distance_outputs,
+            )
+        finally:
+            for output in outputs + inverse_outputs + substitution_outputs + distance_outputs:
+                output.close()
+
+        outputs = outputs + inverse_outputs + substitution_outputs + distance_outputs
+
+        print(
+            "{} actions of {} recipe pairs ({} scored) predicted ==> {}".format(
+                num_actions, len(alignment_labels), num_scored_pairs, ", ".join(output.path for output in outputs)
+            )
+        )
+
+
+if __name__ == "__main__":
+
+    main()
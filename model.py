@@ -21,12 +21,138 @@ Alignment Model
 import torch
 import sys
 import torch.nn as nn
+import torch.nn.functional as F
+
+from torch.nn.utils.rnn import pack_sequence
+from collections import OrderedDict
+from constants import ENCODING_CACHE_SIZE
 seed=0
 torch.manual_seed(seed)
 
+
+def node_embeddings(node, embedding_vectors, vector_lookup_list):
+    """
+    Fetch the embedding rows of all subwords of a node
+
+    Parameters
+    ----------
+    node : Tensor node_sequence_length
+        Conllu token ids of the node.
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for a particular Recipe (BERT/ELMO).
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
+
+    Returns
+    -------
+    embeddings : Tensor num_node_subwords X embedding_dim
+        Embedding vectors of the node subwords.
+
+    """
+
+    token_ids = node.tolist()
+    first, last = token_ids[0], token_ids[-1]
+
+    # the tokens of a (split) node are consecutive, i.e. its subwords are a single slice
+    if token_ids == list(range(first, last + 1)):
+        return embedding_vectors[vector_lookup_list[first - 1] : vector_lookup_list[last]]
+
+    return torch.cat(
+        [embedding_vectors[vector_lookup_list[i - 1] : vector_lookup_list[i]] for i in token_ids]
+    )
+
+
+def collect_recipe_nodes(recipe_actions, embedding_vectors, vector_lookup_list):
+    """
+    Collect the subword sequences of all (distinct) nodes of a recipe for Encoder.encode_nodes()
+
+    Parameters
+    ----------
+    recipe_actions : List of dict
+        List of action dictionaries from a Recipe
+            (action dictionaries contain action node and their corresponding lists of parent nodes and child nodes).
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for the Recipe (BERT/ELMO).
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for the Conllu file token ids of the Recipe.
+
+    Returns
+    -------
+    recipe_nodes : Dict
+        "Node_Sequences" : List of Tensor num_node_subwords X embedding_dim, one per distinct non-empty node;
+        "Action_Indices" : List of Int, node index of every action;
+        "Parent_Indices", "Child_Indices" : List of List of Int, node indices of the parents/children of every action.
+        Empty nodes have index -1 (none_action_vector).
+
+    """
+
+    node_index = dict()  # token ids -> node index
+    node_sequences = []
+
+    def index(node):
+
+        if not len(node):
+            return -1
+
+        key = tuple(node.tolist())
+
+        if key not in node_index:
+            node_index[key] = len(node_sequences)
+            node_sequences.append(node_embeddings(node, embedding_vectors, vector_lookup_list))
+
+        return node_index[key]
+
+    return {
+        "Node_Sequences": node_sequences,
+        "Action_Indices": [index(node["Action"]) for node in recipe_actions],
+        "Parent_Indices": [[index(parent) for parent in node["Parent_List"]] for node in recipe_actions],
+        "Child_Indices": [[index(child) for child in node["Child_List"]] for node in recipe_actions],
+    }
+
+
+def pad_predictions(prediction_matrices):
+    """
+    Stack prediction matrices with different numbers of Recipe2 actions.
+    Candidate sets are padded with -inf, i.e. padded entries get probability 0 in
+    the softmax of the cross entropy loss and are never predicted.
+
+    Parameters
+    ----------
+    prediction_matrices : List of Tensor num_actions X num_candidates
+        Predictions of the Recipe1 actions of every recipe pair.
+
+    Returns
+    -------
+    predictions : Tensor total number of actions X largest number of candidates
+        Predictions of all actions (in the order of prediction_matrices).
+    mask : Tensor total number of actions X largest number of candidates (bool)
+        True for the entries that are actions of Recipe2.
+
+    """
+
+    num_candidates = max(prediction_matrix.shape[1] for prediction_matrix in prediction_matrices)
+
+    predictions = torch.cat(
+        [
+            F.pad(prediction_matrix, (0, num_candidates - prediction_matrix.shape[1]), value=float("-inf"))
+            for prediction_matrix in prediction_matrices
+        ]
+    )
+
+    mask = torch.cat(
+        [
+            torch.arange(num_candidates, device=predictions.device).expand(len(prediction_matrix), -1) < prediction_matrix.shape[1]
+            for prediction_matrix in prediction_matrices
+        ]
+    )
+
+    return predictions, mask
+
+
 # Encoder to generate context vector using BERT/ELMO embeddings
 class Encoder(nn.Module):
-    def __init__(self, embedding_dim, device, feature_dim, with_feature):
+    def __init__(self, embedding_dim, device, feature_dim, with_feature, separate_neighbourhoods=False):
         """
         Constructor
 
@@ -40,10 +166,15 @@ class Encoder(nn.Module):
             Number of features. For base model, 1 and for extended model, 3.
         with_feature : boolean
             Check whether to add features or not.
+        separate_neighbourhoods : boolean, optional
+            Encode the children with childlstm on their own. The default is False:
+                childlstm runs over the parents followed by the children (the behaviour the released models were trained with).
         """
 
         super().__init__()
 
+        self.separate_neighbourhoods = separate_neighbourhoods
+
         self.device = device
 
         self.feature_dim = feature_dim
@@ -72,12 +203,10 @@ class Encoder(nn.Module):
          ----------
          node : Tensor node_sequence_length
              Node.
-         embedding_vectors : Dict
-             Embedding dictionary for a particular Recipe;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-         vector_lookup_list : Dict
-             Look up dictionary for a particular Recipe embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+         embedding_vectors : Tensor num_subwords X embedding_dim
+             Embedding matrix for a particular Recipe (BERT/ELMO).
+         vector_lookup_list : Array num_tokens + 1
+             Offsets into embedding_vectors for the Conllu file token ids.
 
          Returns
          -------
@@ -88,37 +217,126 @@ class Encoder(nn.Module):
 
         if len(node):
 
-            # token_list = torch.zeros(1, self.embedding_dim).to(self.device) # embedding vector for the node sequence
+            input = node_embeddings(node, embedding_vectors, vector_lookup_list).to(self.device)
 
-            emb_id_list = []
+            embedding = torch.squeeze(
+                self.seqlstm(input.view(len(input), 1, -1))[1][1], dim=0
+            )
 
-            for token_id in node:
+            return embedding
+
+        else:
 
-                emb_id_list.extend(vector_lookup_list[token_id.item()])
+            return self.none_action_vector
 
-            input = [embedding_vectors[emb_id] for emb_id in emb_id_list]
+    # return embedding # 1 X embedding_dim
 
-            embedding = torch.squeeze(
-                self.seqlstm(torch.cat(input).view(len(input), 1, -1))[1][1], dim=0
+    def neighbourhood_embedding(self, lstm, node_states, index_lists):
+        """
+        Run a neighbourhood LSTM (parentlstm/childlstm) over the node lists of all actions at once
+
+        Parameters
+        ----------
+        lstm : nn.LSTM
+            Neighbourhood LSTM.
+        node_states : Tensor num_nodes + 1 X embedding_dim
+            Node embeddings (last row is none_action_vector).
+        index_lists : List of List of Int
+            Node indices of the neighbourhood of every action.
+
+        Returns
+        -------
+        context : Tensor num_actions X embedding_dim
+            Final cell state for every action; zeros for an empty neighbourhood.
+
+        """
+
+        nonempty = [i for i, index_list in enumerate(index_lists) if len(index_list)]
+
+        context = torch.zeros(len(index_lists), self.embedding_dim, device=self.device)
+
+        if nonempty:
+
+            packed = pack_sequence(
+                [node_states[torch.tensor(index_lists[i], device=self.device)] for i in nonempty],
+                enforce_sorted=False,
             )
 
-            return embedding
+            context = context.index_copy(
+                0, torch.tensor(nonempty, device=self.device), lstm(packed)[1][1][0]
+            )
 
-            # return embedding # .view(1, 1, 1, self.embedding_dim)
+        return context
 
-            """for emb_id in emb_id_list :
-                
-                emb = torch.unsqueeze(embedding_vectors[emb_id], dim = 0) # 1 X embedding_dim
-            
-                token_list = token_list.add(emb) # 1 X embedding_dim
-        
-            embedding = token_list / len(emb_id_list) # 1 X embedding_dim"""
+    def encode_nodes(self, recipe_nodes):
+        """
+        Encode all actions of a recipe with one packed pass of seqlstm, parentlstm and childlstm each;
+        row i equals forward() for the i-th action.
+
+        Parameters
+        ----------
+        recipe_nodes : Dict
+            Node sequences and indices as returned by collect_recipe_nodes().
+
+        Returns
+        -------
+        encodings : Tensor num_actions X feature_dim * embedding_dim
+            Encoding vectors for all actions.
+
+        """
 
+        node_sequences = [sequence.to(self.device) for sequence in recipe_nodes["Node_Sequences"]]
+
+        if node_sequences:
+            node_states = self.seqlstm(pack_sequence(node_sequences, enforce_sorted=False))[1][1][0]
         else:
+            node_states = torch.zeros(0, self.embedding_dim, device=self.device)
 
-            return self.none_action_vector
+        node_states = torch.cat([node_states, self.none_action_vector])  # num_nodes + 1 X embedding_dim
 
-    # return embedding # 1 X embedding_dim
+        action_context = node_states[torch.tensor(recipe_nodes["Action_Indices"], dtype=torch.long, device=self.device)]
+
+        if not self.with_feature:
+            return action_context
+
+        parent_indices = recipe_nodes["Parent_Indices"]
+        child_indices = recipe_nodes["Child_Indices"]
+
+        if not self.separate_neighbourhoods:
+            # children are encoded after the parents in a single list, as in forward()
+            child_indices = [
+                parents + children if len(children) else []
+                for parents, children in zip(parent_indices, child_indices)
+            ]
+
+        parent_list_context = self.neighbourhood_embedding(self.parentlstm, node_states, parent_indices)
+        child_list_context = self.neighbourhood_embedding(self.childlstm, node_states, child_indices)
+
+        return torch.cat(
+            [action_context, parent_list_context, child_list_context], dim=1
+        )  # num_actions X 3 * embedding_dim
+
+    def encode_recipe(self, recipe_actions, embedding_vectors, vector_lookup_list):
+        """
+        Encode all actions of a recipe (see encode_nodes())
+
+        Parameters
+        ----------
+        recipe_actions : List of dict
+            List of action dictionaries from a Recipe.
+        embedding_vectors : Tensor num_subwords X embedding_dim
+             Embedding matrix for the Recipe (BERT/ELMO).
+        vector_lookup_list : Array num_tokens + 1
+             Offsets into embedding_vectors for the Conllu file token ids of the Recipe.
+
+        Returns
+        -------
+        encodings : Tensor length of recipe_actions X feature_dim * embedding_dim
+            Encoding vectors for all actions.
+
+        """
+
+        return self.encode_nodes(collect_recipe_nodes(recipe_actions, embedding_vectors, vector_lookup_list))
 
     def forward(
         self, action, parent_list, child_list, embedding_vectors, vector_lookup_list
@@ -134,12 +352,10 @@ class Encoder(nn.Module):
             List of Parent Nodes for Action node.
         child_list : List of Tensors
             List of Child Nodes for Action node.
-        embedding_vectors : Dict
-             Embedding dictionary for a particular Recipe;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list : Dict
-             Look up dictionary for a particular Recipe embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+        embedding_vectors : Tensor num_subwords X embedding_dim
+             Embedding matrix for a particular Recipe (BERT/ELMO).
+        vector_lookup_list : Array num_tokens + 1
+             Offsets into embedding_vectors for the Conllu file token ids.
 
         Returns
         -------
@@ -156,45 +372,37 @@ class Encoder(nn.Module):
 
         if self.with_feature:
 
-            parent_emb_list = child_emb_list = []
+            # generating embedding vectors for each parent/child node sequence
+            parent_emb_list = [
+                self.sequence_embedding(parent, embedding_vectors, vector_lookup_list) for parent in parent_list
+            ]  # List of 1 X embedding_dim
+            child_emb_list = [
+                self.sequence_embedding(child, embedding_vectors, vector_lookup_list) for child in child_list
+            ]  # List of 1 X embedding_dim
 
-            # parent_list_context = torch.zeros(1, self.embedding_dim).to(self.device) # embedding vector for all the parent node sequence
-            # child_list_context = torch.zeros(1, self.embedding_dim).to(self.device) # embedding vector for all the child node sequence
+            if not self.separate_neighbourhoods:
+                # childlstm runs over the parents followed by the children
+                child_emb_list = parent_emb_list + child_emb_list
 
+            # concatinating them up to one vector with one LSTM pass over the full list
             if len(parent_list):
-                # generating embedding vectors for each parent node sequence and concatinating them up to one vector
-                for parent in parent_list:
-
-                    parent_context = self.sequence_embedding(
-                        parent, embedding_vectors, vector_lookup_list
-                    )  # 1 X embedding_dim
-                    parent_emb_list.append(parent_context)  # 1 X embedding_dim
-
-                    parent_list_context = torch.squeeze(
-                        self.parentlstm(
-                            torch.cat(parent_emb_list).view(len(parent_emb_list), 1, -1)
-                        )[1][1],
-                        dim=0,
-                    )
+                parent_list_context = torch.squeeze(
+                    self.parentlstm(
+                        torch.cat(parent_emb_list).view(len(parent_emb_list), 1, -1)
+                    )[1][1],
+                    dim=0,
+                )
 
             else:
                 parent_list_context = torch.zeros(1, self.embedding_dim).to(self.device)
 
             if len(child_list):
-                # generating embedding vectors for each child node sequence and concatinating them up to one vector
-                for child in child_list:
-
-                    child_context = self.sequence_embedding(
-                        child, embedding_vectors, vector_lookup_list
-                    )  # 1 X embedding_dim
-                    child_emb_list.append(child_context)  # 1 X embedding_dim
-
-                    child_list_context = torch.squeeze(
-                        self.childlstm(
-                            torch.cat(child_emb_list).view(len(child_emb_list), 1, -1)
-                        )[1][1],
-                        dim=0,
-                    )
+                child_list_context = torch.squeeze(
+                    self.childlstm(
+                        torch.cat(child_emb_list).view(len(child_emb_list), 1, -1)
+                    )[1][1],
+                    dim=0,
+                )
 
             else:
                 child_list_context = torch.zeros(1, self.embedding_dim).to(self.device)
@@ -259,10 +467,10 @@ class Scorer(nn.Module):
         self.linear_classifier = nn.Sequential(
             nn.Linear(self.embedding_dim * feature_dim, hidden_dim1),  # Linear layer1
             nn.Sigmoid(),
-            nn.Dropout(dropout0)
+            nn.Dropout(dropout0),
             nn.Linear(hidden_dim1, hidden_dim2),  # Linear layer1
             nn.Sigmoid(),
-            nn.Dropout(dropout1)
+            nn.Dropout(dropout1),
             nn.Linear(hidden_dim2, output_dim),  # Linear layer1
             nn.Sigmoid(),
             nn.Dropout(dropout2)
@@ -278,36 +486,76 @@ class Scorer(nn.Module):
 
         Parameters
         ----------
-        encoding1 : Tensor feature_dim X embedding_dim
+        encoding1 : Tensor 1 X feature_dim * embedding_dim
             Encoding vector for action node from Recipe 1.
-        encoding2 : Tensor feature_dim X embedding_dim
-            Encoding vector for action node from Recipe 2.
+        encoding2 : Tensor num_actions X feature_dim * embedding_dim
+            Encoding vectors for one or more action nodes from Recipe 2.
 
         Returns
         -------
-        pred : Tensor of size 1
-            Classifier probability prediction.
+        pred : Tensor of size num_actions
+            Classifier probability prediction for every action node from Recipe 2.
 
         """
 
         # encoding1 = torch.unsqueeze(torch.flatten(context1), dim = 0) # 1 X feature_dim * embedding_dim
         # encoding2 = torch.unsqueeze(torch.flatten(context2), dim = 0)# 1 X feature_dim * embedding_dim
 
-        encoding = torch.mul(encoding1, encoding2)  # 1 X feature_dim * embedding_dim
+        encoding = torch.mul(encoding1, encoding2)  # num_actions X feature_dim * embedding_dim
+
+        pred = self.linear_classifier(encoding)  # num_actions X output_dim
+
+        # pred = self.dropout(pred) # num_actions X output_dim
+
+        pred = torch.squeeze(pred, 1)  # num_actions
+
+        return pred  # num_actions
+
+    def score_matrix(self, encodings1, encodings2, chunk_size=None):
+        """
+        Scorer model for all pairs of actions from Recipe 1 and Recipe 2 at once
+
+        Parameters
+        ----------
+        encodings1 : Tensor n X feature_dim * embedding_dim
+            Encoding vectors for action nodes from Recipe 1.
+        encodings2 : Tensor m X feature_dim * embedding_dim
+            Encoding vectors for action nodes from Recipe 2.
+        chunk_size : int, optional
+            Number of Recipe 1 actions scored per MLP call, to bound the memory for the
+            chunk_size X m X feature_dim * embedding_dim products. The default is None (all at once).
+
+        Returns
+        -------
+        pred : Tensor n X m
+            Classifier probability predictions; row i is forward(encodings1[i:i + 1], encodings2).
+
+        """
+
+        if chunk_size is None:
+            chunk_size = max(len(encodings1), 1)
+
+        pred = []
+
+        for chunk in encodings1.split(chunk_size):
 
-        pred = self.linear_classifier(encoding)  # 1 X output_dim
+            encoding = torch.mul(
+                torch.unsqueeze(chunk, dim=1), torch.unsqueeze(encodings2, dim=0)
+            )  # chunk_size X m X feature_dim * embedding_dim
 
-        # pred = self.dropout(pred) # 1 X output_dim
+            pred.append(torch.squeeze(self.linear_classifier(encoding), dim=2))  # chunk_size X m
 
-        pred = torch.squeeze(pred, 1)  # 1
+        if not pred:
+            return encodings1.new_zeros(0, len(encodings2))
 
-        return pred  # 1
+        return torch.cat(pred)  # n X m
 
 
 # Alignment model to predict which action from Recipe2 aligns (including none) with a particular action (Action1) from Recipe1
 class AlignmentModel(nn.Module):
     def __init__(
-        self, embedding_dim, hidden_dim1, hidden_dim2, output_dim, dropout0, dropout1, dropout2, device, with_feature=True
+        self, embedding_dim, hidden_dim1, hidden_dim2, output_dim, dropout0, dropout1, dropout2, device, with_feature=True,
+        separate_neighbourhoods=False,
     ):
         """
         Alignment Model
@@ -332,6 +580,8 @@ class AlignmentModel(nn.Module):
             torch device where model tensors are saved.
         with_feature : boolean; Optional
             Check whether to add features or not. Default value True.
+        separate_neighbourhoods : boolean; Optional
+            Encode the children on their own instead of after the parents (see Encoder). Default value False.
         """
 
         super().__init__()
@@ -346,7 +596,7 @@ class AlignmentModel(nn.Module):
             self.feature_dim = 1
 
         self.encoder = Encoder(
-            self.embedding_dim, device, self.feature_dim, with_feature
+            self.embedding_dim, device, self.feature_dim, with_feature, separate_neighbourhoods
         )  # Encoder class object
 
         self.scorer = Scorer(
@@ -361,6 +611,206 @@ class AlignmentModel(nn.Module):
             device,
         )  # Classifier class object
 
+        self.encoding_cache = OrderedDict()  # Recipe encodings memoized in eval mode (least recently used first)
+
+    def train(self, mode=True):
+        """
+        Set training/eval mode; the memoized recipe encodings are dropped whenever the mode is set
+        """
+
+        self.encoding_cache = OrderedDict()
+
+        return super().train(mode)
+
+    def load_state_dict(self, state_dict, strict=True):
+        """
+        Load the model weights; the recipe encodings memoized with the previous weights are dropped
+        """
+
+        self.encoding_cache = OrderedDict()
+
+        return super().load_state_dict(state_dict, strict)
+
+    def encode_recipe(self, recipe_actions, embedding_vectors, vector_lookup_list):
+        """
+        Encode all actions of a recipe.
+        In eval mode (without gradients) the encodings of the last ENCODING_CACHE_SIZE recipes are memoized,
+        s.t. every recipe is encoded only once for all recipe pairs of a dish it is part of.
+
+        Parameters
+        ----------
+        recipe_actions : List of dict
+            List of action dictionaries from a Recipe
+                (action dictionaries contain action node and their corresponding lists of parent nodes and child nodes).
+        embedding_vectors : Tensor num_subwords X embedding_dim
+             Embedding matrix for the Recipe (BERT/ELMO).
+        vector_lookup_list : Array num_tokens + 1
+             Offsets into embedding_vectors for the Conllu file token ids of the Recipe.
+
+        Returns
+        -------
+        encodings : Tensor length of recipe_actions X feature_dim * embedding_dim
+            Encoding vectors for all actions.
+
+        """
+
+        memoize = not self.training and not torch.is_grad_enabled()
+
+        if memoize:
+
+            key = (id(embedding_vectors), id(vector_lookup_list)) + tuple(id(node) for node in recipe_actions)
+
+            if key in self.encoding_cache:
+                self.encoding_cache.move_to_end(key)
+                return self.encoding_cache[key][-1]
+
+        encodings = self.encoder.encode_recipe(
+            recipe_actions, embedding_vectors, vector_lookup_list
+        )  # length of recipe_actions X feature_dim * embedding_dim
+
+        if memoize:
+            # keep the inputs alive s.t. their ids are not reused while the entry exists
+            self.encoding_cache[key] = (embedding_vectors, vector_lookup_list, list(recipe_actions), encodings)
+
+            if len(self.encoding_cache) > ENCODING_CACHE_SIZE:
+                self.encoding_cache.popitem(last=False)
+
+        return encodings
+
+    def score_pair(
+        self,
+        recipe1_actions,
+        embedding_vectors1,
+        vector_lookup_list1,
+        recipe2_actions,
+        embedding_vectors2,
+        vector_lookup_list2,
+        chunk_size=None,
+    ):
+        """
+        Alignment scores between all actions of Recipe1 and all actions of Recipe2;
+        every action is encoded once (see encode_recipe()) and all pairs are scored in one pass (see Scorer.score_matrix()).
+
+        Parameters
+        ----------
+        recipe1_actions : List of dict
+            List of action dictionaries from Recipe1.
+        embedding_vectors1 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 1 (BERT/ELMO).
+        vector_lookup_list1 : Array num_tokens + 1
+             Offsets into embedding_vectors1 for the Conllu file token ids of Recipe 1.
+        recipe2_actions : List of dict
+            List of action dictionaries from Recipe2.
+        embedding_vectors2 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 2 (BERT/ELMO).
+        vector_lookup_list2 : Array num_tokens + 1
+             Offsets into embedding_vectors2 for the Conllu file token ids of Recipe 2.
+        chunk_size : int, optional
+            Number of Recipe1 actions scored per Scorer call. The default is None (all at once).
+
+        Returns
+        -------
+        prediction_matrix : Tensor length of recipe1_actions X length of recipe2_actions
+            Row i holds the predictions of forward() for the i-th action of Recipe1.
+
+        """
+
+        encodings1 = self.encode_recipe(recipe1_actions, embedding_vectors1, vector_lookup_list1)
+        encodings2 = self.encode_recipe(recipe2_actions, embedding_vectors2, vector_lookup_list2)
+
+        prediction_matrix = self.scorer.score_matrix(
+            encodings1, encodings2, chunk_size
+        )  # length of recipe1_actions X length of recipe2_actions
+
+        return prediction_matrix
+
+    def score_pair_bidirectional(
+        self,
+        recipe1_actions,
+        embedding_vectors1,
+        vector_lookup_list1,
+        recipe2_actions,
+        embedding_vectors2,
+        vector_lookup_list2,
+        chunk_size=None,
+    ):
+        """
+        Alignment scores of both alignment directions of a recipe pair; every recipe is encoded once
+        (with all its actions, see encode_recipe()) and both score matrices are computed from these encodings.
+
+        Parameters
+        ----------
+        recipe1_actions, recipe2_actions : List of dict
+            All action dictionaries (Action_Dicts_List) of Recipe1 and Recipe2; the first one is the null alignment.
+        embedding_vectors1, embedding_vectors2 : Tensor num_subwords X embedding_dim
+             Embedding matrices for Recipe 1 and Recipe 2 (BERT/ELMO).
+        vector_lookup_list1, vector_lookup_list2 : Array num_tokens + 1
+             Offsets into the embedding matrices for the Conllu file token ids.
+        chunk_size : int, optional
+            Number of actions scored per Scorer call. The default is None (all at once).
+
+        Returns
+        -------
+        prediction_matrix : Tensor length of recipe1_actions - 1 X length of recipe2_actions
+            Scores of recipe1 -> recipe2, equal to score_pair(recipe1_actions[1:], ..., recipe2_actions, ...).
+        inverse_prediction_matrix : Tensor length of recipe2_actions - 1 X length of recipe1_actions
+            Scores of recipe2 -> recipe1, equal to score_pair(recipe2_actions[1:], ..., recipe1_actions, ...).
+
+        """
+
+        encodings1 = self.encode_recipe(recipe1_actions, embedding_vectors1, vector_lookup_list1)
+        encodings2 = self.encode_recipe(recipe2_actions, embedding_vectors2, vector_lookup_list2)
+
+        prediction_matrix = self.scorer.score_matrix(encodings1[1:], encodings2, chunk_size)
+        inverse_prediction_matrix = self.scorer.score_matrix(encodings2[1:], encodings1, chunk_size)
+
+        return prediction_matrix, inverse_prediction_matrix
+
+    def score_nodes(self, recipe_nodes1, recipe_nodes2):
+        """
+        Alignment scores between the actions of Recipe1 and Recipe2 from their collected nodes
+        (see collect_recipe_nodes()); equals score_pair() for the same actions.
+
+        Returns
+        -------
+        prediction_matrix : Tensor number of Recipe1 actions X number of Recipe2 actions
+            Row i holds the predictions of forward() for the i-th action of Recipe1.
+
+        """
+
+        encodings1 = self.encoder.encode_nodes(recipe_nodes1)
+        encodings2 = self.encoder.encode_nodes(recipe_nodes2)
+
+        return self.scorer.score_matrix(encodings1, encodings2)
+
+    def score_batch(self, recipe_pairs):
+        """
+        Predictions for a batch of classification problems (action of Recipe1, actions of Recipe2) from several recipe pairs
+        (padded with -inf to the largest candidate set, see pad_predictions()).
+
+        Parameters
+        ----------
+        recipe_pairs : List of tuple
+            (recipe1_actions, embedding_vectors1, vector_lookup_list1, recipe2_actions, embedding_vectors2, vector_lookup_list2)
+            per recipe pair, with the actions of Recipe1 to classify (see score_pair());
+            or (recipe_nodes1, recipe_nodes2) per recipe pair (see score_nodes()).
+
+        Returns
+        -------
+        predictions : Tensor number of Recipe1 actions X largest number of Recipe2 actions
+            Predictions of all Recipe1 actions (in the order of recipe_pairs).
+        mask : Tensor number of Recipe1 actions X largest number of Recipe2 actions (bool)
+            True for the entries that are actions of Recipe2.
+
+        """
+
+        return pad_predictions(
+            [
+                self.score_nodes(*recipe_pair) if len(recipe_pair) == 2 else self.score_pair(*recipe_pair)
+                for recipe_pair in recipe_pairs
+            ]
+        )
+
     def forward(
         self,
         action1,
@@ -383,21 +833,17 @@ class AlignmentModel(nn.Module):
             List of Parent Nodes for Action node from Recipe1.
         child_list1 : List of Tensors
             List of Child Nodes for Action node from Recipe1.
-        embedding_vectors1 : Dict
-             Embedding dictionary for Recipe 1;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list1 : Dict
-             Look up dictionary for Recipe 1 embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+        embedding_vectors1 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 1 (BERT/ELMO).
+        vector_lookup_list1 : Array num_tokens + 1
+             Offsets into embedding_vectors1 for the Conllu file token ids of Recipe 1.
         recipe2_actions : List of dict
             List of all action dictionaries from Recipe2
                 (action dictionaries contain action node and their corresponding lists of parent nodes and child nodes).
-        embedding_vectors2 : Dict
-             Embedding dictionary for Recipe 2;
-                 where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-        vector_lookup_list2 : Dict
-             Look up dictionary for Recipe 2 embeddings;
-                 where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO.
+        embedding_vectors2 : Tensor num_subwords X embedding_dim
+             Embedding matrix for Recipe 2 (BERT/ELMO).
+        vector_lookup_list2 : Array num_tokens + 1
+             Offsets into embedding_vectors2 for the Conllu file token ids of Recipe 2.
 
         Returns
         -------
@@ -406,30 +852,17 @@ class AlignmentModel(nn.Module):
 
         """
 
-        prediction_list = (
-            []
-        )  # List of probability predictions between an action in Recipe1 and all actions in Recipe2 (including none of these)
-
         encoding1 = self.encoder(
             action1, parent_list1, child_list1, embedding_vectors1, vector_lookup_list1
-        )  # embedding_dim X 3
-
-        for node in recipe2_actions:
-
-            encoding2 = self.encoder(
-                node["Action"],
-                node["Parent_List"],
-                node["Child_List"],
-                embedding_vectors2,
-                vector_lookup_list2,
-            )  # embedding_dim X 3
-
-            pred = self.scorer(encoding1, encoding2)  # Probability prediction
+        )  # 1 X feature_dim * embedding_dim
 
-            prediction_list.append(pred)
+        encodings2 = self.encode_recipe(
+            recipe2_actions, embedding_vectors2, vector_lookup_list2
+        )  # length of recipe2_actions X feature_dim * embedding_dim
 
-        prediction_list = torch.stack(
-            prediction_list, dim=1
+        # Probability predictions between an action in Recipe1 and all actions in Recipe2 (including none of these)
+        prediction_list = torch.unsqueeze(
+            self.scorer(encoding1, encodings2), dim=0
         )  # 1 X length of recipe2_actions
 
         return prediction_list  # 1 X length of recipe2_actions
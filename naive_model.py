@@ -190,7 +190,7 @@ class NaiveModel:
                               parsed_recipe2, 
                               correct_predictions,
                               num_actions, 
-                              results_df):
+                              results):
         
         for pair in action_pair_list:
             
@@ -238,11 +238,11 @@ class NaiveModel:
                 "Predicted_Label": predicted_label
                 }
             
-            results_df = results_df.append(result_dict, ignore_index=True)
+            results.add(result_dict)
         
         #correct_predictions += predictions
             
-        return correct_predictions, num_actions, results_df
+        return correct_predictions, num_actions, results
             
                 
             
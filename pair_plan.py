@@ -0,0 +1,176 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pair plan of a dish: the (source, target) recipe pairs of conllu2crowd_topk.generate_pairs_experiment()
+with the action ids to align, computed once per dish.
+
+The plan can be stored as a JSON file in the dish folder; it is recomputed when a
+recipe file of the dish has been added, removed or changed.
+"""
+
+# importing libraries
+import os
+import json
+
+from recipe_registry import fetch_recipe
+from conllu2crowd_topk import generate_pairs_experiment
+
+
+def recipe_action_ids(recipe_filename):
+    """
+    Token ids of all B- tagged tokens (action and entity nodes) of a recipe, in recipe order
+    """
+
+    recipe = fetch_recipe(recipe_filename)
+
+    return list(dict.fromkeys(token_id for token_id, tag in zip(recipe.ids, recipe.tags) if tag[0] == "B"))
+
+
+#####################################
+
+
+def generate_pair_plan(recipe_folder):
+    """
+    Pair the recipes of a dish (see conllu2crowd_topk.generate_pairs_experiment())
+
+    Parameters
+    ----------
+    recipe_folder : String
+        Recipe folder of the dish, e.g. data/dish-name/recipes.
+
+    Returns
+    -------
+    pair_plan : List of Dict
+        One dictionary per pair with keys "Source", "Target" (recipe names) and "Source_Action_ids",
+        "Target_Action_ids" (see recipe_action_ids()).
+
+    """
+
+    pairs = generate_pairs_experiment(
+        recipe_folder, r1_indexed=False, r1_shuffled=False, r2_indexed=True, r2_indices_from=1
+    )
+
+    return [
+        {
+            "Source": source.name,
+            "Target": target.name,
+            "Source_Action_ids": recipe_action_ids(os.path.join(recipe_folder, source.name + ".conllu")),
+            "Target_Action_ids": recipe_action_ids(os.path.join(recipe_folder, target.name + ".conllu")),
+        }
+        for source, target in pairs
+    ]
+
+
+#####################################
+
+
+def recipe_folder_state(recipe_folder):
+    """
+    Name, modification time and size of every file in a recipe folder
+    """
+
+    state = dict()
+
+    for filename in sorted(os.listdir(recipe_folder)):
+
+        stat = os.stat(os.path.join(recipe_folder, filename))
+        state[filename] = [stat.st_mtime_ns, stat.st_size]
+
+    return state
+
+
+#####################################
+
+
+def fetch_pair_plan(recipe_folder, plan_filename=None):
+    """
+    Pair plan of a dish, read from plan_filename if it is up to date
+
+    Parameters
+    ----------
+    recipe_folder : String
+        Recipe folder of the dish, e.g. data/dish-name/recipes.
+    plan_filename : String, optional
+        JSON file where the plan is cached. The default is None (no caching).
+
+    Returns
+    -------
+    pair_plan : List of Dict
+        Pair plan (see generate_pair_plan()).
+
+    """
+
+    if plan_filename is None:
+        return generate_pair_plan(recipe_folder)
+
+    state = recipe_folder_state(recipe_folder)
+
+    try:
+        with open(plan_filename, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+
+        if cached["Recipe_Files"] == state:
+            return cached["Pairs"]
+
+    except (OSError, ValueError, KeyError):
+        pass
+
+    pair_plan = generate_pair_plan(recipe_folder)
+
+    try:
+        tmp_filename = "{}.{}.tmp".format(plan_filename, os.getpid())
+
+        with open(tmp_filename, "w", encoding="utf-8") as file:
+            json.dump({"Recipe_Files": state, "Pairs": pair_plan}, file)
+
+        os.replace(tmp_filename, plan_filename)
+
+    except OSError:
+        print("Pair plan could not be cached in", plan_filename)
+
+    return pair_plan
+
+
+#####################################
+
+
+def pair_plan_alignments(pair_plan, insertion=False):
+    """
+    Action ids to align for every pair of the plan
+
+    Parameters
+    ----------
+    pair_plan : List of Dict
+        Pair plan (see generate_pair_plan()).
+    insertion : boolean, optional
+        Align target to source (reversed pairs, used for the insertion costs). The default is False.
+
+    Returns
+    -------
+    alignments : List of List
+        [file1, token1, file2] for every action token1 of recipe file1 in the pair (file1, file2).
+
+    """
+
+    alignments = []
+
+    for pair in pair_plan:
+
+        if insertion:
+            file1, file2, action_ids = pair["Target"], pair["Source"], pair["Target_Action_ids"]
+        else:
+            file1, file2, action_ids = pair["Source"], pair["Target"], pair["Source_Action_ids"]
+
+        alignments.extend([file1, action_id, file2] for action_id in action_ids)
+
+    return alignments
@@ -0,0 +1,153 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming writer for prediction files.
+
+Every prediction row is written to the TSV file as soon as it is scored (in the format
+of DataFrame.to_csv, see utils.save_predictions()), s.t. the memory does not grow with
+the number of predictions of a dish. A prediction file left by an interrupted run can
+be resumed: complete rows are kept, and the actions they belong to are not scored again.
+"""
+
+# importing libraries
+import os
+import csv
+
+from constants import PREDICTION_FLUSH_ROWS
+
+
+class PredictionWriter:
+    def __init__(
+        self,
+        path,
+        columns,
+        key_columns=("Recipe1", "Action1_id", "Recipe2"),
+        flush_rows=PREDICTION_FLUSH_ROWS,
+        resume=False,
+    ):
+        """
+        Prediction file written row by row
+
+        Parameters
+        ----------
+        path : String
+            Path of the prediction file.
+        columns : List of String
+            Columns of the prediction file.
+        key_columns : Tuple of String, optional
+            Columns identifying the prediction of an action. The default is ("Recipe1", "Action1_id", "Recipe2").
+        flush_rows : Int, optional
+            Number of rows written between flushes of the file. The default is PREDICTION_FLUSH_ROWS from constants.py.
+        resume : boolean, optional
+            Keep the complete rows of an existing file (with the same columns) and append to it;
+            otherwise the file is overwritten. The default is False.
+
+        Attributes
+        ----------
+        written_keys : Set of Tuple
+            Keys (values of key_columns as strings) of the rows kept from the existing file.
+        num_rows : Int
+            Number of rows written by this writer.
+        """
+
+        self.path = path
+        self.columns = list(columns)
+        self.key_positions = [self.columns.index(column) for column in key_columns]
+        self.flush_rows = flush_rows
+
+        self.written_keys = set()
+        self.num_rows = 0
+
+        resumed = resume and os.path.exists(path) and self.recover()
+
+        self.file = open(path, "a" if resumed else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file, delimiter="\t", lineterminator="\n")
+
+        if not resumed:
+            self.writer.writerow(self.columns)
+
+    def recover(self):
+        """
+        Truncate the existing file after its last complete row and read the keys of its rows
+
+        Returns
+        -------
+        resumed : boolean
+            Whether the file has a complete header; otherwise it is written anew.
+
+        """
+
+        with open(self.path, "rb+") as file:
+
+            content = file.read()
+            end = content.rfind(b"\n") + 1  # a row interrupted while writing is dropped
+
+            file.truncate(end)
+
+        if end == 0:
+            return False
+
+        rows = csv.reader(content[:end].decode("utf-8").splitlines(keepends=True), delimiter="\t")
+
+        header = next(rows)
+
+        if header != self.columns:
+            raise ValueError(
+                "Columns of {} are {}, expected {}".format(self.path, header, self.columns)
+            )
+
+        for row in rows:
+            self.written_keys.add(tuple(row[position] for position in self.key_positions))
+
+        return True
+
+    def __contains__(self, key):
+        """
+        Whether the file has a row for key (values of key_columns)
+        """
+
+        return tuple(str(value) for value in key) in self.written_keys
+
+    def __len__(self):
+
+        return len(self.written_keys) + self.num_rows
+
+    def add(self, row):
+        """
+        Write a row
+
+        Parameters
+        ----------
+        row : Dict
+            Values of the row by column name; missing columns are empty.
+
+        """
+
+        self.writer.writerow([row.get(column) for column in self.columns])
+
+        self.num_rows += 1
+
+        if self.num_rows % self.flush_rows == 0:
+            self.file.flush()
+
+    def close(self):
+
+        self.file.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
@@ -29,9 +29,10 @@ import torch.optim as optim
 
 from datetime import datetime
 from model import AlignmentModel
-from transformers import BertTokenizer, BertModel
+from results_collector import ResultsCollector
+from transformers import BertTokenizerFast, BertModel
 from utils import fetch_recipe, load_checkpoint, save_predictions
-from constants import recipe_folder_name, folder, alignment_file, destination_folder1, OUTPUT_DIM, LR, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, MAX_EPOCHS
+from constants import recipe_folder_name, folder, alignment_file, destination_folder1, OUTPUT_DIM, LR, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, MAX_EPOCHS, SEPARATE_NEIGHBOURHOODS
 from training_testing import Folds
 
 device = torch.device("cuda:2" if torch.cuda.is_available() else "cpu")
@@ -117,8 +118,8 @@ class Property:
         # Group by Recipe pairs
         group_alignments = alignments.groupby(["file1", "file2"])
 
-        results_df = pd.DataFrame(
-                columns=["Action1_id", "True_Label", "Predicted_Label"]
+        results = ResultsCollector(
+                ["Action1_id", "True_Label", "Predicted_Label"]
             )
 
         for key in group_alignments.groups.keys():
@@ -185,9 +186,9 @@ class Property:
                         }
 
                         # Store the prediction
-                results_df = results_df.append(results_dict, ignore_index=True)
+                results.add(results_dict)
 
-        return correct_predictions, num_actions, results_df
+        return correct_predictions, num_actions, results.to_frame()
 
 
 #####################################
@@ -262,7 +263,7 @@ def main():
     
     p = Property()
     
-    tokenizer = BertTokenizer.from_pretrained(
+    tokenizer = BertTokenizerFast.from_pretrained(
                 "bert-base-uncased"
             )  # Bert Tokenizer
         
@@ -274,7 +275,10 @@ def main():
                 "hidden_size"
             ]  # BERT embedding dimension
         
-    model = AlignmentModel(embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device).to(
+    model = AlignmentModel(
+        embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device,
+        separate_neighbourhoods=SEPARATE_NEIGHBOURHOODS,
+    ).to(
                 device
             )  # Out Alignment Model with features
     
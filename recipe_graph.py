@@ -0,0 +1,301 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Graph structure of a parsed recipe (nodes, parents and children of every token)
+and the compact action graph used by the models.
+"""
+
+# importing libraries
+import torch
+import numpy as np
+
+from ast import literal_eval
+from itertools import chain
+from collections.abc import Mapping
+
+
+def dependency_heads(deps):
+    """
+    Interprets the entry in the DEPS column.
+    Returns a list of head indices.
+    """
+    head_list = list()
+
+    """
+    if deps:
+        deps = re.split("[( )]", deps) # TODO: rather use literaleval
+        unwanted = {"[", "]"}
+        head_list = [int(l.split(",")[0]) for l in deps if l not in unwanted]
+    """
+    # TODO: test (as soon as recipes are non-tree graphs)
+    if deps:
+        deps = literal_eval(deps)
+        head_list = [int(h) for h, d in deps]
+
+    return head_list
+
+
+#####################################
+
+
+class RecipeIndex:
+    def __init__(self, parsed_recipe):
+        """
+        One-pass index of a Conllu parsed recipe
+
+        Parameters
+        ----------
+        parsed_recipe : List
+            Conllu parsed file to generate a list of sentences.
+
+        Attributes
+        ----------
+        action_ids : List of Int
+            Token ids of all action nodes (B-A tags).
+        tails : List of List of Int
+            tails[i] are the ids of the I- tagged tokens directly following token i (split node).
+        parents : List of List of Int
+            parents[i] are the head of token i and its DEPS heads (none if the head is 0).
+        children : List of List of Int
+            children[i] are the ids of the B- tagged tokens with token i as head or as one of their DEPS heads (in recipe order).
+        """
+
+        lines = parsed_recipe[0]
+
+        num_tokens = len(lines)
+
+        self.action_ids = list()
+        self.tails = [[] for _ in range(num_tokens + 2)]
+        self.parents = [[] for _ in range(num_tokens + 1)]
+        self.children = [[] for _ in range(num_tokens + 1)]
+
+        for line in lines:
+
+            heads = [line["head"]] + dependency_heads(line["deps"])
+
+            if line["head"] != 0:
+                self.parents[line["id"]] = heads
+
+            if line["xpos"].startswith("B"):
+
+                for head in dict.fromkeys(heads):  # every child is listed once per head
+                    if 0 < head <= num_tokens:
+                        self.children[head].append(line["id"])
+
+                if line["xpos"].startswith("B-A"):
+                    self.action_ids.append(line["id"])
+
+        # I- tagged tokens continue the node of the preceding token
+        for token_id in range(num_tokens - 1, -1, -1):
+
+            if lines[token_id]["xpos"].startswith("I"):
+                self.tails[token_id] = [lines[token_id]["id"]] + self.tails[token_id + 1]
+
+    def span(self, token_id):
+        """
+        Token ids of the node starting at token_id
+        """
+
+        return [token_id] + self.tails[token_id]
+
+
+#####################################
+
+
+def compressed_rows(rows):
+    """
+    CSR representation of a list of integer lists
+
+    Returns
+    -------
+    offsets : Array len(rows) + 1 (int32)
+        values[offsets[i]:offsets[i + 1]] are the entries of rows[i].
+    values : Array (int32)
+        Entries of all rows.
+
+    """
+
+    offsets = np.zeros(len(rows) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+
+    values = np.fromiter(chain.from_iterable(rows), dtype=np.int32, count=offsets[-1])
+
+    return offsets, values
+
+
+#####################################
+
+
+class RecipeGraph:
+
+    __slots__ = (
+        "action_ids",
+        "action_nodes",
+        "node_offsets",
+        "node_tokens",
+        "parent_offsets",
+        "parent_nodes",
+        "child_offsets",
+        "child_nodes",
+        "tokens",
+        "views",
+    )
+
+    def __init__(self, recipe_index, action_list, device):
+        """
+        Array-backed action graph of a recipe.
+        Behaves like the list of action dictionaries (Action_id, Action, Parent_List, Child_List) of
+        utils.generate_recipe_dict(), with the 'no alignment' action at index 0; the dictionaries are
+        read-only views created on first access.
+
+        Parameters
+        ----------
+        recipe_index : RecipeIndex object
+            Index of the parsed recipe.
+        action_list : List
+            List of action ids in recipe.
+        device : object
+            torch device where model tensors are saved.
+
+        Attributes
+        ----------
+        action_ids : Array num_actions + 1 (int32)
+            Token id of every action (0 for 'no alignment').
+        action_nodes : Array num_actions + 1 (int32)
+            Node of every action (-1 for 'no alignment').
+        node_offsets, node_tokens : Array (int32)
+            CSR token ids of every (distinct) node.
+        parent_offsets, parent_nodes : Array (int32)
+            CSR parent nodes of every action.
+        child_offsets, child_nodes : Array (int32)
+            CSR child nodes of every action.
+        tokens : Tensor
+            node_tokens on device (one copy per recipe); node tensors are slices of it.
+        """
+
+        node_index = dict()  # first token id -> node
+        spans = []
+
+        def node(token_id):
+
+            if token_id not in node_index:
+                node_index[token_id] = len(spans)
+                spans.append(recipe_index.span(token_id))
+
+            return node_index[token_id]
+
+        action_nodes = [-1] + [node(action_id) for action_id in action_list]
+        parents = [[]] + [[node(parent_id) for parent_id in recipe_index.parents[action_id]] for action_id in action_list]
+        children = [[]] + [[node(child_id) for child_id in recipe_index.children[action_id]] for action_id in action_list]
+
+        self.action_ids = np.array([0] + list(action_list), dtype=np.int32)
+        self.action_nodes = np.array(action_nodes, dtype=np.int32)
+
+        self.node_offsets, self.node_tokens = compressed_rows(spans)
+        self.parent_offsets, self.parent_nodes = compressed_rows(parents)
+        self.child_offsets, self.child_nodes = compressed_rows(children)
+
+        self.tokens = torch.from_numpy(self.node_tokens.astype(np.int64)).to(device)
+
+        self.views = [None] * len(action_nodes)
+
+    def node(self, node):
+        """
+        Token ids of a node (empty for node -1)
+        """
+
+        if node < 0:
+            return self.tokens[:0]
+
+        return self.tokens[self.node_offsets[node] : self.node_offsets[node + 1]]
+
+    def parent_list(self, action):
+        """
+        List of parent nodes of the action at position action
+        """
+
+        return [
+            self.node(node) for node in self.parent_nodes[self.parent_offsets[action] : self.parent_offsets[action + 1]]
+        ]
+
+    def child_list(self, action):
+        """
+        List of child nodes of the action at position action
+        """
+
+        return [
+            self.node(node) for node in self.child_nodes[self.child_offsets[action] : self.child_offsets[action + 1]]
+        ]
+
+    def __len__(self):
+
+        return len(self.action_ids)
+
+    def __getitem__(self, position):
+
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        if position < 0:
+            position += len(self)
+
+        if self.views[position] is None:
+            self.views[position] = ActionView(self, position)
+
+        return self.views[position]
+
+    def __iter__(self):
+
+        return (self[i] for i in range(len(self)))
+
+
+#####################################
+
+
+class ActionView(Mapping):
+
+    __slots__ = ("graph", "position")
+
+    fields = ("Action_id", "Action", "Parent_List", "Child_List")
+
+    def __init__(self, graph, position):
+        """
+        Action dictionary (Action_id, Action, Parent_List, Child_List) of the action at position in a RecipeGraph
+        """
+
+        self.graph = graph
+        self.position = position
+
+    def __getitem__(self, key):
+
+        if key == "Action_id":
+            return int(self.graph.action_ids[self.position])
+
+        if key == "Action":
+            return self.graph.node(self.graph.action_nodes[self.position])
+
+        if key == "Parent_List":
+            return self.graph.parent_list(self.position)
+
+        if key == "Child_List":
+            return self.graph.child_list(self.position)
+
+        raise KeyError(key)
+
+    def __iter__(self):
+
+        return iter(self.fields)
+
+    def __len__(self):
+
+        return len(self.fields)
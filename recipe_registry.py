@@ -0,0 +1,195 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-wide registry of parsed recipe files.
+
+Every CoNLL-U recipe file is parsed once per process; training, testing, the pairing
+of recipes (conllu2crowd_topk) and the baselines all read the same parse. The registry
+keeps the most recently used recipes (RECIPE_REGISTRY_SIZE) and re-reads a file when
+it has changed on disk. Files are read with the columnar reader of conllu_reader.
+"""
+
+# importing libraries
+import os
+
+from collections import OrderedDict
+from constants import RECIPE_REGISTRY_SIZE
+from conllu_reader import FIELDS, read_recipe_file, column_tokens
+
+
+def event_spans(ids, tags):
+    """
+    Token ids of all actions (B-A tag followed by I-A tags) of a recipe
+
+    Parameters
+    ----------
+    ids : List of Int
+        Token ids.
+    tags : List of String
+        Tags (Conllu 'xpos' column).
+
+    Returns
+    -------
+    events : List of List of Int
+        Token ids of every action, as in conllu2crowd_topk.readfile().
+
+    """
+
+    events = []
+    event_acc = []
+
+    for token_id, tag in zip(ids, tags):
+
+        if tag.startswith("B-A"):
+            if event_acc:
+                events.append(event_acc)
+            event_acc = [token_id]
+
+        elif tag.startswith("I-A"):
+            event_acc.append(token_id)
+
+        elif event_acc:
+            events.append(event_acc)
+            event_acc = []
+
+    # if the last token was an action token , it's still in the buffer
+    if event_acc:
+        events.append(event_acc)
+
+    return events
+
+
+#####################################
+
+
+class ParsedRecipe:
+
+    __slots__ = ("filename", "sentences", "_parsed_recipe", "ids", "tokens", "tags", "heads", "deps", "events")
+
+    def __init__(self, filename, sentences, parsed_recipe=None):
+        """
+        Parse of a recipe file and its columns
+
+        Parameters
+        ----------
+        filename : String
+            Recipe filename.
+        sentences : List of Dict
+            Columns of every sentence as returned by conllu_reader.read_recipe_file().
+        parsed_recipe : List, optional
+            Conllu parsed file, if the file was parsed with conllu. By default the token
+            dictionaries are built from the columns on first access.
+
+        Attributes
+        ----------
+        ids, tokens, tags, heads, deps : List
+            Conllu 'id', 'form', 'xpos', 'head' and 'deps' columns of the first sentence.
+        events : List of List of Int
+            Token ids of every action.
+        """
+
+        self.filename = filename
+        self.sentences = sentences
+        self._parsed_recipe = parsed_recipe
+
+        columns = sentences[0] if sentences else dict.fromkeys(FIELDS, [])
+
+        self.ids = columns["id"]
+        self.tokens = columns["form"]
+        self.tags = columns["xpos"]
+        self.heads = columns["head"]
+        self.deps = columns["deps"]
+
+        self.events = event_spans(self.ids, self.tags)
+
+    @property
+    def parsed_recipe(self):
+        """
+        Parsed file (list of sentences of token dictionaries) as returned by utils.fetch_parsed_recipe()
+        """
+
+        if self._parsed_recipe is None:
+            self._parsed_recipe = column_tokens(self.sentences)
+
+        return self._parsed_recipe
+
+
+#####################################
+
+
+class RecipeRegistry:
+    def __init__(self, maxsize=RECIPE_REGISTRY_SIZE):
+        """
+        LRU registry of parsed recipe files
+
+        Parameters
+        ----------
+        maxsize : Int, optional
+            Maximum number of recipes kept. The default is RECIPE_REGISTRY_SIZE.
+        """
+
+        self.maxsize = maxsize
+        self.recipes = OrderedDict()  # path -> (modification time, size, ParsedRecipe)
+
+    def fetch(self, filename):
+        """
+        Parsed recipe for a file; the file is only parsed if it is not in the registry or has changed
+
+        Parameters
+        ----------
+        filename : String
+            Recipe filename.
+
+        Returns
+        -------
+        recipe : ParsedRecipe object
+            Parse of the recipe file.
+
+        """
+
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+
+        entry = self.recipes.get(path)
+
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            self.recipes.move_to_end(path)
+            return entry[2]
+
+        recipe = ParsedRecipe(filename, *read_recipe_file(path))
+
+        self.recipes[path] = (stat.st_mtime_ns, stat.st_size, recipe)
+        self.recipes.move_to_end(path)
+
+        while len(self.recipes) > self.maxsize:
+            self.recipes.popitem(last=False)
+
+        return recipe
+
+    def clear(self):
+        """
+        Remove all recipes from the registry
+        """
+
+        self.recipes.clear()
+
+
+registry = RecipeRegistry()  # Process-wide registry
+
+
+def fetch_recipe(filename):
+    """
+    Parsed recipe for a file from the process-wide registry (see RecipeRegistry.fetch())
+    """
+
+    return registry.fetch(filename)
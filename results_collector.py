@@ -0,0 +1,87 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Row-wise accumulation of results (predictions, fold and test results) in columnar buffers.
+
+Rows are appended to one list per column and the DataFrame is built once, instead of
+copying the whole frame for every row (DataFrame.append, removed in pandas 2.0).
+"""
+
+# importing libraries
+import pandas as pd
+
+
+class ResultsCollector:
+    def __init__(self, columns):
+        """
+        Columnar buffers for result rows
+
+        Parameters
+        ----------
+        columns : List of String
+            Column names; columns of rows with other keys are added after them (as DataFrame.append did).
+        """
+
+        self.buffers = {column: [] for column in columns}
+        self.missing = set()  # columns with missing values
+        self.num_rows = 0
+
+    def __len__(self):
+
+        return self.num_rows
+
+    def add(self, row):
+        """
+        Append a row
+
+        Parameters
+        ----------
+        row : Dict
+            Values of the row by column name; missing columns are empty (NaN).
+
+        """
+
+        for column in row:
+            if column not in self.buffers:
+                self.buffers[column] = [None] * self.num_rows
+                if self.num_rows:
+                    self.missing.add(column)
+
+        for column, buffer in self.buffers.items():
+            value = row.get(column)
+            if value is None:
+                self.missing.add(column)
+            buffer.append(value)
+
+        self.num_rows += 1
+
+    def to_frame(self):
+        """
+        DataFrame of all rows
+
+        Returns
+        -------
+        results_df : pd.DataFrame
+            One row per added row, columns in the order of the collector; columns with
+            missing values keep their values as objects (e.g. integers are not turned into floats).
+
+        """
+
+        return pd.DataFrame(
+            {
+                column: pd.Series(buffer, dtype=object) if column in self.missing else buffer
+                for column, buffer in self.buffers.items()
+            },
+            columns=list(self.buffers),
+            index=pd.RangeIndex(self.num_rows),
+        )
@@ -0,0 +1,172 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Binary prediction format for GED testing.
+
+Instead of one TSV row with the ranked labels and scores of every action, a .npz file
+holds one dense float32 score matrix per recipe pair (actions of Recipe1 X all actions
+of Recipe2, including the null alignment), with the action ids of its rows and columns.
+The pairs are written to the archive one by one, and the matrices are loaded without
+parsing text. The TSV format of test_ged.py can be exported from the archive.
+
+Usage: python score_matrices.py [npz_file] [tsv_file]
+"""
+
+# importing libraries
+import torch
+import zipfile
+import argparse
+import numpy as np
+
+from prediction_writer import PredictionWriter
+
+
+class ScoreMatrixWriter:
+    def __init__(self, path):
+        """
+        Archive of score matrices written pair by pair
+
+        Parameters
+        ----------
+        path : String
+            Path of the .npz file.
+        """
+
+        self.path = path
+        self.pairs = []
+
+        self.archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    def write_array(self, name, array):
+
+        with self.archive.open(name + ".npy", "w", force_zip64=True) as file:
+            np.lib.format.write_array(file, np.asarray(array), allow_pickle=False)
+
+    def add_pair(self, recipe1, recipe2, source_ids, target_ids, scores):
+        """
+        Write the score matrix of a recipe pair
+
+        Parameters
+        ----------
+        recipe1, recipe2 : String
+            Recipe names.
+        source_ids : List of Int
+            Action ids of the rows (actions of Recipe1).
+        target_ids : List of Int
+            Action ids of the columns (actions of Recipe2).
+        scores : Array len(source_ids) X len(target_ids)
+            Alignment scores.
+
+        """
+
+        pair_id = len(self.pairs)
+
+        self.write_array("pair{}_source_ids".format(pair_id), np.asarray(source_ids, dtype=np.int64))
+        self.write_array("pair{}_target_ids".format(pair_id), np.asarray(target_ids, dtype=np.int64))
+        self.write_array(
+            "pair{}_scores".format(pair_id),
+            np.asarray(scores, dtype=np.float32).reshape(len(source_ids), len(target_ids)),
+        )
+
+        self.pairs.append((recipe1, recipe2))
+
+    def close(self):
+
+        self.write_array("pairs", np.array(self.pairs, dtype=str).reshape(len(self.pairs), 2))
+
+        self.archive.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+#####################################
+
+
+def load_score_matrices(path):
+    """
+    Load the score matrices of an archive written by ScoreMatrixWriter
+
+    Parameters
+    ----------
+    path : String
+        Path of the .npz file.
+
+    Returns
+    -------
+    score_matrices : Dict
+        (recipe1, recipe2) -> (source_ids, target_ids, scores), in the order the pairs were written;
+        source_ids and target_ids are int64 arrays, scores a float32 array len(source_ids) X len(target_ids).
+
+    """
+
+    with np.load(path, allow_pickle=False) as archive:
+
+        return {
+            (recipe1, recipe2): (
+                archive["pair{}_source_ids".format(pair_id)],
+                archive["pair{}_target_ids".format(pair_id)],
+                archive["pair{}_scores".format(pair_id)],
+            )
+            for pair_id, (recipe1, recipe2) in enumerate(archive["pairs"].tolist())
+        }
+
+
+#####################################
+
+
+def export_tsv(npz_path, tsv_path):
+    """
+    Write the score matrices of an archive as a GED prediction file (see test_ged.py):
+    per action of Recipe1 the action ids of Recipe2 and their scores, ranked from the best to the worst
+    """
+
+    columns = ["Recipe1", "Action1_id", "Recipe2", "Predicted_Label", "Probabilities"]
+
+    with PredictionWriter(tsv_path, columns) as predictions:
+
+        for (recipe1, recipe2), (source_ids, target_ids, scores) in load_score_matrices(npz_path).items():
+
+            # ranked as in test_ged.py (torch.topk), s.t. tied scores are in the same order
+            ranked_scores, rankings = torch.topk(torch.from_numpy(scores), scores.shape[1], dim=1)
+
+            for source_id, ranking, row in zip(source_ids.tolist(), rankings.numpy(), ranked_scores.tolist()):
+                predictions.add(
+                    {
+                        "Recipe1": recipe1,
+                        "Action1_id": source_id,
+                        "Recipe2": recipe2,
+                        "Predicted_Label": target_ids[ranking].tolist(),
+                        "Probabilities": row,
+                    }
+                )
+
+
+#####################################
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="""Export the score matrices of GED testing as a TSV prediction file""")
+    parser.add_argument('npz_file', type=str, help="""Score matrices (.npz) written by test_ged.py --output_format npz""")
+    parser.add_argument('tsv_file', type=str, help="""Prediction file to write""")
+    args = parser.parse_args()
+
+    export_tsv(args.npz_file, args.tsv_file)
+
+    print("Predictions exported to ==> {}".format(args.tsv_file))
@@ -13,13 +13,16 @@ import torch.optim as optim
 import pandas as pd
 
 from model import AlignmentModel
+from embedding_cache import EmbeddingCache
+from alignment_labels import AlignmentLabels
+from results_collector import ResultsCollector
 from cosine_similarity_model import SimpleModel
 from sequence_model import SequenceModel
 from naive_model import NaiveModel
-from transformers import BertTokenizer, BertModel
+from transformers import BertTokenizerFast, BertModel
 from flair.data import Sentence
 from flair.embeddings import ELMoEmbeddings
-from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE
+from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE, SEPARATE_NEIGHBOURHOODS
 
 from datetime import datetime
 from constants import (
@@ -27,6 +30,7 @@ from constants import (
     test_folder,
     alignment_file,
     recipe_folder_name,
+    embedding_cache_folder,
     destination_folder1,
     destination_folder2,
     destination_folder3,
@@ -39,6 +43,7 @@ from utils import (
     save_checkpoint,
     load_checkpoint,
     save_predictions,
+    save_fold_results,
     create_acc_loss_graph,
     save_vocabulary,
     load_vocabulary
@@ -55,55 +60,33 @@ parser.add_argument('model_name', type=str, help="""Model Name; one of {'Simple'
 parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
 parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
 parser.add_argument('--fold', type=int, help="""Fold Number; number in range 1 to 10""")
-args = parser.parse_args()
 
-model_name = args.model_name
-    
-embedding_name = args.embedding_name
+# -----------------------------------------------------------------------
 
-if args.cuda_device:
-    device = torch.device("cuda:"+args.cuda_device if torch.cuda.is_available() else "cpu")
-    flair.device = device 
 
-fold = args.fold
+# Testing Process Class
+class Folds_Test:
+    def __init__(self, embedding_cache=None):
+        """
+        Testing Process Class
 
-print("-------Loading Model-------")
+        Parameters
+        ----------
+        embedding_cache : EmbeddingCache object, optional
+            Store for the recipe embeddings (see utils.fetch_dish_test()). The default is None.
+        """
 
-# Loading Model definition
-    
-if embedding_name == 'bert' :
+        self.embedding_cache = embedding_cache
 
-    tokenizer = BertTokenizer.from_pretrained(
-        "bert-base-uncased"
-    )  # Bert Tokenizer
-    
-    emb_model = BertModel.from_pretrained("bert-base-uncased", output_hidden_states=True).to(
-        device
-    )  # Bert Model for Embeddings
-        
-    embedding_dim = emb_model.config.to_dict()[
-        "hidden_size"
-    ]  # BERT embedding dimension
-    
-    # print(bert)
-    
-elif embedding_name == 'elmo' :
-        
-    tokenizer = Sentence #Flair sentence for ELMo embeddings
-       
-    emb_model = ELMoEmbeddings('small')
-        
-    embedding_dim = emb_model.embedding_length
-
-# -----------------------------------------------------------------------
+        self.dish_dicts = dict()
+        self.gold_alignments = dict()
 
+    #####################################
 
-# Testing Process Class
-class Folds_Test:
     def run_model_test(
         self,
         dish_dict,
-        dish_group_alignments,
+        alignment_labels,
         emb_model,
         tokenizer,
         model,
@@ -125,8 +108,8 @@ class Folds_Test:
         ----------
         dish_dict : dict
             Contains all information for one dish. Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List" and values according to fetch_recipe().
-        dish_group_alignments : pd.DataFrame
-            All alignments (token ID's) for one dish, grouped by pairs of recipe names.
+        alignment_labels : AlignmentLabels object
+            Label index of all alignments (token ID's) for one dish, see alignment_labels.py.
         emb_model : Embedding Model object
             Model.
         tokenizer : Tokenizer object
@@ -157,31 +140,35 @@ class Folds_Test:
         
         mode = "Testing"
 
-        results_df = pd.DataFrame(
-                columns=["Recipe1","Action1_id", "Recipe2", "Predicted_Label"]
+        results = ResultsCollector(
+                ["Recipe1","Action1_id", "Recipe2", "Predicted_Label"]
             )
 
         #results_df = pd.DataFrame(columns=["Action1_id", "Predicted_Label"])
         # this was the original: (columns=["Action1_id", "True_Label", "Predicted_Label"])
                    
-        for key in dish_group_alignments.groups.keys():
+        for pair_id, key in enumerate(alignment_labels.pairs):
             
             recipe1 = dish_dict[key[0]] 
             recipe2 = dish_dict[key[1]] 
 
-            recipe_pair_alignment = dish_group_alignments.get_group(key)
-            #print(recipe_pair_alignment)
+            aligned, _, _ = alignment_labels.pair(pair_id)
+
+            if model_name == "Alignment Model":
+                # Predictions for all actions of Recipe1 at once (every action is encoded only once)
+                prediction_matrix = model.score_pair(
+                    recipe1["Action_Dicts_List"][1:],
+                    recipe1["Embedding_Vectors"],
+                    recipe1["Vector_Lookup_Lists"],
+                    recipe2["Action_Dicts_List"],
+                    recipe2["Embedding_Vectors"],
+                    recipe2["Vector_Lookup_Lists"],
+                )
 
             #for node in action_dicts_list1[1:]:
-            for node in recipe1["Action_Dicts_List"][1:]:
-                #print(node)
-
-                # True Action Id
-                action_line = recipe_pair_alignment.loc[
-                    recipe_pair_alignment["token1"] == node["Action_id"]
-                ]
-                #print(action_line)
-                if not action_line.empty:
+            for i, node in enumerate(recipe1["Action_Dicts_List"][1:]):
+                # Action in the alignment table
+                if aligned[i]:
                  
                     # excluding part related to true label --> we evaluate later
                     #true_label = action_line["token2"].item()
@@ -201,16 +188,7 @@ class Folds_Test:
                     # Generate predictions using our Alignment Model
 
                     if model_name == "Alignment Model":
-                        prediction = model(
-                            action1.to(device),
-                            parent_list1,
-                            child_list1,
-                            recipe1["Embedding_Vectors"],
-                            recipe1["Vector_Lookup_Lists"],
-                            recipe2["Action_Dicts_List"],
-                            recipe2["Embedding_Vectors"],
-                            recipe2["Vector_Lookup_Lists"],
-                        )
+                        prediction = prediction_matrix[i : i + 1]  # 1 X length of recipe2_actions
 
                     elif model_name == "Simple Model":
                         prediction = model(
@@ -244,11 +222,11 @@ class Folds_Test:
                             }
 
                     # Store the prediction
-                    results_df = results_df.append(results_dict, ignore_index=True)
+                    results.add(results_dict)
         print("num actions: ", num_actions)
 
 
-        return correct_predictions, num_actions, results_df
+        return correct_predictions, num_actions, results.to_frame()
 
         return None
 
@@ -383,6 +361,8 @@ class Folds_Test:
 
         model, optimizer, _ = load_checkpoint(saved_file_path, model, optimizer, device)
 
+        model.eval()  # no dropout; recipe encodings are memoized in eval mode
+
         # train_loss_list, valid_loss_list, epoch_list = load_metrics(saved_metric_path, device)
 
 
@@ -393,8 +373,6 @@ class Folds_Test:
         total_correct_predictions = 0
         total_actions = 0
 
-        model.eval()
-
         for i, accuracy_line in enumerate(accuracy_list):
             # accuracy line: dish, correct_predictions, num_actions, dish_accuracy, sk_accuracy, sk_prec, sk_recall, sk_f1
 
@@ -413,6 +391,42 @@ class Folds_Test:
         return accuracy_list, model_accuracy, total_correct_predictions, total_actions
     
     
+#####################################
+
+    def load_dishes(self, dish_list, embedding_name, emb_model, tokenizer, device):
+        """
+        Load the recipes and the alignments to predict of the dishes that have not been loaded yet
+
+        Parameters
+        ----------
+        dish_list : List
+            List of dish names.
+        embedding_name : String
+            Either 'elmo' or 'bert'.
+        emb_model : Embedding Model object
+            Model.
+        tokenizer : Tokenizer object
+            Tokenizer.
+        device : object
+            torch device where model tensors are saved.
+
+        """
+
+        for dish in dish_list:
+
+            if dish in self.dish_dicts:
+                continue
+        
+            dish_dict, dish_group_alignments = fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name, self.embedding_cache)
+            #dish_dict: Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List"
+            #dish_group_alignments: pd.DataFrame of alignment file
+        
+            self.dish_dicts[dish] = dish_dict
+        
+            self.gold_alignments[dish] = AlignmentLabels(dish_dict, dish_group_alignments)  # label index of the alignments
+
+        print("Data successfully loaded for test dishes ", dish_list)
+
 #####################################
 
     def run_folds_test(
@@ -426,6 +440,8 @@ class Folds_Test:
         num_epochs,
         device,
         with_feature=True,
+        fold=None,
+        save_results=True,
     ):
         """
         Running 10 fold cross validation for alignment models
@@ -447,10 +463,17 @@ class Folds_Test:
             torch device where model tensors are saved.
         with_feature : boolean; Optional
             Check whether to add features or not. Default value True.
+        fold : Int, optional
+            Fold number; determines the test dish. The default is None.
+        save_results : boolean, optional
+            Append the fold results to fold_results_test.tsv. The default is True.
 
-        """
+        Returns
+        -------
+        fold_result_df : pd.DataFrame
+            Results of the fold.
 
-        fold = args.fold
+        """
 
         print("-------Loading Data-------")
 
@@ -473,23 +496,10 @@ class Folds_Test:
         dish_list_test = [dish for dish in dish_list_test if not dish.startswith(".")]
         dish_list_test.sort() # TODO: why?
 
-        self.dish_dicts = dict()
-        self.gold_alignments = dict()
-
-        for dish in dish_list_test:
-        
-            dish_dict, dish_group_alignments = fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name)
-            #dish_dict: Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List"
-            #dish_group_alignments: pd.DataFrame of alignment file
-        
-            self.dish_dicts[dish] = dish_dict
-        
-            self.gold_alignments[dish] = dish_group_alignments
-
-        print("Data successfully loaded for test dishes ", dish_list_test)
+        self.load_dishes(dish_list_test, embedding_name, emb_model, tokenizer, device)
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Test_Dish",
                 "Accuracy1",
@@ -587,19 +597,22 @@ class Folds_Test:
                 "Recall": line[6],
                 "Correct_Predictions" : line[1],
                 "Num_Actions" : line[2]}
-            fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+            fold_results.add(fold_result)
+
+        fold_result_df = fold_results.to_frame()
 
         print("--------------")
 
-        save_result_path = os.path.join(destination_folder, "fold_results_test.tsv")
+        if save_results:
 
-        # Saving the results
-        if os.path.exists(save_result_path):
-            fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8", header=False, mode="a")
-        else: 
-            fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+            save_result_path = os.path.join(destination_folder, "fold_results_test.tsv")
 
-        print("Fold Results saved in ==>" + save_result_path)
+            # Saving the results
+            save_fold_results(fold_result_df, save_result_path)
+
+            print("Fold Results saved in ==>" + save_result_path)
+
+        return fold_result_df
 
 
 # FUNCTIONS FOR OTHER MODELS: SIMPLE, SIMILARITY, ETC.
@@ -630,7 +643,7 @@ class Folds_Test:
 
         dish_list = os.listdir(folder)
 
-        test_result_df = pd.DataFrame(columns=["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
 
         dish_list = [dish for dish in dish_list if not dish.startswith(".")]
         dish_list.sort()
@@ -664,7 +677,7 @@ class Folds_Test:
                 "Accuracy": accuracy,
             }
 
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
 
             total_correct_predictions += correct_predictions
             total_actions += num_actions
@@ -678,11 +691,11 @@ class Folds_Test:
             "Accuracy": model_accuracy,
         }
 
-        test_result_df = test_result_df.append(test_result, ignore_index=True)
+        test_results.add(test_result)
 
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        test_result_df.to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Results saved in ==>" + saved_file_path)
         
@@ -695,7 +708,7 @@ class Folds_Test:
                       dish_list,
                       saved_file_path,
                       destination_folder,
-                      test_result_df):
+                      test_results):
         
         total_correct_predictions = 0
         total_actions = 0
@@ -726,8 +739,8 @@ class Folds_Test:
             num_actions = 0
             correct_predictions = 0
             
-            results_df = pd.DataFrame(
-                columns=["Action", "Predicted_Label"]
+            results = ResultsCollector(
+                ["Action", "Predicted_Label"]
             )
             
             for key in dish_group_alignments.groups.keys():
@@ -739,17 +752,17 @@ class Folds_Test:
                
                _, parsed_recipe2, action_pairs = model.generate_action_pairs(recipe_pair_alignment, recipe1_filename, recipe2_filename)
                
-               correct_predictions, num_actions, results_df = model.fetch_aligned_actions(action_pairs, 
+               correct_predictions, num_actions, results = model.fetch_aligned_actions(action_pairs, 
                    vocab, 
                    parsed_recipe2,
                    correct_predictions,
                    num_actions,
-                   results_df)
+                   results)
                
             total_correct_predictions += correct_predictions
             total_actions += num_actions
                
-            save_predictions(destination_folder, results_df, dish)
+            save_predictions(destination_folder, results.to_frame(), dish)
 
             accuracy = correct_predictions * 100 / num_actions
             
@@ -762,13 +775,13 @@ class Folds_Test:
                 "Accuracy": accuracy,
                 }
             
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
             
         model_accuracy = total_correct_predictions * 100 / total_actions
         
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        return model_accuracy, total_correct_predictions, total_actions, test_result_df
+        return model_accuracy, total_correct_predictions, total_actions, test_results
         
 
 #####################################
@@ -792,8 +805,8 @@ class Folds_Test:
         dish_list_test = [dish for dish in dish_list_test if not dish.startswith(".")]
         dish_list_test.sort()
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Test_Accuracy",
                 "Correct_Predictions",
@@ -805,7 +818,7 @@ class Folds_Test:
         
         destination_folder = destination_folder4
         
-        test_result_df = pd.DataFrame(columns=["Dish","Correct_Predictions","Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish","Correct_Predictions","Num_Actions","Accuracy"])
         overall_predictions = 0
         overall_actions = 0 
 
@@ -836,13 +849,13 @@ class Folds_Test:
                 test_accuracy,
                 total_correct_predictions,
                 total_actions,
-                test_result_df
+                test_results
             ) = self.basic_testing(
                 model,
                 test_dish_list,
                 saved_file_path,
                 destination_folder,
-                test_result_df
+                test_results
             )
                 
             overall_predictions += total_correct_predictions
@@ -857,7 +870,7 @@ class Folds_Test:
             # "Test_Dish1_accuracy" : test_accuracy_list[0][2],
             # "Test_Dish2_accuracy" : test_accuracy_list[1][2]}
 
-            fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+            fold_results.add(fold_result)
 
             end = datetime.now()
 
@@ -883,7 +896,7 @@ class Folds_Test:
                 "Num_Actions": overall_actions,
             }
         
-        fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+        fold_results.add(fold_result)
 
         save_result_path = os.path.join(destination_folder, "fold_results.tsv")
         
@@ -892,99 +905,149 @@ class Folds_Test:
         )  # Model saved path
 
         # Saving the results
-        fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+        fold_results.to_frame().to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
         
-        test_result_df.to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Fold Results saved in ==>" + save_result_path)
  
 # -------------------------------------------------------------------------------
 
-       
+
 # final part of main.py
 
-TT = Folds_Test()  # calling the Training class
+if __name__ == "__main__":
 
-if model_name == "Alignment-with-feature":
+    args = parser.parse_args()
 
-     model = AlignmentModel(embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device).to(
-         device
-     )  # Out Alignment Model with features
+    model_name = args.model_name
 
-     #print(model)
-     """for name, param in model.named_parameters():
-         if param.requires_grad:
-                 print(name)"""
+    embedding_name = args.embedding_name
 
-     optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
-     criterion = nn.CrossEntropyLoss()  # Loss function
+    if args.cuda_device:
+        device = torch.device("cuda:"+args.cuda_device if torch.cuda.is_available() else "cpu")
+        flair.device = device 
 
-     ################ Cross Validation Folds #################
+    fold = args.fold
 
-     TT.run_folds_test(
-         embedding_name, 
-         emb_model, tokenizer, model, optimizer, criterion, MAX_EPOCHS, device
-     )
+    print("-------Loading Model-------")
 
-elif model_name == "Alignment-no-feature":
+    # Loading Model definition
 
-     model = AlignmentModel(
-         embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device, False
-     ).to(
-         device
-     )  # Out Alignment Model w/o features
+    if embedding_name == 'bert' :
 
-     print(model)
+        tokenizer = BertTokenizerFast.from_pretrained(
+            "bert-base-uncased"
+        )  # Bert Tokenizer
 
-     optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
-     criterion = nn.CrossEntropyLoss()  # Loss function
+        emb_model = BertModel.from_pretrained("bert-base-uncased", output_hidden_states=True).to(
+            device
+        )  # Bert Model for Embeddings
 
-     TT.run_folds_test(
-         embedding_name,
-         emb_model, 
-         tokenizer,
-         model,
-         optimizer,
-         criterion,
-         MAX_EPOCHS,
-         device,
-         False,
-     )
+        embedding_dim = emb_model.config.to_dict()[
+            "hidden_size"
+        ]  # BERT embedding dimension
 
-elif model_name == "Cosine_similarity":
+        # print(bert)
 
-     cosine_similarity_model = SimpleModel(embedding_dim, device).to(device) # Simple Cosine Similarity Baseline
+    elif embedding_name == 'elmo' :
 
-     print(cosine_similarity_model)
+        tokenizer = Sentence #Flair sentence for ELMo embeddings
 
-     print("-------Testing (Simple Baseline) -------")
+        emb_model = ELMoEmbeddings('small')
 
-     TT.test_simple_model(embedding_name, emb_model, tokenizer, cosine_similarity_model, device)
-        
-        
-elif model_name == 'Naive':
-        
-     naive_model = NaiveModel(device) # Naive Common Action Pair Heuristics Baseline
-        
-     print('Common Action Pair Heuristics Model')
-        
-     ################ Cross Validation Folds #################
-        
-     TT.run_naive_folds(
-         naive_model
+        embedding_dim = emb_model.embedding_length
+
+    if embedding_cache_folder:
+        embedding_cache = EmbeddingCache(embedding_cache_folder, embedding_name, emb_model)  # On-disk store for the recipe embeddings
+    else:
+        embedding_cache = None
+
+    TT = Folds_Test(embedding_cache=embedding_cache)  # calling the Training class
+
+    if model_name == "Alignment-with-feature":
+
+         model = AlignmentModel(
+             embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device,
+             separate_neighbourhoods=SEPARATE_NEIGHBOURHOODS,
+         ).to(
+             device
+         )  # Out Alignment Model with features
+
+         #print(model)
+         """for name, param in model.named_parameters():
+             if param.requires_grad:
+                     print(name)"""
+
+         optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
+         criterion = nn.CrossEntropyLoss()  # Loss function
+
+         ################ Cross Validation Folds #################
+
+         TT.run_folds_test(
+             embedding_name, 
+             emb_model, tokenizer, model, optimizer, criterion, MAX_EPOCHS, device, fold=fold
          )
-        
-elif model_name == 'Sequence':
-        
-     sequence_model = SequenceModel()
-        
-     print('Sequential Alignments')
-        
-     sequence_model.test_sequence_model()
 
-else:
+    elif model_name == "Alignment-no-feature":
+
+         model = AlignmentModel(
+             embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device, False
+         ).to(
+             device
+         )  # Out Alignment Model w/o features
+
+         print(model)
+
+         optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
+         criterion = nn.CrossEntropyLoss()  # Loss function
+
+         TT.run_folds_test(
+             embedding_name,
+             emb_model, 
+             tokenizer,
+             model,
+             optimizer,
+             criterion,
+             MAX_EPOCHS,
+             device,
+             False,
+             fold=fold,
+         )
+
+    elif model_name == "Cosine_similarity":
+
+         cosine_similarity_model = SimpleModel(embedding_dim, device).to(device) # Simple Cosine Similarity Baseline
 
-     print(
-         "Incorrect Argument: Model_name should be ['Cosine_similarity', 'Naive', 'Alignment-no-feature', 'Alignment-with-feature']"
-     )
+         print(cosine_similarity_model)
 
+         print("-------Testing (Simple Baseline) -------")
+
+         TT.test_simple_model(embedding_name, emb_model, tokenizer, cosine_similarity_model, device)
+
+
+    elif model_name == 'Naive':
+
+         naive_model = NaiveModel(device) # Naive Common Action Pair Heuristics Baseline
+
+         print('Common Action Pair Heuristics Model')
+
+         ################ Cross Validation Folds #################
+
+         TT.run_naive_folds(
+             naive_model
+             )
+
+    elif model_name == 'Sequence':
+
+         sequence_model = SequenceModel()
+
+         print('Sequential Alignments')
+
+         sequence_model.test_sequence_model()
+
+    else:
+
+         print(
+             "Incorrect Argument: Model_name should be ['Cosine_similarity', 'Naive', 'Alignment-no-feature', 'Alignment-with-feature']"
+         )
@@ -15,13 +15,18 @@ import torch.optim as optim
 import pandas as pd
 
 from model import AlignmentModel
+from embedding_cache import EmbeddingCache
+from alignment_labels import AlignmentLabels
+from results_collector import ResultsCollector
+from prediction_writer import PredictionWriter
+from score_matrices import ScoreMatrixWriter
 from cosine_similarity_model import SimpleModel
 from sequence_model import SequenceModel
 from naive_model import NaiveModel
-from transformers import BertTokenizer, BertModel
+from transformers import BertTokenizerFast, BertModel
 from flair.data import Sentence
 from flair.embeddings import ELMoEmbeddings
-from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE
+from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE, SEPARATE_NEIGHBOURHOODS
 
 from datetime import datetime
 from constants import (
@@ -29,6 +34,7 @@ from constants import (
     test_folder,
     alignment_file,
     recipe_folder_name,
+    embedding_cache_folder,
     destination_folder1,
     destination_folder2,
     destination_folder3,
@@ -41,6 +47,7 @@ from utils import (
     save_checkpoint,
     load_checkpoint,
     save_predictions,
+    prediction_path,
     create_acc_loss_graph,
     save_vocabulary,
     load_vocabulary
@@ -57,8 +64,13 @@ parser.add_argument('model_name', type=str, help="""Model Name; one of {'Simple'
 parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
 parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
 parser.add_argument('--fold', type=int, help="""Fold Number; number in range 1 to 10""")
+parser.add_argument('--resume', action='store_true', help="""Continue the prediction files of an interrupted run instead of overwriting them""")
+parser.add_argument('--output_format', type=str, default='tsv', choices=['tsv', 'npz'], help="""Prediction file format: ranked labels and scores per action (tsv) or one score matrix per recipe pair (npz, see score_matrices.py; export to tsv with python score_matrices.py). Default: tsv""")
 args = parser.parse_args()
 
+if args.resume and args.output_format != 'tsv':
+    parser.error("--resume is only available for the tsv output format")
+
 model_name = args.model_name
     
 embedding_name = args.embedding_name
@@ -75,7 +87,7 @@ print("-------Loading Model-------")
     
 if embedding_name == 'bert' :
 
-    tokenizer = BertTokenizer.from_pretrained(
+    tokenizer = BertTokenizerFast.from_pretrained(
         "bert-base-uncased"
     )  # Bert Tokenizer
     
@@ -97,15 +109,36 @@ elif embedding_name == 'elmo' :
         
     embedding_dim = emb_model.embedding_length
 
+if embedding_cache_folder:
+    embedding_cache = EmbeddingCache(embedding_cache_folder, embedding_name, emb_model)  # On-disk store for the recipe embeddings
+else:
+    embedding_cache = None
+
 # -----------------------------------------------------------------------
 
 
 # Testing Process Class
 class Folds_Test:
+    def __init__(self, resume=False, output_format="tsv"):
+        """
+        Testing process
+
+        Parameters
+        ----------
+        resume : boolean, optional
+            Continue the prediction files of an interrupted run: actions with a prediction in the file are not scored again. The default is False.
+        output_format : String, optional
+            Format of the prediction files: "tsv" (ranked labels and scores per action) or "npz" (score matrix per recipe pair). The default is "tsv".
+        """
+
+        self.resume = resume
+        self.output_format = output_format
+        self.prediction_columns = ["Recipe1", "Action1_id", "Recipe2", "Predicted_Label", "Probabilities"]
+
     def run_model_test(
         self,
         dish_dict,
-        dish_group_alignments,
+        alignment_labels,
         emb_model,
         tokenizer,
         model,
@@ -119,6 +152,8 @@ class Folds_Test:
         num_actions=0,
         mode="Training",
         model_name="Alignment Model",
+        predictions=None,
+        score_matrices=None,
     ):
         """
         Function to run the Model
@@ -127,8 +162,8 @@ class Folds_Test:
         ----------
         dish_dict : dict
             Contains all information for one dish. Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List" and values according to fetch_recipe().
-        dish_group_alignments : pd.DataFrame
-            All alignments (token ID's) for one dish, grouped by pairs of recipe names.
+        alignment_labels : AlignmentLabels object
+            Label index of all alignments (token ID's) for one dish, see alignment_labels.py.
         emb_model : Embedding Model object
             Model.
         tokenizer : Tokenizer object
@@ -153,6 +188,11 @@ class Folds_Test:
             Mode of Process - ("Training", "Validation", "Testing"). The default is "Training".
         model_name : String, optional
             Model name - ("Alignment Model", "Simple Model"). Default is "Alignment Model".
+        predictions : PredictionWriter object, optional
+            Prediction file the rows are written to as they are scored; actions with a row in the file are not scored again.
+            The default is None (the predictions are returned as a DataFrame).
+        score_matrices : ScoreMatrixWriter object, optional
+            Archive the scores of every recipe pair are written to as one matrix instead of ranked rows. The default is None.
 
 
         """
@@ -160,30 +200,51 @@ class Folds_Test:
         #if mode == "Testing":
         mode = "Testing"
 
-        results_df = pd.DataFrame(
-                columns=["Recipe1","Action1_id", "Recipe2", "Predicted_Label"]
-            )
+        if predictions is not None:
+            results = predictions  # rows are written to the prediction file as they are scored
+        else:
+            results = ResultsCollector(self.prediction_columns)
 
         #results_df = pd.DataFrame(columns=["Action1_id", "Predicted_Label"])
         # this was the original: (columns=["Action1_id", "True_Label", "Predicted_Label"])
                    
-        for key in dish_group_alignments.groups.keys():
+        for pair_id, key in enumerate(alignment_labels.pairs):
             
             recipe1 = dish_dict[key[0]] 
             recipe2 = dish_dict[key[1]] 
 
-            recipe_pair_alignment = dish_group_alignments.get_group(key)
-            #print(recipe_pair_alignment)
+            aligned, _, _ = alignment_labels.pair(pair_id)
 
-            #for node in action_dicts_list1[1:]:
-            for node in recipe1["Action_Dicts_List"][1:]:
-
-                # True Action Id
-                action_line = recipe_pair_alignment.loc[
-                    recipe_pair_alignment["token1"] == node["Action_id"]
+            if predictions is not None:
+                # actions with a prediction in the resumed file are counted but not scored again
+                written = [
+                    (key[0], node["Action_id"], key[1]) in predictions for node in recipe1["Action_Dicts_List"][1:]
                 ]
+                num_actions += sum(is_aligned and is_written for is_aligned, is_written in zip(aligned, written))
+                aligned = [is_aligned and not is_written for is_aligned, is_written in zip(aligned, written)]
+
+                if not any(aligned):
+                    continue
+
+            if score_matrices is not None:
+                source_ids, source_scores = [], []
+
+            if model_name == "Alignment Model":
+                # Predictions for all actions of Recipe1 at once (every action is encoded only once)
+                prediction_matrix = model.score_pair(
+                    recipe1["Action_Dicts_List"][1:],
+                    recipe1["Embedding_Vectors"],
+                    recipe1["Vector_Lookup_Lists"],
+                    recipe2["Action_Dicts_List"],
+                    recipe2["Embedding_Vectors"],
+                    recipe2["Vector_Lookup_Lists"],
+                )
 
-                if not action_line.empty:
+            #for node in action_dicts_list1[1:]:
+            for i, node in enumerate(recipe1["Action_Dicts_List"][1:]):
+
+                # Action in the alignment table
+                if aligned[i]:
                  
                     # excluding part related to true label --> we evaluate later
                     #true_label = action_line["token2"].item()
@@ -203,16 +264,7 @@ class Folds_Test:
                     # Generate predictions using our Alignment Model
 
                     if model_name == "Alignment Model":
-                        prediction = model(
-                            action1.to(device),
-                            parent_list1,
-                            child_list1,
-                            recipe1["Embedding_Vectors"],
-                            recipe1["Vector_Lookup_Lists"],
-                            recipe2["Action_Dicts_List"],
-                            recipe2["Embedding_Vectors"],
-                            recipe2["Vector_Lookup_Lists"],
-                        )
+                        prediction = prediction_matrix[i : i + 1]  # 1 X length of recipe2_actions
 
                     elif model_name == "Simple Model":
                         prediction = model(
@@ -228,6 +280,11 @@ class Folds_Test:
 
                     num_actions += 1
 
+                    if score_matrices is not None:
+                        source_ids.append(node["Action_id"])
+                        source_scores.append(prediction[0])
+                        continue
+
                     # Predicted Action Id --> here it is different between test-versions! (GED, topk, normal, etc.)
                     pred_label = recipe2["Action_Dicts_List"][torch.argmax(prediction).item()][
                         "Action_id"
@@ -265,10 +322,26 @@ class Folds_Test:
 
 
                     # Store the prediction
-                    results_df = results_df.append(results_dict, ignore_index=True)
+                    results.add(results_dict)
+
+            if score_matrices is not None:
+                # one row per scored action of Recipe1, one column per action of Recipe2
+                score_matrices.add_pair(
+                    key[0],
+                    key[1],
+                    source_ids,
+                    [node["Action_id"] for node in recipe2["Action_Dicts_List"]],
+                    torch.stack(source_scores).cpu().numpy() if source_scores else [],
+                )
+
 
+        if score_matrices is not None:
+            return correct_predictions, num_actions, score_matrices
 
-        return correct_predictions, num_actions, results_df
+        if predictions is not None:
+            return correct_predictions, num_actions, predictions
+
+        return correct_predictions, num_actions, results.to_frame()
 
         return None
 
@@ -307,9 +380,18 @@ class Folds_Test:
 
         for dish in dish_list:
 
-            with torch.no_grad():
+            save_prediction_path = prediction_path(destination_folder, dish)
+
+            # predictions are written as they are scored
+            if self.output_format == "npz":
+                save_prediction_path = os.path.splitext(save_prediction_path)[0] + ".npz"
+                output = ScoreMatrixWriter(save_prediction_path)
+            else:
+                output = PredictionWriter(save_prediction_path, self.prediction_columns, resume=self.resume)
+
+            with torch.no_grad(), output:
 
-                correct_predictions, num_actions, results_df = self.run_model_test(
+                correct_predictions, num_actions, _ = self.run_model_test(
                     self.dish_dicts[dish], 
                     self.gold_alignments[dish], 
                     embedding_name = embedding_name,
@@ -318,14 +400,16 @@ class Folds_Test:
                     model=model,
                     device=device,
                     mode=mode,
+                    predictions=output if self.output_format == "tsv" else None,
+                    score_matrices=output if self.output_format == "npz" else None,
                 )
 
+            print("Predictions for Dish {} saved to ==> {}".format(dish, save_prediction_path))
+
             #print(correct_predictions)
 
             dish_accuracy = correct_predictions * 100 / num_actions
 
-            save_predictions(destination_folder, results_df, dish)
-
             accuracy_list.append([correct_predictions, num_actions, dish_accuracy])# accuracy_list is actually 0
 
         return accuracy_list
@@ -374,6 +458,8 @@ class Folds_Test:
 
         model, optimizer, _ = load_checkpoint(saved_file_path, model, optimizer, device)
 
+        model.eval()  # no dropout; recipe encodings are memoized in eval mode
+
         # train_loss_list, valid_loss_list, epoch_list = load_metrics(saved_metric_path, device)
 
         accuracy_list = self.test(
@@ -383,8 +469,6 @@ class Folds_Test:
         total_correct_predictions = 0
         total_actions = 0
 
-        model.eval()
-
         for i, accuracy_line in enumerate(accuracy_list):
 
             dish_accuracy = accuracy_line[2]
@@ -467,10 +551,10 @@ class Folds_Test:
 
         for dish in dish_list_test:
             dish_dict, dish_group_alignments = fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer,
-                                                               device, embedding_name)
+                                                               device, embedding_name, embedding_cache)
             self.dish_dicts[dish] = dish_dict
 
-            self.gold_alignments[dish] = dish_group_alignments
+            self.gold_alignments[dish] = AlignmentLabels(dish_dict, dish_group_alignments)  # label index of the alignments
 
         print("Data successfully loaded for test dishes ", dish_list_test)
 
@@ -625,7 +709,7 @@ class Folds_Test:
 
         dish_list = os.listdir(folder)
 
-        test_result_df = pd.DataFrame(columns=["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
 
         dish_list = [dish for dish in dish_list if not dish.startswith(".")]
         dish_list.sort()
@@ -659,7 +743,7 @@ class Folds_Test:
                 "Accuracy": accuracy,
             }
 
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
 
             total_correct_predictions += correct_predictions
             total_actions += num_actions
@@ -673,11 +757,11 @@ class Folds_Test:
             "Accuracy": model_accuracy,
         }
 
-        test_result_df = test_result_df.append(test_result, ignore_index=True)
+        test_results.add(test_result)
 
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        test_result_df.to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Results saved in ==>" + saved_file_path)
         
@@ -690,7 +774,7 @@ class Folds_Test:
                       dish_list,
                       saved_file_path,
                       destination_folder,
-                      test_result_df):
+                      test_results):
         
         total_correct_predictions = 0
         total_actions = 0
@@ -721,8 +805,8 @@ class Folds_Test:
             num_actions = 0
             correct_predictions = 0
             
-            results_df = pd.DataFrame(
-                columns=["Action", "Predicted_Label"]
+            results = ResultsCollector(
+                ["Action", "Predicted_Label"]
             )
             
             for key in dish_group_alignments.groups.keys():
@@ -734,17 +818,17 @@ class Folds_Test:
                
                _, parsed_recipe2, action_pairs = model.generate_action_pairs(recipe_pair_alignment, recipe1_filename, recipe2_filename)
                
-               correct_predictions, num_actions, results_df = model.fetch_aligned_actions(action_pairs, 
+               correct_predictions, num_actions, results = model.fetch_aligned_actions(action_pairs, 
                                                                                           vocab, 
                                                                                           parsed_recipe2,
                                                                                           correct_predictions,
                                                                                           num_actions,
-                                                                                          results_df)
+                                                                                          results)
                
             total_correct_predictions += correct_predictions
             total_actions += num_actions
                
-            save_predictions(destination_folder, results_df, dish)
+            save_predictions(destination_folder, results.to_frame(), dish)
 
             accuracy = correct_predictions * 100 / num_actions
             
@@ -757,13 +841,13 @@ class Folds_Test:
                 "Accuracy": accuracy,
                 }
             
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
             
         model_accuracy = total_correct_predictions * 100 / total_actions
         
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        return model_accuracy, total_correct_predictions, total_actions, test_result_df
+        return model_accuracy, total_correct_predictions, total_actions, test_results
         
 
 #####################################
@@ -787,8 +871,8 @@ class Folds_Test:
         dish_list_test = [dish for dish in dish_list_test if not dish.startswith(".")]
         dish_list_test.sort()
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Test_Accuracy",
                 "Correct_Predictions",
@@ -800,7 +884,7 @@ class Folds_Test:
         
         destination_folder = destination_folder4
         
-        test_result_df = pd.DataFrame(columns=["Dish","Correct_Predictions","Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish","Correct_Predictions","Num_Actions","Accuracy"])
         overall_predictions = 0
         overall_actions = 0 
 
@@ -831,13 +915,13 @@ class Folds_Test:
                 test_accuracy,
                 total_correct_predictions,
                 total_actions,
-                test_result_df
+                test_results
             ) = self.basic_testing(
                 model,
                 test_dish_list,
                 saved_file_path,
                 destination_folder,
-                test_result_df
+                test_results
             )
                 
             overall_predictions += total_correct_predictions
@@ -852,7 +936,7 @@ class Folds_Test:
             # "Test_Dish1_accuracy" : test_accuracy_list[0][2],
             # "Test_Dish2_accuracy" : test_accuracy_list[1][2]}
 
-            fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+            fold_results.add(fold_result)
 
             end = datetime.now()
 
@@ -878,7 +962,7 @@ class Folds_Test:
                 "Num_Actions": overall_actions,
             }
         
-        fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+        fold_results.add(fold_result)
 
         save_result_path = os.path.join(destination_folder, "fold_results.tsv")
         
@@ -887,9 +971,9 @@ class Folds_Test:
         )  # Model saved path
 
         # Saving the results
-        fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+        fold_results.to_frame().to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
         
-        test_result_df.to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Fold Results saved in ==>" + save_result_path)
  
@@ -898,11 +982,14 @@ class Folds_Test:
        
 # final part of main.py
 
-TT = Folds_Test()  # calling the Training class
+TT = Folds_Test(resume=args.resume, output_format=args.output_format)  # calling the Training class
 
 if model_name == "Alignment-with-feature":
 
-     model = AlignmentModel(embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device).to(
+     model = AlignmentModel(
+         embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device,
+         separate_neighbourhoods=SEPARATE_NEIGHBOURHOODS,
+     ).to(
          device
      )  # Out Alignment Model with features
 
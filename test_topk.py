@@ -15,13 +15,17 @@ import torch.optim as optim
 import pandas as pd
 
 from model import AlignmentModel
+from embedding_cache import EmbeddingCache
+from alignment_labels import AlignmentLabels
+from results_collector import ResultsCollector
+from prediction_writer import PredictionWriter
 from cosine_similarity_model import SimpleModel
 from sequence_model import SequenceModel
 from naive_model import NaiveModel
-from transformers import BertTokenizer, BertModel
+from transformers import BertTokenizerFast, BertModel
 from flair.data import Sentence
 from flair.embeddings import ELMoEmbeddings
-from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE
+from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE, SEPARATE_NEIGHBOURHOODS
 
 from datetime import datetime
 from constants import (
@@ -29,6 +33,7 @@ from constants import (
     test_folder,
     alignment_file,
     recipe_folder_name,
+    embedding_cache_folder,
     destination_folder1,
     destination_folder2,
     destination_folder3,
@@ -41,6 +46,7 @@ from utils import (
     save_checkpoint,
     load_checkpoint,
     save_predictions,
+    prediction_path,
     create_acc_loss_graph,
     save_vocabulary,
     load_vocabulary
@@ -57,6 +63,7 @@ parser.add_argument('model_name', type=str, help="""Model Name; one of {'Simple'
 parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
 parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
 parser.add_argument('--fold', type=int, help="""Fold Number; number in range 1 to 10""")
+parser.add_argument('--resume', action='store_true', help="""Continue the prediction files of an interrupted run instead of overwriting them""")
 args = parser.parse_args()
 
 model_name = args.model_name
@@ -75,7 +82,7 @@ print("-------Loading Model-------")
     
 if embedding_name == 'bert' :
 
-    tokenizer = BertTokenizer.from_pretrained(
+    tokenizer = BertTokenizerFast.from_pretrained(
         "bert-base-uncased"
     )  # Bert Tokenizer
     
@@ -97,15 +104,33 @@ elif embedding_name == 'elmo' :
         
     embedding_dim = emb_model.embedding_length
 
+if embedding_cache_folder:
+    embedding_cache = EmbeddingCache(embedding_cache_folder, embedding_name, emb_model)  # On-disk store for the recipe embeddings
+else:
+    embedding_cache = None
+
 # -----------------------------------------------------------------------
 
 
 # Testing Process Class
 class Folds_Test:
+    def __init__(self, resume=False):
+        """
+        Testing process
+
+        Parameters
+        ----------
+        resume : boolean, optional
+            Continue the prediction files of an interrupted run: actions with a prediction in the file are not scored again. The default is False.
+        """
+
+        self.resume = resume
+        self.prediction_columns = ["Recipe1", "Action1_id", "Recipe2", "Predicted_Label"]
+
     def run_model_test(
         self,
         dish_dict,
-        dish_group_alignments,
+        alignment_labels,
         emb_model,
         tokenizer,
         model,
@@ -119,6 +144,7 @@ class Folds_Test:
         num_actions=0,
         mode="Training",
         model_name="Alignment Model",
+        predictions=None,
     ):
         """
         Function to run the Model
@@ -127,8 +153,8 @@ class Folds_Test:
         ----------
         dish_dict : dict
             Contains all information for one dish. Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List" and values according to fetch_recipe().
-        dish_group_alignments : pd.DataFrame
-            All alignments (token ID's) for one dish, grouped by pairs of recipe names.
+        alignment_labels : AlignmentLabels object
+            Label index of all alignments (token ID's) for one dish, see alignment_labels.py.
         emb_model : Embedding Model object
             Model.
         tokenizer : Tokenizer object
@@ -153,6 +179,9 @@ class Folds_Test:
             Mode of Process - ("Training", "Validation", "Testing"). The default is "Training".
         model_name : String, optional
             Model name - ("Alignment Model", "Simple Model"). Default is "Alignment Model".
+        predictions : PredictionWriter object, optional
+            Prediction file the rows are written to as they are scored; actions with a row in the file are not scored again.
+            The default is None (the predictions are returned as a DataFrame).
 
 
         """
@@ -160,30 +189,48 @@ class Folds_Test:
         #if mode == "Testing":
         mode = "Testing"
 
-        results_df = pd.DataFrame(
-                columns=["Recipe1","Action1_id", "Recipe2", "Predicted_Label"]
-            )
+        if predictions is not None:
+            results = predictions  # rows are written to the prediction file as they are scored
+        else:
+            results = ResultsCollector(self.prediction_columns)
 
         #results_df = pd.DataFrame(columns=["Action1_id", "Predicted_Label"])
         # this was the original: (columns=["Action1_id", "True_Label", "Predicted_Label"])
                    
-        for key in dish_group_alignments.groups.keys():
+        for pair_id, key in enumerate(alignment_labels.pairs):
             
             recipe1 = dish_dict[key[0]] 
             recipe2 = dish_dict[key[1]] 
 
-            recipe_pair_alignment = dish_group_alignments.get_group(key)
-            #print(recipe_pair_alignment)
-
-            #for node in action_dicts_list1[1:]:
-            for node in recipe1["Action_Dicts_List"][1:]:
+            aligned, _, _ = alignment_labels.pair(pair_id)
 
-                # True Action Id
-                action_line = recipe_pair_alignment.loc[
-                    recipe_pair_alignment["token1"] == node["Action_id"]
+            if predictions is not None:
+                # actions with a prediction in the resumed file are counted but not scored again
+                written = [
+                    (key[0], node["Action_id"], key[1]) in predictions for node in recipe1["Action_Dicts_List"][1:]
                 ]
+                num_actions += sum(is_aligned and is_written for is_aligned, is_written in zip(aligned, written))
+                aligned = [is_aligned and not is_written for is_aligned, is_written in zip(aligned, written)]
+
+                if not any(aligned):
+                    continue
+
+            if model_name == "Alignment Model":
+                # Predictions for all actions of Recipe1 at once (every action is encoded only once)
+                prediction_matrix = model.score_pair(
+                    recipe1["Action_Dicts_List"][1:],
+                    recipe1["Embedding_Vectors"],
+                    recipe1["Vector_Lookup_Lists"],
+                    recipe2["Action_Dicts_List"],
+                    recipe2["Embedding_Vectors"],
+                    recipe2["Vector_Lookup_Lists"],
+                )
+
+            #for node in action_dicts_list1[1:]:
+            for i, node in enumerate(recipe1["Action_Dicts_List"][1:]):
 
-                if not action_line.empty:
+                # Action in the alignment table
+                if aligned[i]:
                  
                     # excluding part related to true label --> we evaluate later
                     #true_label = action_line["token2"].item()
@@ -203,16 +250,7 @@ class Folds_Test:
                     # Generate predictions using our Alignment Model
 
                     if model_name == "Alignment Model":
-                        prediction = model(
-                            action1.to(device),
-                            parent_list1,
-                            child_list1,
-                            recipe1["Embedding_Vectors"],
-                            recipe1["Vector_Lookup_Lists"],
-                            recipe2["Action_Dicts_List"],
-                            recipe2["Embedding_Vectors"],
-                            recipe2["Vector_Lookup_Lists"],
-                        )
+                        prediction = prediction_matrix[i : i + 1]  # 1 X length of recipe2_actions
 
                     elif model_name == "Simple Model":
                         prediction = model(
@@ -258,10 +296,13 @@ class Folds_Test:
 
 
                     # Store the prediction
-                    results_df = results_df.append(results_dict, ignore_index=True)
+                    results.add(results_dict)
 
 
-        return correct_predictions, num_actions, results_df
+        if predictions is not None:
+            return correct_predictions, num_actions, predictions
+
+        return correct_predictions, num_actions, results.to_frame()
 
         return None
 
@@ -300,9 +341,14 @@ class Folds_Test:
 
         for dish in dish_list:
 
-            with torch.no_grad():
+            save_prediction_path = prediction_path(destination_folder, dish)
+
+            # predictions are written as they are scored
+            with torch.no_grad(), PredictionWriter(
+                save_prediction_path, self.prediction_columns, resume=self.resume
+            ) as predictions:
 
-                correct_predictions, num_actions, results_df = self.run_model_test(
+                correct_predictions, num_actions, _ = self.run_model_test(
                     self.dish_dicts[dish], 
                     self.gold_alignments[dish], 
                     embedding_name = embedding_name,
@@ -311,14 +357,15 @@ class Folds_Test:
                     model=model,
                     device=device,
                     mode=mode,
+                    predictions=predictions,
                 )
 
+            print("Predictions for Dish {} saved to ==> {}".format(dish, save_prediction_path))
+
             #print(correct_predictions)
 
             dish_accuracy = correct_predictions * 100 / num_actions
 
-            save_predictions(destination_folder, results_df, dish)
-
             accuracy_list.append([correct_predictions, num_actions, dish_accuracy])# accuracy_list is actually 0
 
         return accuracy_list
@@ -367,6 +414,8 @@ class Folds_Test:
 
         model, optimizer, _ = load_checkpoint(saved_file_path, model, optimizer, device)
 
+        model.eval()  # no dropout; recipe encodings are memoized in eval mode
+
         # train_loss_list, valid_loss_list, epoch_list = load_metrics(saved_metric_path, device)
 
         accuracy_list = self.test(
@@ -376,8 +425,6 @@ class Folds_Test:
         total_correct_predictions = 0
         total_actions = 0
 
-        model.eval()
-
         for i, accuracy_line in enumerate(accuracy_list):
 
             dish_accuracy = accuracy_line[2]
@@ -459,10 +506,10 @@ class Folds_Test:
 
         for dish in dish_list_test:
             dish_dict, dish_group_alignments = fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer,
-                                                               device, embedding_name)
+                                                               device, embedding_name, embedding_cache)
             self.dish_dicts[dish] = dish_dict
 
-            self.gold_alignments[dish] = dish_group_alignments
+            self.gold_alignments[dish] = AlignmentLabels(dish_dict, dish_group_alignments)  # label index of the alignments
 
         print("Data successfully loaded for test dishes ", dish_list_test)
 
@@ -617,7 +664,7 @@ class Folds_Test:
 
         dish_list = os.listdir(folder)
 
-        test_result_df = pd.DataFrame(columns=["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish", "Correct_Predictions", "Num_Actions","Accuracy"])
 
         dish_list = [dish for dish in dish_list if not dish.startswith(".")]
         dish_list.sort()
@@ -651,7 +698,7 @@ class Folds_Test:
                 "Accuracy": accuracy,
             }
 
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
 
             total_correct_predictions += correct_predictions
             total_actions += num_actions
@@ -665,11 +712,11 @@ class Folds_Test:
             "Accuracy": model_accuracy,
         }
 
-        test_result_df = test_result_df.append(test_result, ignore_index=True)
+        test_results.add(test_result)
 
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        test_result_df.to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(saved_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Results saved in ==>" + saved_file_path)
         
@@ -682,7 +729,7 @@ class Folds_Test:
                       dish_list,
                       saved_file_path,
                       destination_folder,
-                      test_result_df):
+                      test_results):
         
         total_correct_predictions = 0
         total_actions = 0
@@ -713,8 +760,8 @@ class Folds_Test:
             num_actions = 0
             correct_predictions = 0
             
-            results_df = pd.DataFrame(
-                columns=["Action", "Predicted_Label"]
+            results = ResultsCollector(
+                ["Action", "Predicted_Label"]
             )
             
             for key in dish_group_alignments.groups.keys():
@@ -726,17 +773,17 @@ class Folds_Test:
                
                _, parsed_recipe2, action_pairs = model.generate_action_pairs(recipe_pair_alignment, recipe1_filename, recipe2_filename)
                
-               correct_predictions, num_actions, results_df = model.fetch_aligned_actions(action_pairs, 
+               correct_predictions, num_actions, results = model.fetch_aligned_actions(action_pairs, 
                                                                                           vocab, 
                                                                                           parsed_recipe2,
                                                                                           correct_predictions,
                                                                                           num_actions,
-                                                                                          results_df)
+                                                                                          results)
                
             total_correct_predictions += correct_predictions
             total_actions += num_actions
                
-            save_predictions(destination_folder, results_df, dish)
+            save_predictions(destination_folder, results.to_frame(), dish)
 
             accuracy = correct_predictions * 100 / num_actions
             
@@ -749,13 +796,13 @@ class Folds_Test:
                 "Accuracy": accuracy,
                 }
             
-            test_result_df = test_result_df.append(test_result, ignore_index=True)
+            test_results.add(test_result)
             
         model_accuracy = total_correct_predictions * 100 / total_actions
         
         print("Model Accuracy: {:.2f}".format(model_accuracy))
 
-        return model_accuracy, total_correct_predictions, total_actions, test_result_df
+        return model_accuracy, total_correct_predictions, total_actions, test_results
         
 
 #####################################
@@ -779,8 +826,8 @@ class Folds_Test:
         dish_list_test = [dish for dish in dish_list_test if not dish.startswith(".")]
         dish_list_test.sort()
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Test_Accuracy",
                 "Correct_Predictions",
@@ -792,7 +839,7 @@ class Folds_Test:
         
         destination_folder = destination_folder4
         
-        test_result_df = pd.DataFrame(columns=["Dish","Correct_Predictions","Num_Actions","Accuracy"])
+        test_results = ResultsCollector(["Dish","Correct_Predictions","Num_Actions","Accuracy"])
         overall_predictions = 0
         overall_actions = 0 
 
@@ -823,13 +870,13 @@ class Folds_Test:
                 test_accuracy,
                 total_correct_predictions,
                 total_actions,
-                test_result_df
+                test_results
             ) = self.basic_testing(
                 model,
                 test_dish_list,
                 saved_file_path,
                 destination_folder,
-                test_result_df
+                test_results
             )
                 
             overall_predictions += total_correct_predictions
@@ -844,7 +891,7 @@ class Folds_Test:
             # "Test_Dish1_accuracy" : test_accuracy_list[0][2],
             # "Test_Dish2_accuracy" : test_accuracy_list[1][2]}
 
-            fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+            fold_results.add(fold_result)
 
             end = datetime.now()
 
@@ -870,7 +917,7 @@ class Folds_Test:
                 "Num_Actions": overall_actions,
             }
         
-        fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+        fold_results.add(fold_result)
 
         save_result_path = os.path.join(destination_folder, "fold_results.tsv")
         
@@ -879,9 +926,9 @@ class Folds_Test:
         )  # Model saved path
 
         # Saving the results
-        fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+        fold_results.to_frame().to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
         
-        test_result_df.to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
+        test_results.to_frame().to_csv(results_file_path, sep="\t", index=False, encoding="utf-8")
 
         print("Fold Results saved in ==>" + save_result_path)
  
@@ -890,11 +937,14 @@ class Folds_Test:
        
 # final part of main.py
 
-TT = Folds_Test()  # calling the Training class
+TT = Folds_Test(resume=args.resume)  # calling the Training class
 
 if model_name == "Alignment-with-feature":
 
-     model = AlignmentModel(embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device).to(
+     model = AlignmentModel(
+         embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device,
+         separate_neighbourhoods=SEPARATE_NEIGHBOURHOODS,
+     ).to(
          device
      )  # Out Alignment Model with features
 
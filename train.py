@@ -18,24 +18,31 @@ import torch
 import os
 import flair
 import argparse
+import numpy as np
 import torch.nn as nn
 import torch.optim as optim
+import torch.nn.functional as F
 import pandas as pd
 
 from model import AlignmentModel
+from embedding_cache import EmbeddingCache, MemoryEmbeddingCache
+from alignment_labels import AlignmentLabels
+from results_collector import ResultsCollector
+from alignment_dataset import alignment_data_loader
 from cosine_similarity_model import SimpleModel
 from sequence_model import SequenceModel
 from naive_model import NaiveModel
-from transformers import BertTokenizer, BertModel
+from transformers import BertTokenizerFast, BertModel
 from flair.data import Sentence
 from flair.embeddings import ELMoEmbeddings
-from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE, PATIENCE, OPTIMIZER
+from constants import OUTPUT_DIM, LR, MAX_EPOCHS, HIDDEN_DIM1, HIDDEN_DIM2, DROPOUT0, DROPOUT1, DROPOUT2, CUDA_DEVICE, PATIENCE, OPTIMIZER, SEPARATE_NEIGHBOURHOODS, TRAIN_BATCH_SIZE, UPDATE_ON_ERROR, TRAIN_SHUFFLE, DATA_LOADER_WORKERS, TRAIN_SEED
 
 from datetime import datetime
 from constants import (
     folder,
     alignment_file,
     recipe_folder_name,
+    embedding_cache_folder,
     destination_folder1,
     destination_folder2,
     destination_folder3,
@@ -48,12 +55,31 @@ from utils import (
     save_checkpoint,
     load_checkpoint,
     save_predictions,
+    save_fold_results,
+    parse_folds,
+    fold_workers,
+    run_fold_pool,
     create_acc_loss_graph,
     save_vocabulary,
     load_vocabulary
 )
 
 
+def add_training_arguments(parser):
+    """
+    Add the options of the Alignment model training (shared by train.py and cross_validation.py) to a parser
+    """
+
+    parser.add_argument('--batch_size', type=int, default=TRAIN_BATCH_SIZE, help="""Number of source actions per training step of the Alignment Model (Default: TRAIN_BATCH_SIZE from constants.py)""")
+    parser.add_argument('--shuffle', dest='shuffle', action='store_true', help="""Shuffle the training actions of all dishes in mini-batched training (Default: TRAIN_SHUFFLE from constants.py)""")
+    parser.add_argument('--no_shuffle', dest='shuffle', action='store_false', help="""Keep the training actions in the order of the dishes""")
+    parser.add_argument('--loader_workers', type=int, default=DATA_LOADER_WORKERS, help="""Number of processes preparing the batches in mini-batched training; not used when folds run in parallel (Default: DATA_LOADER_WORKERS from constants.py)""")
+    parser.add_argument('--seed', type=int, default=TRAIN_SEED, help="""Seed for shuffling the training data; the model of fold k is initialized with seed + k (Default: TRAIN_SEED from constants.py)""")
+    parser.add_argument('--update_on_error', dest='update_on_error', action='store_true', help="""Train only on wrongly aligned actions (Default: UPDATE_ON_ERROR from constants.py)""")
+    parser.add_argument('--no_update_on_error', dest='update_on_error', action='store_false', help="""Train on all actions""")
+    parser.set_defaults(shuffle=TRAIN_SHUFFLE, update_on_error=UPDATE_ON_ERROR)
+
+
 # from script main.py
 # no more function, merged ith train-related functions
 
@@ -65,45 +91,9 @@ parser.add_argument('model_name', type=str, help="""Model Name; one of {'Simple'
 parser.add_argument('--embedding_name', type=str, default='bert', help='Embedding Name (Default is bert, alternative: elmo)')
 parser.add_argument('--cuda-device', type=str, help="""Select cuda; default: cuda:0""")
 parser.add_argument('--fold', type=int, help="""Fold Number; number in range 1 to 10""")
-args = parser.parse_args()
-
-model_name = args.model_name
-    
-embedding_name = args.embedding_name
-
-if args.cuda_device:
-    device = torch.device("cuda:"+args.cuda_device if torch.cuda.is_available() else "cpu")
-    flair.device = device 
-
-fold = args.fold
-
-print("-------Loading Model-------")
-
-# Loading Model definition
-    
-if embedding_name == 'bert' :
-
-    tokenizer = BertTokenizer.from_pretrained(
-        "bert-base-uncased"
-    )  # Bert Tokenizer
-    
-    emb_model = BertModel.from_pretrained("bert-base-uncased", output_hidden_states=True).to(
-        device
-    )  # Bert Model for Embeddings
-        
-    embedding_dim = emb_model.config.to_dict()[
-        "hidden_size"
-    ]  # BERT embedding dimension
-    
-    # print(bert)
-    
-elif embedding_name == 'elmo' :
-        
-    tokenizer = Sentence #Flair sentence for ELMo embeddings
-       
-    emb_model = ELMoEmbeddings('small')
-        
-    embedding_dim = emb_model.embedding_length
+parser.add_argument('--folds', type=str, help="""Folds to train instead of --fold, e.g. 1-10 or 1,3,5 (Alignment models)""")
+parser.add_argument('--workers', type=int, default=1, help="""Number of folds trained in parallel processes with --folds; CPU only (Default: 1)""")
+add_training_arguments(parser)
 
 # -----------------------------------------------------------------------
 
@@ -113,10 +103,51 @@ elif embedding_name == 'elmo' :
 
 # Training Process Class
 class Folds_Train:
+    def __init__(
+        self,
+        batch_size=TRAIN_BATCH_SIZE,
+        update_on_error=UPDATE_ON_ERROR,
+        shuffle=TRAIN_SHUFFLE,
+        loader_workers=DATA_LOADER_WORKERS,
+        seed=TRAIN_SEED,
+        embedding_cache=None,
+    ):
+        """
+        Training Process Class
+
+        Parameters
+        ----------
+        batch_size : Int, optional
+            Number of source actions per training step of the Alignment Model. The default is TRAIN_BATCH_SIZE.
+        update_on_error : boolean, optional
+            Train only on the actions whose alignment is predicted wrongly. The default is UPDATE_ON_ERROR.
+        shuffle : boolean, optional
+            Shuffle the training actions of all dishes in mini-batched training. The default is TRAIN_SHUFFLE.
+        loader_workers : Int, optional
+            Number of processes preparing the batches in mini-batched training. The default is DATA_LOADER_WORKERS.
+        seed : Int, optional
+            Seed for shuffling the training data. The default is TRAIN_SEED.
+        embedding_cache : EmbeddingCache object, optional
+            Store for the recipe embeddings (see utils.fetch_dish_train()). The default is None.
+        """
+
+        self.batch_size = batch_size
+        self.update_on_error = update_on_error
+        self.shuffle = shuffle
+        self.loader_workers = loader_workers
+        self.seed = seed
+        self.embedding_cache = embedding_cache
+
+        self.dish_dicts = dict()
+        self.gold_alignments = dict()
+        self.train_loaders = dict()
+
+    #####################################
+
     def run_model(
         self,
         dish_dict,
-        dish_group_alignments,
+        alignment_labels,
         emb_model,
         tokenizer,
         model,
@@ -130,6 +161,8 @@ class Folds_Train:
         num_actions=0,
         mode="Training",
         model_name="Alignment Model",
+        batch_size=1,
+        update_on_error=True,
     ):
         """
         Function to run the Model
@@ -138,8 +171,8 @@ class Folds_Train:
         ----------
         dish_dict : dict
             Contains all information for one dish. Keys: recipe names. Values: dictionaries with keys "Embedding_Vectors", "Vector_Lookup_Lists", "Action_Dicts_List" and values according to fetch_recipe().
-        dish_group_alignments : pd.DataFrame
-            All alignments (token ID's) for one dish, grouped by pairs of recipe names.
+        alignment_labels : AlignmentLabels object
+            Label index of all alignments (token ID's) for one dish, see alignment_labels.py.
         emb_model : Embedding Model object
             Model.
         tokenizer : Tokenizer object
@@ -164,10 +197,29 @@ class Folds_Train:
             Mode of Process - ("Training", "Validation", "Testing"). The default is "Training".
         model_name : String, optional
             Model name - ("Alignment Model", "Simple Model"). Default is "Alignment Model".
+        batch_size : Int, optional
+            Number of source actions per training step; with more than one, the Alignment Model is run on mini-batches (see run_batches()). Default is 1.
+        update_on_error : boolean, optional
+            Train only on the actions whose alignment is predicted wrongly. Default is True.
 
 
         """
 
+        if model_name == "Alignment Model" and batch_size > 1 and mode in ("Training", "Validation"):
+
+            return self.run_batches(
+                alignment_data_loader([(dish_dict, alignment_labels)], batch_size),
+                model,
+                device,
+                optimizer=optimizer,
+                update_on_error=update_on_error,
+                total_loss=total_loss,
+                step=step,
+                correct_predictions=correct_predictions,
+                num_actions=num_actions,
+                mode=mode,
+            )
+
         """
         data_folder = os.path.join(folder, dish)  # dish folder
         recipe_folder = os.path.join(data_folder, recipe_folder_name)  # recipe folder, e.g. data/dish-name/recipes
@@ -205,36 +257,31 @@ class Folds_Train:
                 recipe2_filename, emb_model, tokenizer, device, embedding_name,
             )
         """
+
+        if mode == "Testing":
+            results = ResultsCollector(["Action1_id", "True_Label", "Predicted_Label"])
         
-        for key in dish_group_alignments.groups.keys():
+        for pair_id, key in enumerate(alignment_labels.pairs):
             
             recipe1 = dish_dict[key[0]] 
             recipe2 = dish_dict[key[1]] 
 
-            recipe_pair_alignment = dish_group_alignments.get_group(key)
+            aligned, true_labels, target_classes = alignment_labels.pair(pair_id)
 
             #for node in action_dicts_list1[1:]:
-            for node in recipe1["Action_Dicts_List"][1:]:
+            for i, node in enumerate(recipe1["Action_Dicts_List"][1:]):
 
                 if mode == "Training":
                     optimizer.zero_grad()
 
-                # True Action Id
-                action_line = recipe_pair_alignment.loc[
-                    recipe_pair_alignment["token1"] == node["Action_id"]
-                ]
+                # Action in the alignment table
+                if aligned[i]:
 
-                if not action_line.empty:
-
-                    true_label = action_line["token2"].item()
+                    # True Action Id
+                    true_label = true_labels[i].item()
 
                     # True Action Id index
-                    labels = [
-                        i
-                        for i, node in enumerate(recipe2["Action_Dicts_List"])
-                        if node["Action_id"] == true_label
-                    ]
-                    labels_tensor = torch.LongTensor([labels[0]]).to(device)
+                    labels_tensor = torch.LongTensor([target_classes[i].item()]).to(device)
 
                     action1 = node["Action"]
                     parent_list1 = node["Parent_List"]
@@ -279,7 +326,7 @@ class Folds_Train:
                     if mode == "Training" or mode == "Validation":
                         loss = criterion(prediction, labels_tensor)  # Loss
 
-                        if mode == "Training" and not true_label == pred_label:
+                        if mode == "Training" and (not update_on_error or not true_label == pred_label):
                             loss.backward()
                             optimizer.step()
 
@@ -295,7 +342,7 @@ class Folds_Train:
                         }
 
                         # Store the prediction
-                        results_df = results_df.append(results_dict, ignore_index=True)
+                        results.add(results_dict)
 
         if mode == "Training" or mode == "Validation":
 
@@ -305,6 +352,86 @@ class Folds_Train:
 
     #####################################
 
+    def run_batches(
+        self,
+        loader,
+        model,
+        device,
+        optimizer=None,
+        update_on_error=True,
+        total_loss=0.0,
+        step=0,
+        correct_predictions=0,
+        num_actions=0,
+        mode="Training",
+    ):
+        """
+        Mini-batched run of the Alignment Model:
+        the aligned source actions of every batch are scored in one forward pass (see AlignmentModel.score_batch())
+        and, in training, used for one optimizer step.
+
+        Parameters
+        ----------
+        loader : DataLoader object
+            Batches of aligned actions (see alignment_dataset.alignment_data_loader()).
+        model : AlignmentModel object
+            Alignment model.
+        device : object
+            torch device where model tensors are saved.
+        optimizer : Adam optimizer object, optional
+            Optimizer. The default is None.
+        update_on_error : boolean, optional
+            The loss of a training step only includes the wrongly aligned actions of the batch
+            (no step if all are aligned correctly). Default is True.
+        total_loss : Float, optional
+            Total Loss after Training/Validation. The default is 0.0.
+        step : Int, optional
+            Number of actions the loss was computed for. The default is 0.
+        correct_predictions : Int, optional
+            Correction predictions. Defaults is 0.
+        num_actions : Int, optional
+            Number of actions. Defaults is 0.
+        mode : String, optional
+            Mode of Process - ("Training", "Validation"). The default is "Training".
+
+        Returns
+        -------
+        correct_predictions, num_actions, total_loss, step
+            As returned by run_model(); the loss is the cross entropy loss per action.
+
+        """
+
+        for batch in loader:
+
+            labels_tensor = batch["Labels"].to(device)
+
+            if mode == "Training":
+                optimizer.zero_grad()
+
+            predictions, _ = model.score_batch(batch["Recipe_Nodes"])  # batch_size X largest number of Recipe2 actions
+
+            losses = F.cross_entropy(predictions, labels_tensor, reduction="none")  # Loss per action
+
+            correct = torch.argmax(predictions, dim=1) == labels_tensor
+
+            if mode == "Training":
+
+                update = ~correct if update_on_error else torch.ones_like(correct)
+
+                if update.any():
+                    losses[update].mean().backward()
+                    optimizer.step()
+
+            num_actions += len(labels_tensor)
+            correct_predictions += correct.sum().item()
+
+            total_loss += losses.sum().item()
+            step += len(labels_tensor)
+
+        return correct_predictions, num_actions, total_loss, step
+
+    #####################################
+
     def train(
         self, dish_list, embedding_name, emb_model, tokenizer, model, criterion, optimizer, device
     ):
@@ -338,26 +465,51 @@ class Folds_Train:
         model.train()
 
         mode = "Training"
-        
-        for dish in dish_list:
 
-            correct_predictions, num_actions, train_loss, step = self.run_model(
-                self.dish_dicts[dish], 
-                self.gold_alignments[dish], 
-                embedding_name = embedding_name,
-                emb_model=emb_model,
-                tokenizer=tokenizer,
-                model=model,
-                device=device,
-                criterion=criterion,
+        if self.batch_size > 1:
+
+            # one loader per list of training dishes, s.t. every epoch is shuffled differently
+            if tuple(dish_list) not in self.train_loaders:
+                self.train_loaders[tuple(dish_list)] = alignment_data_loader(
+                    [(self.dish_dicts[dish], self.gold_alignments[dish]) for dish in dish_list],
+                    self.batch_size,
+                    shuffle=self.shuffle,
+                    num_workers=self.loader_workers if torch.device(device).type == "cpu" else 0,
+                    seed=self.seed,
+                )
+
+            correct_predictions, num_actions, train_loss, step = self.run_batches(
+                self.train_loaders[tuple(dish_list)],
+                model,
+                device,
                 optimizer=optimizer,
-                total_loss=train_loss,
-                step=step,
-                correct_predictions=correct_predictions,
-                num_actions=num_actions,
+                update_on_error=self.update_on_error,
                 mode=mode,
             )
 
+        else:
+
+            for dish in dish_list:
+
+                correct_predictions, num_actions, train_loss, step = self.run_model(
+                    self.dish_dicts[dish], 
+                    self.gold_alignments[dish], 
+                    embedding_name = embedding_name,
+                    emb_model=emb_model,
+                    tokenizer=tokenizer,
+                    model=model,
+                    device=device,
+                    criterion=criterion,
+                    optimizer=optimizer,
+                    total_loss=train_loss,
+                    step=step,
+                    correct_predictions=correct_predictions,
+                    num_actions=num_actions,
+                    mode=mode,
+                    batch_size=self.batch_size,
+                    update_on_error=self.update_on_error,
+                )
+
         average_train_loss = train_loss / (step - 1)
         average_train_accuracy = correct_predictions * 100 / num_actions
 
@@ -412,6 +564,7 @@ class Folds_Train:
                 correct_predictions=correct_predictions,
                 num_actions=num_actions,
                 mode=mode,
+                batch_size=self.batch_size,
             )
 
         average_valid_loss = valid_loss / step
@@ -436,7 +589,8 @@ class Folds_Train:
         saved_graph_path,
         device,
         patience,
-        scheduler
+        scheduler,
+        fold=None,
     ):
         """
         Training Process function
@@ -468,6 +622,8 @@ class Folds_Train:
         patience : Int
             after how many epochs of val accuracy not improving early stopping should be initiated
         scheduler : Torch learning rate scheduler
+        fold : Int, optional
+            Fold number; determines the validation and test dish. The default is None (first dish is the test dish).
 
         """
 
@@ -612,6 +768,40 @@ class Folds_Train:
 
     #####################################
 
+    def load_dishes(self, dish_list, embedding_name, emb_model, tokenizer, device):
+        """
+        Load the recipes and gold alignments of the dishes that have not been loaded yet
+
+        Parameters
+        ----------
+        dish_list : List
+            List of dish names.
+        embedding_name : String
+            Either 'elmo' or 'bert'.
+        emb_model : Embedding Model object
+            Model.
+        tokenizer : Tokenizer object
+            Tokenizer.
+        device : object
+            torch device where model tensors are saved.
+
+        """
+
+        for dish in dish_list:
+
+            if dish in self.dish_dicts:
+                continue
+        
+            dish_dict, dish_group_alignments = fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model, tokenizer, device, embedding_name, self.embedding_cache)
+        
+            self.dish_dicts[dish] = dish_dict
+        
+            self.gold_alignments[dish] = AlignmentLabels(dish_dict, dish_group_alignments)  # label index of the alignments
+
+        print("Data successfully loaded for dishes ", dish_list) # okay
+
+    #####################################
+
     def run_folds_train(
         self,
         embedding_name,
@@ -624,7 +814,9 @@ class Folds_Train:
         device,
         patience,
         with_feature=True,
-        scheduler=None
+        scheduler=None,
+        fold=None,
+        save_results=True,
     ):
         """
         Running 10 fold cross validation for alignment models --> change this mechanism to one run only
@@ -649,10 +841,17 @@ class Folds_Train:
         patience : Int
             after how many epochs of val accuracy not improving early stopping should be initiated
         scheduler : Torch learning rate scheduler
+        fold : Int, optional
+            Fold number. The default is None.
+        save_results : boolean, optional
+            Append the fold results to fold_results_train.tsv. The default is True.
 
-        """
+        Returns
+        -------
+        fold_result_df : pd.DataFrame
+            Results of the fold.
 
-        fold = args.fold
+        """
 
         print("-------Loading Data-------")
 
@@ -660,21 +859,11 @@ class Folds_Train:
 
         dish_list = [dish for dish in dish_list if not dish.startswith(".")]
         dish_list.sort() # okay
-        self.dish_dicts = dict()
-        self.gold_alignments = dict()
 
-        for dish in dish_list:
-        
-            dish_dict, dish_group_alignments = fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model, tokenizer, device, embedding_name)
-        
-            self.dish_dicts[dish] = dish_dict
-        
-            self.gold_alignments[dish] = dish_group_alignments
-
-        print("Data successfully loaded for dishes ", dish_list) # okay
+        self.load_dishes(dish_list, embedding_name, emb_model, tokenizer, device)
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Train_Loss",
                 "Train_Accuracy",
@@ -746,7 +935,8 @@ class Folds_Train:
             saved_graph_path,
             device,
             patience,
-            scheduler = scheduler
+            scheduler = scheduler,
+            fold = fold,
         )
 
         end = datetime.now()
@@ -788,22 +978,23 @@ class Folds_Train:
                 "Final_Train_Accuracy" : final_train_accuracy
             }
 
-        fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+        fold_results.add(fold_result)
+
+        fold_result_df = fold_results.to_frame()
 
         print("--------------")
 
         print("-------Training Finished-------\n")
 
-        #save_result_path = os.path.join(destination_folder, "fold_results_train_"+str(fold)+".tsv")
-        save_result_path = os.path.join(destination_folder, "fold_results_train.tsv")
+        if save_results:
 
-        # Saving the results
-        if os.path.exists(save_result_path):
-            fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8", mode="a", header=False)
-        else:
-            fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+            #save_result_path = os.path.join(destination_folder, "fold_results_train_"+str(fold)+".tsv")
+            save_result_path = os.path.join(destination_folder, "fold_results_train.tsv")
+
+            # Saving the results
+            save_fold_results(fold_result_df, save_result_path)
 
-        print("Fold Results saved in ==> " + save_result_path)
+            print("Fold Results saved in ==> " + save_result_path)
 
         # Print final model statistics
 
@@ -811,6 +1002,8 @@ class Folds_Train:
         total_duration = divmod(total_duration, 60) 
         print(f"Total training time for fold {fold}: {total_duration[0]}h {total_duration[1]}min" )
 
+        return fold_result_df
+
 
 
 
@@ -878,8 +1071,8 @@ class Folds_Train:
         dish_list = [dish for dish in dish_list if not dish.startswith(".")]
         dish_list.sort()
 
-        fold_result_df = pd.DataFrame(
-            columns=[
+        fold_results = ResultsCollector(
+            [
                 "Fold",
                 "Test_Accuracy",
                 "Correct_Predictions",
@@ -925,7 +1118,7 @@ class Folds_Train:
             # "Test_Dish1_accuracy" : test_accuracy_list[0][2],
             # "Test_Dish2_accuracy" : test_accuracy_list[1][2]}
 
-            fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+            fold_results.add(fold_result)
 
             end = datetime.now()
 
@@ -951,7 +1144,7 @@ class Folds_Train:
                 "Num_Actions": overall_actions,
             }
         
-        fold_result_df = fold_result_df.append(fold_result, ignore_index=True)
+        fold_results.add(fold_result)
 
         save_result_path = os.path.join(destination_folder, "fold_results.tsv")
         
@@ -960,112 +1153,351 @@ class Folds_Train:
         )  # Model saved path
 
         # Saving the results
-        fold_result_df.to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
+        fold_results.to_frame().to_csv(save_result_path, sep="\t", index=False, encoding="utf-8")
         
 
         print("Fold Results saved in ==>" + save_result_path)
         
 # -------------------------------------------------------------------------------
 
+
+def create_alignment_model(embedding_dim, device, with_feature=True):
+    """
+    Freshly initialized Alignment Model with its optimizer and learning rate scheduler
+
+    Parameters
+    ----------
+    embedding_dim : Int
+        Embedding dimension.
+    device : object
+        torch device where model tensors are saved.
+    with_feature : boolean, optional
+        Extended Alignment model ('Alignment-with-feature', optimizer according to OPTIMIZER in constants.py)
+        or Base Alignment model ('Alignment-no-feature', Adam). The default is True.
+
+    Returns
+    -------
+    model : AlignmentModel object
+        Alignment model.
+    optimizer : Optimizer object
+        Optimizer.
+    scheduler : Torch learning rate scheduler
+        None if the optimizer has no scheduler.
+
+    """
+
+    scheduler = None
+
+    if with_feature:
+
+        model = AlignmentModel(
+            embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device,
+            separate_neighbourhoods=SEPARATE_NEIGHBOURHOODS,
+        ).to(
+            device
+        )  # Out Alignment Model with features
+
+        # optimizer for training
+        if OPTIMIZER == "Adam":
+            optimizer = optim.Adam(model.parameters(), lr=LR) 
+        elif OPTIMIZER == "DefaultAdam":
+            optimizer =optim.Adam(model.parameters()) # default: lr=0.001 
+        elif OPTIMIZER == "SGD":
+            optimizer = optim.SGD(model.parameters(), lr=0.1) # lr as suggested in example in torch documentation
+            scheduler = optim.lr_scheduler.ExponentialLR(optimizer, gamma=0.9, verbose=True) # gamma as suggested in example in torch documentation of optimizers
+        elif OPTIMIZER == "RMSprop":
+            optimizer = optim.RMSprop(model.parameters())
+        elif OPTIMIZER == "Adagrad":
+            optimizer = optim.Adagrad(model.parameters(), lr_decay=0.9) # using lr_edcay for comparability with SGD(?)
+
+    else:
+
+        model = AlignmentModel(
+            embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device, False
+        ).to(
+            device
+        )  # Out Alignment Model w/o features
+
+        optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
+
+    return model, optimizer, scheduler
+
+
+def create_fold_model(fold, seed, embedding_dim, device, with_feature=True):
+    """
+    Freshly initialized Alignment model of a fold (see create_alignment_model()), seeded with seed + fold
+    s.t. the initial model of a fold does not depend on the folds run before it or in parallel
+    """
+
+    torch.manual_seed(seed + fold)
+
+    return create_alignment_model(embedding_dim, device, with_feature)
+
+
+#####################################
+
+
+fold_training = None  # (Folds_Train object, arguments of the models) of the process; inherited by the fold workers
+
+
+def train_fold(fold):
+    """
+    Train a freshly initialized Alignment model on a fold (see train_folds())
+
+    Parameters
+    ----------
+    fold : Int
+        Fold number.
+
+    Returns
+    -------
+    fold_result_df : pd.DataFrame
+        Results of the fold.
+
+    """
+
+    trainer, embedding_name, emb_model, tokenizer, embedding_dim, device, with_feature = fold_training
+
+    model, optimizer, scheduler = create_fold_model(fold, trainer.seed, embedding_dim, device, with_feature)
+
+    criterion = nn.CrossEntropyLoss()  # Loss function
+
+    return trainer.run_folds_train(
+        embedding_name,
+        emb_model,
+        tokenizer,
+        model,
+        optimizer,
+        criterion,
+        MAX_EPOCHS,
+        device,
+        PATIENCE,
+        with_feature,
+        scheduler=scheduler,
+        fold=fold,
+    )
+
+
+def train_folds(trainer, fold_list, embedding_name, emb_model, tokenizer, embedding_dim, device, with_feature=True, workers=1):
+    """
+    Train the Alignment model on several folds, in parallel worker processes if workers > 1
+
+    The data of all dishes are loaded once before the workers are forked, s.t. the workers share them
+    (the embeddings from the embedding cache are memory-mapped). Every worker is pinned to its own
+    group of CPU cores, and the fold results are appended to fold_results_train.tsv under a file lock.
+
+    Parameters
+    ----------
+    trainer : Folds_Train object
+        Training process.
+    fold_list : List of Int
+        Fold numbers.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    emb_model : Embedding Model object
+        Model.
+    tokenizer : Tokenizer object
+        Tokenizer.
+    embedding_dim : Int
+        Embedding dimension.
+    device : object
+        torch device where model tensors are saved.
+    with_feature : boolean, optional
+        Extended or Base Alignment model. The default is True.
+    workers : Int, optional
+        Number of worker processes; folds are trained one after the other on a GPU or without fork. The default is 1.
+
+    Returns
+    -------
+    fold_result_df : pd.DataFrame
+        Results of all folds.
+
+    """
+
+    global fold_training
+
+    fold_training = (trainer, embedding_name, emb_model, tokenizer, embedding_dim, device, with_feature)
+
+    print("-------Loading Data-------")
+
+    dish_list = sorted(dish for dish in os.listdir(folder) if not dish.startswith("."))
+
+    trainer.load_dishes(dish_list, embedding_name, emb_model, tokenizer, device)
+
+    workers = fold_workers(workers, len(fold_list), device)
+
+    if workers > 1:
+        trainer.loader_workers = 0  # pool workers cannot start processes
+
+    return pd.concat(run_fold_pool(train_fold, fold_list, workers), ignore_index=True)
+
+
+# -------------------------------------------------------------------------------
+
 # final part of main.py
 
-TT = Folds_Train()  # calling the Training class
+if __name__ == "__main__":
 
-if model_name == "Alignment-with-feature":
+    args = parser.parse_args()
 
-     model = AlignmentModel(embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device).to(
-         device
-     )  # Out Alignment Model with features
+    if args.folds and args.fold is not None:
+        parser.error("--fold and --folds cannot be used together")
 
-     print(model)
-     """for name, param in model.named_parameters():
-         if param.requires_grad:
-                 print(name)"""
+    if args.folds and args.model_name not in ("Alignment-with-feature", "Alignment-no-feature"):
+        parser.error("--folds is only available for the Alignment models")
 
-     # optimizer for training
-     scheduler  = None
+    model_name = args.model_name
 
-     if OPTIMIZER == "Adam":
-         optimizer = optim.Adam(model.parameters(), lr=LR) 
-     elif OPTIMIZER == "DefaultAdam":
-         optimizer =optim.Adam(model.parameters()) # default: lr=0.001 
-     elif OPTIMIZER == "SGD":
-         optimizer = optim.SGD(model.parameters(), lr=0.1) # lr as suggested in example in torch documentation
-         scheduler = optim.lr_scheduler.ExponentialLR(optimizer, gamma=0.9, verbose=True) # gamma as suggested in example in torch documentation of optimizers
-     elif OPTIMIZER == "RMSprop":
-         optimizer = optim.RMSprop(model.parameters())
-     elif OPTIMIZER == "Adagrad":
-         optimizer = optim.Adagrad(model.parameters(), lr_decay=0.9) # using lr_edcay for comparability with SGD(?)
-             
-     criterion = nn.CrossEntropyLoss()  # Loss function
+    embedding_name = args.embedding_name
 
-     ################ Cross Validation Folds #################
+    if args.cuda_device:
+        device = torch.device("cuda:"+args.cuda_device if torch.cuda.is_available() else "cpu")
+        flair.device = device 
 
-     if scheduler:
-          TT.run_folds_train(embedding_name,emb_model, tokenizer, model, optimizer, criterion, MAX_EPOCHS, device, PATIENCE, scheduler=scheduler)
-     else:
-          TT.run_folds_train(embedding_name,emb_model, tokenizer, model, optimizer, criterion, MAX_EPOCHS, device, PATIENCE, scheduler=scheduler)
+    fold = args.fold
 
-elif model_name == "Alignment-no-feature":
+    batch_size = args.batch_size
 
-     model = AlignmentModel(
-         embedding_dim, HIDDEN_DIM1, HIDDEN_DIM2, OUTPUT_DIM, DROPOUT0, DROPOUT1, DROPOUT2, device, False
-     ).to(
-         device
-     )  # Out Alignment Model w/o features
+    update_on_error = args.update_on_error
 
-     print(model)
+    shuffle = args.shuffle
 
-     optimizer = optim.Adam(model.parameters(), lr=LR)  # optimizer for training
-     criterion = nn.CrossEntropyLoss()  # Loss function
+    loader_workers = args.loader_workers
 
-     TT.run_folds_train(
-         embedding_name,
-         emb_model, 
-         tokenizer,
-         model,
-         optimizer,
-         criterion,
-         MAX_EPOCHS,
-         device,
-         PATIENCE,
-         False,
-     )
+    seed = args.seed
 
-elif model_name == "Cosine_similarity":
+    workers = args.workers
 
-     cosine_similarity_model = SimpleModel(embedding_dim, device).to(device) # Simple Cosine Similarity Baseline
+    print("-------Loading Model-------")
 
-     print(cosine_similarity_model)
+    # Loading Model definition
 
-     print("-------Testing (Simple Baseline) -------")
+    if embedding_name == 'bert' :
 
-     TT.test_simple_model(embedding_name, emb_model, tokenizer, cosine_similarity_model, device)
-        
-        
-elif model_name == 'Naive':
-        
-     naive_model = NaiveModel(device) # Naive Common Action Pair Heuristics Baseline
-        
-     print('Common Action Pair Heuristics Model')
-        
-     ################ Cross Validation Folds #################
-        
-     TT.run_naive_folds(
-         naive_model
+        tokenizer = BertTokenizerFast.from_pretrained(
+            "bert-base-uncased"
+        )  # Bert Tokenizer
+
+        emb_model = BertModel.from_pretrained("bert-base-uncased", output_hidden_states=True).to(
+            device
+        )  # Bert Model for Embeddings
+
+        embedding_dim = emb_model.config.to_dict()[
+            "hidden_size"
+        ]  # BERT embedding dimension
+
+        # print(bert)
+
+    elif embedding_name == 'elmo' :
+
+        tokenizer = Sentence #Flair sentence for ELMo embeddings
+
+        emb_model = ELMoEmbeddings('small')
+
+        embedding_dim = emb_model.embedding_length
+
+    # recipes are embedded once per process (and stored on disk if embedding_cache_folder is set), as in cross_validation.py and inference.py
+    if embedding_cache_folder:
+        embedding_cache = MemoryEmbeddingCache(EmbeddingCache(embedding_cache_folder, embedding_name, emb_model))
+    else:
+        embedding_cache = MemoryEmbeddingCache()
+
+    TT = Folds_Train(
+        batch_size=batch_size,
+        update_on_error=update_on_error,
+        shuffle=shuffle,
+        loader_workers=loader_workers,
+        seed=seed,
+        embedding_cache=embedding_cache,
+    )  # calling the Training class
+
+    if args.folds:
+
+         ################ Cross Validation Folds #################
+
+         train_folds(
+             TT,
+             parse_folds(args.folds),
+             embedding_name,
+             emb_model,
+             tokenizer,
+             embedding_dim,
+             device,
+             model_name == "Alignment-with-feature",
+             workers,
          )
-        
-elif model_name == 'Sequence':
-        
-     sequence_model = SequenceModel()
-        
-     print('Sequential Alignments')
-        
-     sequence_model.test_sequence_model()
 
-else:
+    elif model_name == "Alignment-with-feature":
+
+         model, optimizer, scheduler = create_alignment_model(embedding_dim, device)  # Out Alignment Model with features
+
+         print(model)
+         """for name, param in model.named_parameters():
+             if param.requires_grad:
+                     print(name)"""
+
+         criterion = nn.CrossEntropyLoss()  # Loss function
+
+         ################ Cross Validation Folds #################
+
+         TT.run_folds_train(embedding_name,emb_model, tokenizer, model, optimizer, criterion, MAX_EPOCHS, device, PATIENCE, scheduler=scheduler, fold=fold)
+
+    elif model_name == "Alignment-no-feature":
+
+         model, optimizer, _ = create_alignment_model(embedding_dim, device, False)  # Out Alignment Model w/o features
+
+         print(model)
+
+         criterion = nn.CrossEntropyLoss()  # Loss function
+
+         TT.run_folds_train(
+             embedding_name,
+             emb_model, 
+             tokenizer,
+             model,
+             optimizer,
+             criterion,
+             MAX_EPOCHS,
+             device,
+             PATIENCE,
+             False,
+             fold=fold,
+         )
+
+    elif model_name == "Cosine_similarity":
+
+         cosine_similarity_model = SimpleModel(embedding_dim, device).to(device) # Simple Cosine Similarity Baseline
+
+         print(cosine_similarity_model)
+
+         print("-------Testing (Simple Baseline) -------")
+
+         TT.test_simple_model(embedding_name, emb_model, tokenizer, cosine_similarity_model, device)
+
+
+    elif model_name == 'Naive':
+
+         naive_model = NaiveModel(device) # Naive Common Action Pair Heuristics Baseline
+
+         print('Common Action Pair Heuristics Model')
+
+         ################ Cross Validation Folds #################
+
+         TT.run_naive_folds(
+             naive_model
+             )
+
+    elif model_name == 'Sequence':
+
+         sequence_model = SequenceModel()
+
+         print('Sequential Alignments')
+
+         sequence_model.test_sequence_model()
+
+    else:
+
+         print(
+             "Incorrect Argument: Model_name should be ['Cosine_similarity', 'Naive', 'Alignment-no-feature', 'Alignment-with-feature']"
+         )
 
-     print(
-         "Incorrect Argument: Model_name should be ['Cosine_similarity', 'Naive', 'Alignment-no-feature', 'Alignment-with-feature']"
-     )
-   
@@ -23,17 +23,26 @@ import os
 import re
 import torch
 import pickle
+import multiprocessing
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+try:
+    import fcntl  # file locks for the fold results (not available on Windows)
+except ImportError:
+    fcntl = None
+
 from conllu import parse
 from matplotlib import style
 from constants import prediction_file
 from ast import literal_eval
 import pandas as pd
-from conllu2crowd_topk import generate_pairs_experiment
-from constants import test_folder, folder
+from pair_plan import fetch_pair_plan, pair_plan_alignments
+from constants import test_folder, folder, pair_plan_file, BERT_BATCH_SIZE, BERT_WINDOW_SIZE, BERT_WINDOW_STRIDE, BERT_VERIFY_LOOKUP
 from conllu2crowd_topk import Recipe
+from recipe_graph import RecipeIndex, RecipeGraph, dependency_heads
+from recipe_registry import fetch_recipe
 style.use("ggplot")
 
 
@@ -52,38 +61,15 @@ def generate_recipe_dict(recipe, action_list, device):
 
     Returns
     -------
-    recipe_node_list : List of Dict
-        List of Dictionary for every action in the recipe.
+    recipe_node_list : RecipeGraph
+        List of Dictionary for every action in the recipe (preceded by the 'no alignment' action).
         Dictionary contains Action_id, Action, Parent_List, Child_List
 
     """
 
-    # No Alignment case
-    empty_dict = {
-        "Action_id": 0,
-        "Action": torch.empty(0),
-        "Parent_List": [],
-        "Child_List": [],
-    }
-
-    recipe_node_list = [empty_dict]
+    recipe_index = RecipeIndex(recipe)  # Parents, children and split nodes of all tokens (one pass)
 
-    for action_id in action_list:
-
-        action_node, parent_list, child_list = generate_data_line(
-            action_id, recipe, device
-        )
-        # Recipe Dictionary
-        recipe_dict = {
-            "Action_id": action_id,
-            "Action": action_node,
-            "Parent_List": parent_list,
-            "Child_List": child_list,
-        }
-
-        # Append Dictionary to List
-        recipe_node_list.append(recipe_dict)
-        #print(recipe_node_list)
+    recipe_node_list = RecipeGraph(recipe_index, action_list, device)
 
     return recipe_node_list
 
@@ -108,12 +94,11 @@ def generate_elmo_embeddings(emb_model, tokenizer, recipe, device):
 
     Returns
     -------
-    embedding_vectors : Dict
-        Embedding dictionary for a particular Recipe;
-            where keys are vector_lookup_list token_ids and values are their corresponding Elmo embeddings.
-    vector_lookup_list : Dict
-        Look up dictionary for a particular Recipe embeddings;
-            where key is the Conllu file token 'id' and values are list of token_ids generated using Elmo.
+    embedding_vectors : Tensor num_tokens X embedding_dim
+        Embedding matrix for a particular Recipe; one row per token generated using Elmo.
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for a particular Recipe;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
 
     """
     
@@ -131,113 +116,348 @@ def generate_elmo_embeddings(emb_model, tokenizer, recipe, device):
     
     emb_model.embed(recipe_tokens) # Elmo Embeddings
 
-    embedding_vector = {}
+    embedding_vector = torch.stack([token.embedding for token in recipe_tokens])
 
-    for i, token in enumerate(recipe_tokens):
+    vector_lookup_list = np.arange(len(recipe_tokens) + 1, dtype=np.int64)  # one vector per token
 
-        embedding_vector[i] = token.embedding
+    return embedding_vector, vector_lookup_list
     
-    #print(embedding_vector)
 
-    vector_lookup_list = {}
-    
-    for i, token in enumerate(recipe_tokens):
+#####################################
 
-        vector_lookup_list[i + 1] = [i]
-    
-    #print(vector_lookup_list)
 
-    return embedding_vector, vector_lookup_list
-    
+def encode_bert_sequences(emb_model, sequences, pad_token_id, device, batch_size=BERT_BATCH_SIZE):
+    """
+    Run the Bert Model on many subword sequences at once.
+    Sequences are sorted by length and grouped into buckets of batch_size sequences,
+    s.t. every bucket is padded to the length of its longest sequence only.
+
+    Parameters
+    ----------
+    emb_model : BertModel object
+        Bert Embedding Model from HuggingFace.
+    sequences : List of List of Int
+        Subword ids of every sequence (including [CLS] and [SEP]).
+    pad_token_id : Int
+        Subword id used for padding.
+    device : object
+        torch device where model tensors are saved.
+    batch_size : Int, optional
+        Number of sequences per forward pass. The default is BERT_BATCH_SIZE.
+
+    Returns
+    -------
+    sequence_vectors : List of Tensor sequence_length X embedding_dim
+        Sum of the last two hidden layers for every subword of every sequence (in the order of sequences).
+
+    """
+
+    sequence_vectors = [None] * len(sequences)
+
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))  # length bucketing
+
+    emb_model.eval()
+
+    for start in range(0, len(order), batch_size):
+
+        bucket = order[start : start + batch_size]
+        max_length = len(sequences[bucket[-1]])
+
+        input_ids = torch.full((len(bucket), max_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(bucket), max_length), dtype=torch.long)
+
+        for row, i in enumerate(bucket):
+            input_ids[row, : len(sequences[i])] = torch.LongTensor(sequences[i])
+            attention_mask[row, : len(sequences[i])] = 1
+
+        with torch.no_grad():
+
+            outputs = emb_model(input_ids.to(device), attention_mask=attention_mask.to(device))
+
+            hidden = outputs[2]
+
+        # Sum the vectors from the last two layers for every subword
+        bucket_vectors = torch.sum(torch.stack(hidden[-2:], dim=0), dim=0)  # bucket_size X max_length X embedding_dim
+
+        for row, i in enumerate(bucket):
+            sequence_vectors[i] = bucket_vectors[row, : len(sequences[i])]
+
+    return sequence_vectors
+
 
 #####################################
 
 
-def generate_bert_embeddings(emb_model, tokenizer, recipe, device):
+def bert_window_starts(length, window_length, window_stride):
     """
-    Generate Bert Embeddings for a recipe
+    Start positions of the sliding windows over a subword sequence
+
+    Parameters
+    ----------
+    length : Int
+        Number of subwords (without [CLS] and [SEP]).
+    window_length : Int
+        Number of subwords per window (without [CLS] and [SEP]).
+    window_stride : Int
+        Distance between the starts of two consecutive windows; windows overlap by window_length - window_stride subwords.
+
+    Returns
+    -------
+    starts : List of Int
+        Window starts; the last window ends with the sequence.
+
+    """
+
+    if not 0 < window_stride <= window_length:
+        raise ValueError("Window stride should be in [1, window length]")
+
+    starts = list(range(0, max(length - window_length, 0) + 1, window_stride))
+
+    if starts[-1] + window_length < length:
+        starts.append(length - window_length)
+
+    return starts
+
+
+#####################################
+
+
+def stitch_bert_windows(window_vectors, starts, length, window_length):
+    """
+    Stitch the subword vectors of overlapping windows back together;
+    every subword is taken from the window in which it is most central.
+
+    Parameters
+    ----------
+    window_vectors : List of Tensor window_size X embedding_dim
+        Vectors for every window (including [CLS] and [SEP]).
+    starts : List of Int
+        Window starts as returned by bert_window_starts().
+    length : Int
+        Number of subwords (without [CLS] and [SEP]).
+    window_length : Int
+        Number of subwords per window (without [CLS] and [SEP]).
+
+    Returns
+    -------
+    embedding_vector : Tensor length + 2 X embedding_dim
+        Vectors for the whole sequence ([CLS] from the first window, [SEP] from the last window).
+
+    """
+
+    rows = [window_vectors[0][:1]]  # [CLS]
+
+    low = 0
+
+    for k, start in enumerate(starts):
+
+        if k + 1 < len(starts):
+            # subwords up to the midpoint of both window centers are closer to the center of window k
+            high = (start + starts[k + 1] + window_length - 1) // 2 + 1
+        else:
+            high = length
+
+        rows.append(window_vectors[k][1 + low - start : 1 + high - start])
+
+        low = high
+
+    rows.append(window_vectors[-1][-1:])  # [SEP]
+
+    return torch.cat(rows)
+
+
+#####################################
+
+
+def bert_lookup_from_word_ids(word_ids, num_tokens):
+    """
+    Build the vector lookup offsets from the word ids of a fast tokenizer
+
+    Parameters
+    ----------
+    word_ids : List of Int / None
+        Index of the (pre-tokenized) recipe token for every subword; None for [CLS] and [SEP].
+    num_tokens : Int
+        Number of recipe tokens.
+
+    Returns
+    -------
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into the subword vectors; subword 0 is [CLS].
+
+    """
+
+    word_ids = np.array([word_id for word_id in word_ids if word_id is not None], dtype=np.int64)
+
+    vector_lookup_list = np.ones(num_tokens + 1, dtype=np.int64)  # subword 0 is [CLS]
+    vector_lookup_list[1:] += np.cumsum(np.bincount(word_ids, minlength=num_tokens))
+
+    return vector_lookup_list
+
+
+#####################################
+
+
+def bert_lookup_from_tokens(tokenizer, recipe_text_list):
+    """
+    Build the vector lookup offsets by tokenizing every recipe token on its own
+
+    Parameters
+    ----------
+    tokenizer : BertTokenizer object
+        Tokenizer.
+    recipe_text_list : List of String
+        Recipe tokens (Conllu 'form' column).
+
+    Returns
+    -------
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into the subword vectors; subword 0 is [CLS].
+
+    """
+
+    vector_lookup_list = np.ones(len(recipe_text_list) + 1, dtype=np.int64)  # subword 0 is [CLS]
+
+    for i, token in enumerate(recipe_text_list):
+
+        vector_lookup_list[i + 1] = vector_lookup_list[i] + len(tokenizer.tokenize(token))
+
+    return vector_lookup_list
+
+
+#####################################
+
+
+def generate_bert_embeddings_batch(
+    emb_model, tokenizer, recipes, device, batch_size=BERT_BATCH_SIZE, window_size=BERT_WINDOW_SIZE, window_stride=BERT_WINDOW_STRIDE,
+    verify_lookup=BERT_VERIFY_LOOKUP
+):
+    """
+    Generate Bert Embeddings for many recipes with batched forward passes.
+    Recipes longer than window_size subwords are encoded in overlapping windows (see stitch_bert_windows()).
 
     Parameters
     ----------
     emb_model : BertModel object
             Bert Embedding Model from HuggingFace.
     tokenizer : BertTokenizer object
-            Tokenizer.
-    recipe : List
-        Conllu parsed file for recipe.
+            Tokenizer; a BertTokenizerFast builds the lookup offsets in the same pass as the subword ids.
+    recipes : List of List
+        Conllu parsed files for the recipes.
     device : object
         torch device where model tensors are saved.
+    batch_size : Int, optional
+        Number of recipes (windows) per forward pass. The default is BERT_BATCH_SIZE.
+    window_size : Int, optional
+        Maximum number of subwords per forward pass (including [CLS] and [SEP]). The default is BERT_WINDOW_SIZE.
+    window_stride : Int, optional
+        Distance between the starts of two consecutive windows. The default is BERT_WINDOW_STRIDE.
+    verify_lookup : Boolean, optional
+        Check the offsets built from a fast tokenizer's word ids against bert_lookup_from_tokens(). The default is BERT_VERIFY_LOOKUP.
 
     Returns
     -------
-    embedding_vectors : Dict
-        Embedding dictionary for a particular Recipe;
-            where keys are vector_lookup_list token_ids and values are their corresponding BERT embeddings.
-    vector_lookup_list : Dict
-        Look up dictionary for a particular Recipe embeddings;
-            where key is the Conllu file token 'id' and values are list of token_ids generated using BERT tokenizer.
+    recipe_embeddings : List of (embedding_vectors, vector_lookup_list)
+        Embeddings for every recipe as returned by generate_bert_embeddings().
 
     """
 
-    # TODO this is a more pythonic way for the code below
-    # until recipe_tokens = ...
-    # recipe_text_list = [line['form'] for line in recipe[0]]
-    # recipe_text = " ".join(recipe_text_list)
+    if not recipes:
+        return []
 
-    recipe_text = ""
-    recipe_text_list = []
+    recipe_text_lists = [[line["form"] for line in recipe[0]] for recipe in recipes]
 
-    for line in recipe[0]:
-        recipe_text += line["form"] + " "
-        recipe_text_list.append(line["form"])
+    if tokenizer.is_fast:
 
-    recipe_text = recipe_text.rstrip()
+        # one tokenization pass; the word ids of the subwords give the lookup offsets
+        encodings = tokenizer(recipe_text_lists, is_split_into_words=True)  # Tokenize Recipes
 
-    recipe_tokens = tokenizer.encode(recipe_text)  # Tokenize Recipe
-    recipe_tensor = torch.LongTensor([recipe_tokens]).to(device)
+        sequences = encodings["input_ids"]
+        vector_lookup_lists = [
+            bert_lookup_from_word_ids(encodings.word_ids(i), len(recipe_text_list))
+            for i, recipe_text_list in enumerate(recipe_text_lists)
+        ]
 
-    emb_model.eval()
+        if verify_lookup:
+            for recipe_text_list, vector_lookup_list in zip(recipe_text_lists, vector_lookup_lists):
+                if not np.array_equal(vector_lookup_list, bert_lookup_from_tokens(tokenizer, recipe_text_list)):
+                    raise RuntimeError(
+                        "Subword offsets from word ids differ from the per-token tokenization for recipe: "
+                        + " ".join(recipe_text_list)
+                    )
 
-    with torch.no_grad():
+    else:
 
-        outputs = emb_model(recipe_tensor)
+        sequences = [
+            tokenizer.encode(" ".join(recipe_text_list)) for recipe_text_list in recipe_text_lists
+        ]  # Tokenize Recipes
+        vector_lookup_lists = [
+            bert_lookup_from_tokens(tokenizer, recipe_text_list) for recipe_text_list in recipe_text_lists
+        ]
 
-        hidden = outputs[2]
+    window_length = window_size - 2  # subwords per window without [CLS] and [SEP]
 
-    token_embeddings = torch.stack(hidden, dim=0)
-    token_embeddings = torch.squeeze(token_embeddings, dim=1)
-    token_embeddings = token_embeddings.permute(1, 0, 2)
+    windows = []  # subword ids for every window
+    recipe_window_starts = []
 
-    # Stores the token vectors
-    token_vecs_sum = []
+    for sequence in sequences:
 
-    # For each token in the recipe...
-    for token in token_embeddings:
+        body = sequence[1:-1]
+        starts = bert_window_starts(len(body), window_length, window_stride)
 
-        # Sum the vectors from the last four layers.
-        sum_vec = torch.sum(token[-2:], dim=0)
+        windows.extend(
+            [sequence[:1] + body[start : start + window_length] + sequence[-1:] for start in starts]
+        )
+        recipe_window_starts.append(starts)
 
-        # Use `sum_vec` to represent `token`.
-        token_vecs_sum.append(sum_vec)
+    window_vectors = encode_bert_sequences(
+        emb_model, windows, tokenizer.pad_token_id, device, batch_size
+    )
 
-    embedding_vector = {}
+    recipe_embeddings = []
+    first_window = 0
 
-    for i, emb in enumerate(token_vecs_sum):
+    for vector_lookup_list, sequence, starts in zip(vector_lookup_lists, sequences, recipe_window_starts):
 
-        embedding_vector[i] = emb
+        embedding_vector = stitch_bert_windows(
+            window_vectors[first_window : first_window + len(starts)], starts, len(sequence) - 2, window_length
+        )  # num_subwords X embedding_dim
+        first_window += len(starts)
 
-    vector_lookup_list = {}
-    count = 1
+        recipe_embeddings.append((embedding_vector, vector_lookup_list))
 
-    for i, token in enumerate(recipe_text_list):
+    return recipe_embeddings
 
-        tokenize = tokenizer.tokenize(token)
 
-        vector_lookup_list[i + 1] = list(range(count, count + len(tokenize)))
+#####################################
 
-        count += len(tokenize)
 
-    return embedding_vector, vector_lookup_list
+def generate_bert_embeddings(emb_model, tokenizer, recipe, device):
+    """
+    Generate Bert Embeddings for a recipe
+
+    Parameters
+    ----------
+    emb_model : BertModel object
+            Bert Embedding Model from HuggingFace.
+    tokenizer : BertTokenizer object
+            Tokenizer.
+    recipe : List
+        Conllu parsed file for recipe.
+    device : object
+        torch device where model tensors are saved.
+
+    Returns
+    -------
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for a particular Recipe; one row per subword generated using BERT tokenizer (including [CLS] and [SEP]).
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for a particular Recipe;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
+
+    """
+
+    return generate_bert_embeddings_batch(emb_model, tokenizer, [recipe], device)[0]
 
 
 #####################################
@@ -245,7 +465,7 @@ def generate_bert_embeddings(emb_model, tokenizer, recipe, device):
 
 def fetch_parsed_recipe(recipe_filename):
     """
-    Fetch conllu parsed file
+    Fetch conllu parsed file (parsed once per process, see recipe_registry.py)
 
     Parameters
     ----------
@@ -258,18 +478,141 @@ def fetch_parsed_recipe(recipe_filename):
        Conllu parsed file to generate a list of sentences.
 
     """
-    
-    file = open(recipe_filename, "r", encoding="utf-8")  # Recipe file
-    conllu_file = file.read()  # Reading recipe file
 
-    parsed_recipe = parse(conllu_file)  # Parsed Recipe File
-    
+    parsed_recipe = fetch_recipe(recipe_filename).parsed_recipe  # Parsed Recipe File
+
     return parsed_recipe
 
 
 #####################################
 
-def fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model, tokenizer, device, embedding_name):
+
+def fetch_recipe_embeddings(parsed_recipe, emb_model, tokenizer, device, embedding_name, embedding_cache=None):
+    """
+    Fetch the Embeddings for a recipe from the embedding cache or generate them on a cache miss
+
+    Parameters
+    ----------
+    parsed_recipe : List
+        Conllu parsed file for recipe.
+    emb_model : Embedding object
+        Model.
+    tokenizer : Tokenizer object
+        Tokenizer.
+    device : object
+        torch device where model tensors are saved.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    embedding_cache : EmbeddingCache object, optional
+        On-disk embedding store. The default is None (always generate the embeddings).
+
+    Returns
+    -------
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for a particular Recipe; one row per token_id generated using BERT/ELMO tokenizer.
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for a particular Recipe;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
+
+    """
+
+    if embedding_cache is not None:
+
+        token_forms = [line["form"] for line in parsed_recipe[0]]
+
+        cached = embedding_cache.load(token_forms, device)
+
+        if cached is not None:
+            return cached
+
+    if(embedding_name == 'bert'):
+
+        embedding_vector, vector_lookup_list = generate_bert_embeddings(
+            emb_model, tokenizer, parsed_recipe, device
+        )  # Embeddings for Recipe
+    
+    elif (embedding_name == 'elmo'):
+        
+        embedding_vector, vector_lookup_list = generate_elmo_embeddings(
+            emb_model, tokenizer, parsed_recipe, device
+        )  # Embeddings for Recipe
+
+    if embedding_cache is not None:
+        embedding_cache.save(token_forms, embedding_vector, vector_lookup_list)
+
+    return embedding_vector, vector_lookup_list
+
+
+#####################################
+
+
+def fetch_recipe_embeddings_batch(parsed_recipes, emb_model, tokenizer, device, embedding_name, embedding_cache=None):
+    """
+    Fetch the Embeddings for many recipes; all recipes missing from the embedding cache are encoded together
+    (batched Bert forward passes, see generate_bert_embeddings_batch())
+
+    Parameters
+    ----------
+    parsed_recipes : List of List
+        Conllu parsed files for the recipes.
+    emb_model : Embedding object
+        Model.
+    tokenizer : Tokenizer object
+        Tokenizer.
+    device : object
+        torch device where model tensors are saved.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    embedding_cache : EmbeddingCache object, optional
+        On-disk embedding store. The default is None (always generate the embeddings).
+
+    Returns
+    -------
+    recipe_embeddings : List of (embedding_vectors, vector_lookup_list)
+        Embeddings for every recipe (in the order of parsed_recipes) as returned by fetch_recipe_embeddings().
+
+    """
+
+    recipe_embeddings = [None] * len(parsed_recipes)
+
+    if embedding_cache is not None:
+
+        for i, parsed_recipe in enumerate(parsed_recipes):
+
+            recipe_embeddings[i] = embedding_cache.load(
+                [line["form"] for line in parsed_recipe[0]], device
+            )
+
+    missing = [i for i, embeddings in enumerate(recipe_embeddings) if embeddings is None]
+
+    if embedding_name == 'bert':
+
+        generated = generate_bert_embeddings_batch(
+            emb_model, tokenizer, [parsed_recipes[i] for i in missing], device
+        )  # Embeddings for Recipes
+
+    else:
+
+        generated = [
+            fetch_recipe_embeddings(parsed_recipes[i], emb_model, tokenizer, device, embedding_name)
+            for i in missing
+        ]
+
+    for i, (embedding_vector, vector_lookup_list) in zip(missing, generated):
+
+        if embedding_cache is not None:
+            embedding_cache.save(
+                [line["form"] for line in parsed_recipes[i][0]], embedding_vector, vector_lookup_list
+            )
+
+        recipe_embeddings[i] = (embedding_vector, vector_lookup_list)
+
+    return recipe_embeddings
+
+
+#####################################
+
+def fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model, tokenizer, device, embedding_name, embedding_cache=None):
         """
         Reads in the data.
         Author: Theresa Schmidt
@@ -292,6 +635,8 @@ def fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model
             torch device where model tensors are saved.
         embedding_name : String
             Either 'elmo' or 'bert'.
+        embedding_cache : EmbeddingCache object, optional
+            On-disk embedding store; consulted first and populated on a miss. The default is None.
 
         Returns
         ----------
@@ -309,13 +654,22 @@ def fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model
         recipe_list = [recipe for recipe in recipe_list if not recipe.startswith(".")]
 
         # Read in recipes of the dish
-        dish_dict = dict()
-        for recipe in recipe_list:
+        recipe_filenames = [os.path.join(recipe_folder, recipe) for recipe in recipe_list]
+        parsed_recipes = [fetch_parsed_recipe(recipe_filename) for recipe_filename in recipe_filenames]
 
-            recipe_filename = os.path.join(recipe_folder, recipe)
+        # Embeddings for all recipes of the dish (batched)
+        recipe_embeddings_list = fetch_recipe_embeddings_batch(
+            parsed_recipes, emb_model, tokenizer, device, embedding_name, embedding_cache
+        )
+
+        dish_dict = dict()
+        for recipe, recipe_filename, parsed_recipe, recipe_embeddings in zip(
+            recipe_list, recipe_filenames, parsed_recipes, recipe_embeddings_list
+        ):
 
             embedding_vectors, vector_lookup_lists, action_dicts_list = fetch_recipe_train(
-                recipe_filename, emb_model, tokenizer, device, embedding_name,
+                recipe_filename, emb_model, tokenizer, device, embedding_name, embedding_cache,
+                parsed_recipe, recipe_embeddings,
             )
 
             recipe_name = recipe.split(".")[0]
@@ -337,7 +691,7 @@ def fetch_dish_train(dish, folder, alignment_file, recipe_folder_name, emb_model
 ###########################################
 
 
-def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name):
+def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name, embedding_cache=None, pair_plan_file=pair_plan_file):
         """
         Reads in the data.
         Author: Theresa Schmidt
@@ -360,6 +714,10 @@ def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, devi
             torch device where model tensors are saved.
         embedding_name : String
             Either 'elmo' or 'bert'.
+        embedding_cache : EmbeddingCache object, optional
+            On-disk embedding store; consulted first and populated on a miss. The default is None.
+        pair_plan_file : String, optional
+            Filename of the cached pair plan in the dish folder (see pair_plan.py); None disables caching. The default is pair_plan_file from constants.py.
 
         Returns
         ----------
@@ -381,15 +739,23 @@ def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, devi
         sub_directories.append(recipe_folder)
 
         # Read in recipes of the dish
+        recipe_filenames = [os.path.join(recipe_folder, recipe) for recipe in recipe_list]
+        parsed_recipes = [fetch_parsed_recipe(recipe_filename) for recipe_filename in recipe_filenames]
+
+        # Embeddings for all recipes of the dish (batched)
+        recipe_embeddings_list = fetch_recipe_embeddings_batch(
+            parsed_recipes, emb_model, tokenizer, device, embedding_name, embedding_cache
+        )
+
         dish_dict = dict()
-        for recipe in recipe_list:
+        for recipe, recipe_filename, parsed_recipe, recipe_embeddings in zip(
+            recipe_list, recipe_filenames, parsed_recipes, recipe_embeddings_list
+        ):
             #print(recipe)
 
-            recipe_filename = os.path.join(recipe_folder, recipe)
-            #print(recipe_filename)
-
             embedding_vectors, vector_lookup_lists, action_dicts_list, recipe_actionlist_dict = fetch_recipe_test(
-                recipe_filename, emb_model, tokenizer, device, embedding_name,
+                recipe_filename, emb_model, tokenizer, device, embedding_name, embedding_cache,
+                parsed_recipe, recipe_embeddings,
             )
 
             recipe_name = recipe.split(".")[0]
@@ -397,93 +763,13 @@ def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, devi
             dish_dict[recipe_name] = {"Embedding_Vectors" : embedding_vectors, "Vector_Lookup_Lists" : vector_lookup_lists, "Action_Dicts_List" : action_dicts_list, "Action_id_List":recipe_actionlist_dict[recipe_name]}
             #print(dish_dict)
             
-        # (Not Gold) Alignments between all recipes for dish
-        # 3) extract actions to pair
-     
-        recipes_ids={}
-      
-        for recipe in recipe_list:
-            #print(recipe)
-            value_ids=[]
-
-            recipe_filename = os.path.join(recipe_folder, recipe)
-            recipe_open=open(recipe_filename).readlines()
-
-            for line in recipe_open:
-                  #print(line)
-                  columns = line.strip().split()
-                  id = columns[0]
-                  token = columns[1]
-                  tag = columns[4]         
-                  
-                  if tag[0] == "B":
-                     #print(id)
-                     value_ids.append(int(id))
-
-            recipes_ids[recipe]=value_ids
-
-        #print(recipes_ids)
-             
-
-        # 1) pair recipes using function generate_pairs_experiment from conllu2crowd
-
-        for recipe in recipe_list:
-           #print(recipe)
-
-           pairs = generate_pairs_experiment(recipe_folder,#os.path.join(recipe_folder,recipe) 
-                                               r1_indexed=False,
-                                               r1_shuffled=False,
-                                               r2_indexed=True,
-                                               r2_indices_from=1)
-           #print(pairs)
-    
-           # 2) convert class objects to strings
-           pairings=[]
-           for pair in pairs:
-              source=pair[0].name#+".conllu"
-              target=pair[1].name#+".conllu"
-              pair=(source,target)
-              pairings.append(pair)
-           #print(pairings)
-           #exit()
-           
-           #for pair in pairings:
-           #   recipes_of_dish.append(pair[0])
-           #   print(recipes_ids[recipe_1])
-
-           # 4) prepare replacement for dish_group_alignments
-           #print("keys of recipes_ids are",recipes_ids.keys())
-           #print("pairings are",pairings)
-           alignments=[]
-           #for recipe in recipes_ids.keys():
-           #   print(recipe)
-              #used_tokens=[]
-           for pair in pairings:
-              #print(pair[0])
-              #if recipe==pair[0]:
-              #      print("yes")
-              #      exit()
-              used_tokens=[]
-              recipe_1= pair[0]+".conllu"
-              recipe_2= pair[1]+".conllu"
-              try:
-                 for value in recipes_ids[recipe_1]:
-                    if value not in used_tokens:
-                       alignment=(pair[0],value,pair[1])
-                       #alignment.append(recipe_1)
-                       #alignment.append(value)
-                       used_tokens.append(value)
-                       #alignment.append(recipe_2)
-                       alignments.append(list(alignment))
-                 used_tokens=[]
-              except KeyError:
-                 print("No match was found for recipe", recipe_1)
-        #print(alignments)
-           
-           
-        # 5) execute replacement for dish_group_alignments
-        # I need the format list of lists
-          
+        # (Not Gold) Alignments between all recipes for dish:
+        # every action of the source recipe of each pair (see pair_plan.py)
+
+        pair_plan = fetch_pair_plan(recipe_folder, os.path.join(data_folder, pair_plan_file) if pair_plan_file else None)
+
+        alignments = pair_plan_alignments(pair_plan)
+
         dish_alignments = pd.DataFrame(alignments, columns =["file1", "token1", "file2"])
         dish_group_alignments = dish_alignments.groupby(["file1", "file2"])
 
@@ -499,7 +785,7 @@ def fetch_dish_test(dish, folder, recipe_folder_name, emb_model, tokenizer, devi
 #####################################
 
 
-def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name):
+def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, tokenizer, device, embedding_name, embedding_cache=None, pair_plan_file=pair_plan_file):
         """
         Reads in the data.
         Author: Theresa Schmidt
@@ -522,6 +808,10 @@ def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, token
             torch device where model tensors are saved.
         embedding_name : String
             Either 'elmo' or 'bert'.
+        embedding_cache : EmbeddingCache object, optional
+            On-disk embedding store; consulted first and populated on a miss. The default is None.
+        pair_plan_file : String, optional
+            Filename of the cached pair plan in the dish folder (see pair_plan.py); None disables caching. The default is pair_plan_file from constants.py.
 
         Returns
         ----------
@@ -544,15 +834,23 @@ def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, token
         sub_directories.append(recipe_folder)
 
         # Read in recipes of the dish
+        recipe_filenames = [os.path.join(recipe_folder, recipe) for recipe in recipe_list]
+        parsed_recipes = [fetch_parsed_recipe(recipe_filename) for recipe_filename in recipe_filenames]
+
+        # Embeddings for all recipes of the dish (batched)
+        recipe_embeddings_list = fetch_recipe_embeddings_batch(
+            parsed_recipes, emb_model, tokenizer, device, embedding_name, embedding_cache
+        )
+
         dish_dict = dict()
-        for recipe in recipe_list:
+        for recipe, recipe_filename, parsed_recipe, recipe_embeddings in zip(
+            recipe_list, recipe_filenames, parsed_recipes, recipe_embeddings_list
+        ):
             #print(recipe)
 
-            recipe_filename = os.path.join(recipe_folder, recipe)
-            #print(recipe_filename)
-
             embedding_vectors, vector_lookup_lists, action_dicts_list, recipe_actionlist_dict = fetch_recipe_test(
-                recipe_filename, emb_model, tokenizer, device, embedding_name,
+                recipe_filename, emb_model, tokenizer, device, embedding_name, embedding_cache,
+                parsed_recipe, recipe_embeddings,
             )
 
             recipe_name = recipe.split(".")[0]
@@ -560,101 +858,15 @@ def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, token
             dish_dict[recipe_name] = {"Embedding_Vectors" : embedding_vectors, "Vector_Lookup_Lists" : vector_lookup_lists, "Action_Dicts_List" : action_dicts_list, "Action_id_List":recipe_actionlist_dict[recipe_name]}
             #print(dish_dict)
             
-        # (Not Gold) Alignments between all recipes for dish
-        # 3) extract actions to pair
-     
-        recipes_ids={}
-      
-        for recipe in recipe_list:
-            #print(recipe)
-            value_ids=[]
-
-            recipe_filename = os.path.join(recipe_folder, recipe)
-            recipe_open=open(recipe_filename).readlines()
-
-            for line in recipe_open:
-                  #print(line)
-                  columns = line.strip().split()
-                  id = columns[0]
-                  token = columns[1]
-                  tag = columns[4]         
-                  
-                  if tag[0] == "B":
-                     #print(id)
-                     value_ids.append(int(id))
-
-            recipes_ids[recipe]=value_ids
-
-        #print(recipes_ids)
-             
-
-        # 1) pair recipes using function generate_pairs_experiment from conllu2crowd
-
-        for recipe in recipe_list:
-           #print(recipe)
-
-           pairs = generate_pairs_experiment(recipe_folder,#os.path.join(recipe_folder,recipe) 
-                                               r1_indexed=False,
-                                               r1_shuffled=False,
-                                               r2_indexed=True,
-                                               r2_indices_from=1)
-           #print(pairs)
-    
-           # 2) convert class objects to strings
-           pairings=[]
-           for pair in pairs:
-              source=pair[0].name#+".conllu"
-              target=pair[1].name#+".conllu"
-              pair=(source,target)
-              pairings.append(pair)
-           #print("ORIGINAL", "           ", pairings)
-
-           print(pairings)
-           # switch the order of the each element in pairings
-           # this will alow us to have reversed alignment scores
-           # we will use them to define insertions costs (=deletions costs) and to refine substitution costs (=average of the two align. directions)
-           pairings_insertion=[]
-           for pair in pairings:
-              recipe1=pair[1]
-              recipe2=pair[0]
-              pair_ins=(recipe1,recipe2)
-              pairings_insertion.append(pair_ins)
-           #print("INSERTION", "           ", pairings_insertion)   
-           
-
-           # 4) prepare replacement for dish_group_alignments
-           #print("keys of recipes_ids are",recipes_ids.keys())
-           #print("pairings are",pairings)
-           alignments=[]
-           #for recipe in recipes_ids.keys():
-           #   print(recipe)
-              #used_tokens=[]
-           for pair in pairings_insertion:
-              #print(pair[0])
-              #if recipe==pair[0]:
-              #      print("yes")
-              #      exit()
-              used_tokens=[]
-              recipe_1= pair[0]+".conllu"
-              recipe_2= pair[1]+".conllu"
-              try:
-                 for value in recipes_ids[recipe_1]:
-                    if value not in used_tokens:
-                       alignment=(pair[0],value,pair[1])
-                       #alignment.append(recipe_1)
-                       #alignment.append(value)
-                       used_tokens.append(value)
-                       #alignment.append(recipe_2)
-                       alignments.append(list(alignment))
-                 used_tokens=[]
-              except KeyError:
-                 print("No match was found for recipe", recipe_1)
-        #print(alignments)
-           
-           
-        # 5) execute replacement for dish_group_alignments
-        # I need the format list of lists
-          
+        # (Not Gold) Alignments between all recipes for dish:
+        # every action of the target recipe of each pair, aligned to the source recipe (see pair_plan.py).
+        # The reversed alignment scores are used to define insertion costs (=deletion costs) and to
+        # refine substitution costs (=average of the two alignment directions)
+
+        pair_plan = fetch_pair_plan(recipe_folder, os.path.join(data_folder, pair_plan_file) if pair_plan_file else None)
+
+        alignments = pair_plan_alignments(pair_plan, insertion=True)
+
         dish_alignments = pd.DataFrame(alignments, columns =["file1", "token1", "file2"])
         dish_group_alignments = dish_alignments.groupby(["file1", "file2"])
 
@@ -667,7 +879,45 @@ def fetch_dish_test_insertion(dish, folder, recipe_folder_name, emb_model, token
 #######################################
 
 
-def fetch_recipe_train(recipe_filename, emb_model, tokenizer, device, embedding_name):
+def fetch_dish_pair_alignments(dish, folder, recipe_folder_name, insertion=False, pair_plan_file=pair_plan_file):
+    """
+    (Not Gold) Alignments between all recipes of a dish according to its pair plan (see pair_plan.py),
+    as returned by fetch_dish_test() and, for insertion=True, by fetch_dish_test_insertion()
+
+    Parameters
+    ----------
+    dish : String
+        Dish name.
+    folder : String
+        Path to data folder.
+    recipe_folder_name : String
+        What the subfolder with the recipes is called in the dish folder.
+    insertion : boolean, optional
+        Every action of the target recipe of each pair, aligned to the source recipe. The default is False.
+    pair_plan_file : String, optional
+        Filename of the cached pair plan in the dish folder; None disables caching. The default is pair_plan_file from constants.py.
+
+    Returns
+    ----------
+    dish_group_alignments : pd.DataFrame
+        All alignments (token ID's) for the dish, grouped by pairs of recipe names.
+    """
+
+    data_folder = os.path.join(folder, dish)  # dish folder
+    recipe_folder = os.path.join(data_folder, recipe_folder_name)  # recipe folder, e.g. data/dish-name/recipes
+
+    pair_plan = fetch_pair_plan(recipe_folder, os.path.join(data_folder, pair_plan_file) if pair_plan_file else None)
+
+    alignments = pair_plan_alignments(pair_plan, insertion=insertion)
+
+    dish_alignments = pd.DataFrame(alignments, columns =["file1", "token1", "file2"])
+
+    return dish_alignments.groupby(["file1", "file2"])
+
+#######################################
+
+
+def fetch_recipe_train(recipe_filename, emb_model, tokenizer, device, embedding_name, embedding_cache=None, parsed_recipe=None, recipe_embeddings=None):
     """
     Fetch List of recipe dictionary and Embedding vector dictionary
 
@@ -681,34 +931,37 @@ def fetch_recipe_train(recipe_filename, emb_model, tokenizer, device, embedding_
         Tokenizer.
     device : object
         torch device where model tensors are saved.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    embedding_cache : EmbeddingCache object, optional
+        On-disk embedding store consulted before computing the embeddings. The default is None.
+    parsed_recipe : List, optional
+        Conllu parsed file for the recipe, if it has been read already. The default is None.
+    recipe_embeddings : (embedding_vectors, vector_lookup_list), optional
+        Precomputed embeddings for the recipe, e.g. from fetch_recipe_embeddings_batch(). The default is None.
 
     Returns
     -------
-    embedding_vectors : Dict
-        Embedding dictionary for a particular Recipe;
-            where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-    vector_lookup_list : Dict
-        Look up dictionary for a particular Recipe embeddings;
-            where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO tokenizer.
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for a particular Recipe; one row per token_id generated using BERT/ELMO tokenizer.
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for a particular Recipe;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
     action_dicts_list : List of Dict
         List of Dictionary for every action in the recipe.
         Dictionary contains Action_id, Action, Parent_List, Child_List.
 
     """
 
-    parsed_recipe = fetch_parsed_recipe(recipe_filename) # Parsed Recipe File
-    
-    if(embedding_name == 'bert'):
+    if parsed_recipe is None:
+        parsed_recipe = fetch_parsed_recipe(recipe_filename) # Parsed Recipe File
 
-        embedding_vector, vector_lookup_list = generate_bert_embeddings(
-            emb_model, tokenizer, parsed_recipe, device
-        )  # Embeddings for Recipe
-    
-    elif (embedding_name == 'elmo'):
-        
-        embedding_vector, vector_lookup_list = generate_elmo_embeddings(
-            emb_model, tokenizer, parsed_recipe, device
+    if recipe_embeddings is None:
+        recipe_embeddings = fetch_recipe_embeddings(
+            parsed_recipe, emb_model, tokenizer, device, embedding_name, embedding_cache
         )  # Embeddings for Recipe
+
+    embedding_vector, vector_lookup_list = recipe_embeddings
     
     # addition by Iris: create a dict with recipe names as keys and corresponding action list as value --> to use in fetch_dish
 
@@ -728,7 +981,7 @@ def fetch_recipe_train(recipe_filename, emb_model, tokenizer, device, embedding_
 
 #####################################
 
-def fetch_recipe_test(recipe_filename, emb_model, tokenizer, device, embedding_name):
+def fetch_recipe_test(recipe_filename, emb_model, tokenizer, device, embedding_name, embedding_cache=None, parsed_recipe=None, recipe_embeddings=None):
     """
     Fetch List of recipe dictionary and Embedding vector dictionary
 
@@ -742,34 +995,37 @@ def fetch_recipe_test(recipe_filename, emb_model, tokenizer, device, embedding_n
         Tokenizer.
     device : object
         torch device where model tensors are saved.
+    embedding_name : String
+        Either 'elmo' or 'bert'.
+    embedding_cache : EmbeddingCache object, optional
+        On-disk embedding store consulted before computing the embeddings. The default is None.
+    parsed_recipe : List, optional
+        Conllu parsed file for the recipe, if it has been read already. The default is None.
+    recipe_embeddings : (embedding_vectors, vector_lookup_list), optional
+        Precomputed embeddings for the recipe, e.g. from fetch_recipe_embeddings_batch(). The default is None.
 
     Returns
     -------
-    embedding_vectors : Dict
-        Embedding dictionary for a particular Recipe;
-            where keys are vector_lookup_list token_ids and values are their corresponding word embeddings (BERT/ELMO).
-    vector_lookup_list : Dict
-        Look up dictionary for a particular Recipe embeddings;
-            where key is the Conllu file token 'id' and values are list of token_ids generated using BERT/ELMO tokenizer.
+    embedding_vectors : Tensor num_subwords X embedding_dim
+        Embedding matrix for a particular Recipe; one row per token_id generated using BERT/ELMO tokenizer.
+    vector_lookup_list : Array num_tokens + 1
+        Offsets into embedding_vectors for a particular Recipe;
+            the rows for the Conllu file token 'id' i are embedding_vectors[vector_lookup_list[i - 1]:vector_lookup_list[i]].
     action_dicts_list : List of Dict
         List of Dictionary for every action in the recipe.
         Dictionary contains Action_id, Action, Parent_List, Child_List.
 
     """
 
-    parsed_recipe = fetch_parsed_recipe(recipe_filename) # Parsed Recipe File
-    
-    if(embedding_name == 'bert'):
+    if parsed_recipe is None:
+        parsed_recipe = fetch_parsed_recipe(recipe_filename) # Parsed Recipe File
 
-        embedding_vector, vector_lookup_list = generate_bert_embeddings(
-            emb_model, tokenizer, parsed_recipe, device
-        )  # Embeddings for Recipe
-    
-    elif (embedding_name == 'elmo'):
-        
-        embedding_vector, vector_lookup_list = generate_elmo_embeddings(
-            emb_model, tokenizer, parsed_recipe, device
+    if recipe_embeddings is None:
+        recipe_embeddings = fetch_recipe_embeddings(
+            parsed_recipe, emb_model, tokenizer, device, embedding_name, embedding_cache
         )  # Embeddings for Recipe
+
+    embedding_vector, vector_lookup_list = recipe_embeddings
     
     # addition by Iris: create a dict with recipe names as keys and corresponding action list as value --> to use in fetch_dish
 
@@ -790,7 +1046,7 @@ def fetch_recipe_test(recipe_filename, emb_model, tokenizer, device, embedding_n
 #####################################
 
 
-def fetch_split_action(action_token_id, parsed_recipe):
+def fetch_split_action(action_token_id, parsed_recipe, recipe_index=None):
     """
     Fetch tagging actions for a particular split action node
 
@@ -800,36 +1056,29 @@ def fetch_split_action(action_token_id, parsed_recipe):
         Action Token Id.
     parsed_recipe : List
         Conllu parsed file to generate a list of sentences.
+    recipe_index : RecipeIndex object, optional
+        Index of the parsed recipe; built from parsed_recipe if not given. The default is None.
 
     Returns
     -------
-    tagging_tokens : string
-        Tagging action sequence for a particular action node.
+    tagging_tokens : List
+        Tagging action sequence (token ids of the I- tagged tokens) for a particular action node.
 
     """
 
-    tagging_tokens = []
-    token_id = action_token_id
-
-    if token_id >= len(parsed_recipe[0]):
-        return tagging_tokens
-
-    line = parsed_recipe[0][token_id]
-
-    # Checking for intermediate action node
-    while line["xpos"].startswith("I"):
+    if recipe_index is None:
+        recipe_index = RecipeIndex(parsed_recipe)
 
-        tagging_tokens.append(line["id"])
-        token_id += 1
-        line = parsed_recipe[0][token_id]
+    if action_token_id >= len(parsed_recipe[0]):
+        return []
 
-    return tagging_tokens
+    return list(recipe_index.tails[action_token_id])
 
 
 #####################################
 
 
-def fetch_action_node(action_token_id, parsed_recipe, device):
+def fetch_action_node(action_token_id, parsed_recipe, device, recipe_index=None):
     """
     Fetch Action String for a particular action node
 
@@ -841,6 +1090,8 @@ def fetch_action_node(action_token_id, parsed_recipe, device):
         Conllu parsed file to generate a list of sentences.
     device : object
         torch device where model tensors are saved.
+    recipe_index : RecipeIndex object, optional
+        Index of the parsed recipe; built from parsed_recipe if not given. The default is None.
 
     Returns
     -------
@@ -851,7 +1102,7 @@ def fetch_action_node(action_token_id, parsed_recipe, device):
 
     action = [parsed_recipe[0][action_token_id - 1]["id"]]
 
-    tagged_action = fetch_split_action(action_token_id, parsed_recipe)
+    tagged_action = fetch_split_action(action_token_id, parsed_recipe, recipe_index)
 
     if tagged_action:
         action.extend(tagged_action)
@@ -864,29 +1115,11 @@ def fetch_action_node(action_token_id, parsed_recipe, device):
 
 
 #####################################
-def dependency_heads(deps):
-    """
-    Interprets the entry in the DEPS column.
-    Returns a list of head indices.
-    """
-    head_list = list()
-
-    """
-    if deps:
-        deps = re.split("[( )]", deps) # TODO: rather use literaleval
-        unwanted = {"[", "]"}
-        head_list = [int(l.split(",")[0]) for l in deps if l not in unwanted]
-    """
-    # TODO: test (as soon as recipes are non-tree graphs)
-    if deps:
-        deps = literal_eval(deps)
-        head_list = [int(h) for h, d in deps]
 
-    return head_list
 
-def fetch_parent_node(action_token_id, parsed_recipe, device):
+def fetch_parent_node(action_token_id, parsed_recipe, device, recipe_index=None):
     """
-    Fetch List of Children for a particular action
+    Fetch List of Parents for a particular action
 
     Parameters
     ----------
@@ -896,61 +1129,36 @@ def fetch_parent_node(action_token_id, parsed_recipe, device):
         Conllu parsed file to generate a list of sentences.
     device : object
         torch device where model tensors are saved.
+    recipe_index : RecipeIndex object, optional
+        Index of the parsed recipe; built from parsed_recipe if not given. The default is None.
 
     Returns
     -------
     parent_list : List of Tensors
-        List of parents for that particular action.
+        List of parents for that particular action (head first, then the other DEPS heads).
 
     """
 
-    action_line = parsed_recipe[0][action_token_id - 1]
+    if recipe_index is None:
+        recipe_index = RecipeIndex(parsed_recipe)
 
     parent_list = list()
 
-    parent_id = action_line["head"]
-
-    if parent_id != 0:
-
-        parent = [parsed_recipe[0][parent_id - 1]["id"]]
-
-        tagged_action = fetch_split_action(parent_id, parsed_recipe)
-
-        if tagged_action:
-            parent.extend(tagged_action)
+    for parent_id in recipe_index.parents[action_token_id]:
 
         # parent_token = tokenizer.encode(parent) # Tokenize parent node
 
-        parent_token = torch.LongTensor(parent).to(device)
+        parent_token = torch.LongTensor(recipe_index.span(parent_id)).to(device)
 
         parent_list.append(parent_token)  # Append to parent_list
 
-        other_parents = dependency_heads(action_line["deps"])  # Other parents not belonging to head
-
-        if other_parents:
-
-            for parent_id in other_parents:
-
-                parent = [parsed_recipe[0][parent_id - 1]["id"]]
-
-                tagged_action = fetch_split_action(parent_id, parsed_recipe)
-
-                if tagged_action:
-                    parent.extend(tagged_action)
-
-                # parent_token = tokenizer.encode(parent)
-
-                parent_token = torch.LongTensor(parent).to(device)
-
-                parent_list.append(parent_token)
-
     return parent_list
 
 
 #####################################
 
 
-def fetch_child_node(action_token_id, parsed_recipe, device):
+def fetch_child_node(action_token_id, parsed_recipe, device, recipe_index=None):
     """
     Fetch List of Children for a particular action
 
@@ -962,6 +1170,8 @@ def fetch_child_node(action_token_id, parsed_recipe, device):
         Conllu parsed file to generate a list of sentences.
     device : object
         torch device where model tensors are saved.
+    recipe_index : RecipeIndex object, optional
+        Index of the parsed recipe; built from parsed_recipe if not given. The default is None.
 
     Returns
     -------
@@ -969,25 +1179,18 @@ def fetch_child_node(action_token_id, parsed_recipe, device):
         List of children for that particular action.
     """
 
-    child_list = list()
-
-    for line in parsed_recipe[0]:
-
-        if line["xpos"].startswith("B") and (line["head"] == action_token_id or action_token_id in dependency_heads(line["deps"])): 
+    if recipe_index is None:
+        recipe_index = RecipeIndex(parsed_recipe)
 
-            child_id = line["id"]
-            child = [parsed_recipe[0][child_id - 1]["id"]]
-
-            tagged_action = fetch_split_action(child_id, parsed_recipe)
+    child_list = list()
 
-            if tagged_action:
-                child.extend(tagged_action)
+    for child_id in recipe_index.children[action_token_id]:
 
-            # child_token = tokenizer.encode(child) # Tokenize Child node
+        # child_token = tokenizer.encode(child) # Tokenize Child node
 
-            child_token = torch.LongTensor(child).to(device)
+        child_token = torch.LongTensor(recipe_index.span(child_id)).to(device)
 
-            child_list.append(child_token)  # Append child to child_list
+        child_list.append(child_token)  # Append child to child_list
 
     return child_list
 
@@ -995,7 +1198,7 @@ def fetch_child_node(action_token_id, parsed_recipe, device):
 #####################################
 
 
-def generate_data_line(action_token_id, parsed_recipe, device):
+def generate_data_line(action_token_id, parsed_recipe, device, recipe_index=None):
     """
     Generate action, parent list and child list for a particular action node
 
@@ -1007,6 +1210,8 @@ def generate_data_line(action_token_id, parsed_recipe, device):
         Conllu parsed file to generate a list of sentences.
     device : object
         torch device where model tensors are saved.
+    recipe_index : RecipeIndex object, optional
+        Index of the parsed recipe; built from parsed_recipe if not given. The default is None.
 
     Returns
     -------
@@ -1019,16 +1224,19 @@ def generate_data_line(action_token_id, parsed_recipe, device):
 
     """
 
+    if recipe_index is None:
+        recipe_index = RecipeIndex(parsed_recipe)
+
     action = fetch_action_node(
-        action_token_id, parsed_recipe, device
+        action_token_id, parsed_recipe, device, recipe_index
     )  # Fetch Action node sequence
 
     parent_list = fetch_parent_node(
-        action_token_id, parsed_recipe, device
+        action_token_id, parsed_recipe, device, recipe_index
     )  # Fetch List of parents for a particular action
 
     child_list = fetch_child_node(
-        action_token_id, parsed_recipe, device
+        action_token_id, parsed_recipe, device, recipe_index
     )  # Fetch List of children for a particular action
 
     return action, parent_list, child_list
@@ -1283,6 +1491,30 @@ def load_metrics(load_path, device):
 #####################################
 
 
+def prediction_path(destination_folder, dish):
+    """
+    Path of the prediction file of a dish
+
+    Parameters
+    ----------
+    destination_folder : string
+        Destination folder name.
+    dish : string
+        dish name.
+
+    Returns
+    -------
+    save_prediction_path : string
+        Prediction file path.
+
+    """
+
+    return os.path.join(destination_folder, dish + "_" + prediction_file)
+
+
+#####################################
+
+
 def save_predictions(destination_folder, results_df, dish):
     """
     Save the predictions from the model during testing
@@ -1302,9 +1534,7 @@ def save_predictions(destination_folder, results_df, dish):
 
     """
 
-    save_prediction_path = os.path.join(
-        destination_folder, dish + "_" + prediction_file
-    )
+    save_prediction_path = prediction_path(destination_folder, dish)
 
     # Saving the results
     results_df.to_csv(save_prediction_path, sep="\t", index=False, encoding="utf-8")
@@ -1315,6 +1545,193 @@ def save_predictions(destination_folder, results_df, dish):
 #####################################
 
 
+def save_fold_results(fold_result_df, save_result_path):
+    """
+    Append the results of a fold to a fold results file (with header if the file is new);
+    the file is locked while appending if the platform supports it (fcntl)
+
+    Parameters
+    ----------
+    fold_result_df : Dataframe
+        Fold results dataframe.
+    save_result_path : string
+        Fold results file, e.g. fold_results_train.tsv.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    with open(save_result_path, "a", encoding="utf-8", newline="") as file:
+
+        # exclusive lock s.t. the results of folds trained in parallel processes are appended one after the other
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+
+        file.seek(0, os.SEEK_END)  # end of the file after the appends of other processes
+
+        fold_result_df.to_csv(file, sep="\t", index=False, header=file.tell() == 0)
+        file.flush()
+
+
+#####################################
+
+
+def parse_folds(folds):
+    """
+    Fold numbers of a fold specification
+
+    Parameters
+    ----------
+    folds : string
+        Comma-separated fold numbers and ranges, e.g. "1-10" or "1,3,5-7".
+
+    Returns
+    -------
+    fold_list : List of Int
+        Sorted fold numbers.
+
+    """
+
+    fold_list = set()
+
+    for part in folds.split(","):
+
+        first, _, last = part.strip().partition("-")
+
+        if not first.isdecimal() or not (last or first).isdecimal() or int(first) > int(last or first):
+            raise ValueError("Invalid fold specification: {}".format(folds))
+
+        fold_list.update(range(int(first), int(last or first) + 1))
+
+    return sorted(fold_list)
+
+
+#####################################
+
+
+def cpu_core_groups(num_groups):
+    """
+    Split the CPU cores available to the process into disjoint groups of (nearly) equal size
+
+    Parameters
+    ----------
+    num_groups : Int
+        Number of groups, e.g. one per worker process.
+
+    Returns
+    -------
+    core_groups : List of List of Int
+        CPU core ids of every group; cores are shared round robin if there are fewer cores than groups.
+
+    """
+
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+
+    if num_groups > len(cores):
+        return [[cores[i % len(cores)]] for i in range(num_groups)]
+
+    return [group.tolist() for group in np.array_split(cores, num_groups)]
+
+
+#####################################
+
+
+def init_fold_worker(core_queue):
+    """
+    Initializer of a worker process running folds: pin the process to a group of CPU cores (see cpu_core_groups())
+    and use one torch thread per core, s.t. parallel folds do not oversubscribe the cores
+
+    Parameters
+    ----------
+    core_queue : multiprocessing.Queue
+        Core groups; every worker takes one.
+
+    """
+
+    cores = core_queue.get()
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    torch.set_num_threads(len(cores))
+
+
+#####################################
+
+
+def fold_workers(workers, num_folds, device):
+    """
+    Number of worker processes for running num_folds folds with run_fold_pool()
+
+    Parameters
+    ----------
+    workers : Int
+        Requested number of worker processes.
+    num_folds : Int
+        Number of folds.
+    device : object
+        torch device of the models; parallel folds need a CPU device and the fork start method.
+
+    Returns
+    -------
+    workers : Int
+        At most one worker per fold; 1 (folds run one after the other in this process) if folds cannot run in parallel.
+
+    """
+
+    workers = min(workers, num_folds)
+
+    if workers > 1 and (torch.device(device).type != "cpu" or "fork" not in multiprocessing.get_all_start_methods()):
+        print("Folds are run one after the other (parallel folds need a CPU device and fork)")
+        return 1
+
+    return max(workers, 1)
+
+
+def run_fold_pool(function, fold_list, workers=1):
+    """
+    Run a function on every fold, in worker processes forked from this process if workers > 1 (s.t. they share
+    the loaded data); every worker is pinned to its own group of CPU cores (see init_fold_worker())
+
+    Parameters
+    ----------
+    function : function
+        Module-level function of a fold number (the workers inherit the state it reads).
+    fold_list : List of Int
+        Fold numbers.
+    workers : Int, optional
+        Number of worker processes (see fold_workers()); 1 runs the folds one after the other in this process. The default is 1.
+
+    Yields
+    ------
+    result : object
+        Result of function for every fold, in the order of fold_list, as soon as the folds are finished.
+
+    """
+
+    if workers <= 1:
+        yield from map(function, fold_list)
+        return
+
+    context = multiprocessing.get_context("fork")
+
+    core_queue = context.Queue()
+
+    for cores in cpu_core_groups(workers):
+        core_queue.put(cores)
+
+    with context.Pool(workers, initializer=init_fold_worker, initargs=(core_queue,)) as pool:
+        yield from pool.imap(function, fold_list)
+
+
+#####################################
+
+
 #def create_acc_loss_graph(file_path, device, save_graph_path):
 def create_acc_loss_graph(epoch_list, train_loss_list, valid_loss_list, train_accuracy_list, valid_accuracy_list, device, save_graph_path):
     """